@@ -1,4 +1,3 @@
-from appwrite.id import ID
 from typing import List, Dict, Any
 
 from agents import (
@@ -11,7 +10,7 @@ from agents import (
     comparison_agent,
     product_agent,
     )
-from agents.memory import mem_agent
+from agents.memory_consolidation import memory_consolidator
 from agents.tools.schema import extract_dataclass_messages
 
 from _websockets.schema import WebSocketMessage, RequestWebsockets
@@ -19,8 +18,8 @@ from _websockets.schema import WebSocketMessage, RequestWebsockets
 from db._appwrite.session import appwrite_session_manager
 from utils.websocket import WebSocketManager
 from utils.search_cache import search_cache_manager
-from utils.memory import store
 from api.chat.model import File
+from api.auth.credit_manager import session_budget
 # from .message_handler import handle_message
 
 from utils.logging import logger
@@ -140,23 +139,21 @@ class ConnectionManager:
             }
 
         try:
-            if focus_mode == "copilot":
-                final_state = await self.copilot_mode(processing_config, state, websocket)
-            elif focus_mode == "insights":
-                final_state = await self.insights_mode(processing_config, state, websocket)
-            elif focus_mode == "all":
-                final_state = await self.QA_mode(processing_config, state, websocket)
-            elif focus_mode == "ultrasearch":
-                final_state = await self.ultra_search_mode(processing_config, state, websocket)
-
-
-            # update a new memory
+            # Credits are reserved once for the whole run and settled when it ends
+            async with session_budget(user_id, focus_mode):
+                if focus_mode == "copilot":
+                    final_state = await self.copilot_mode(processing_config, state, websocket)
+                elif focus_mode == "insights":
+                    final_state = await self.insights_mode(processing_config, state, websocket)
+                elif focus_mode == "all":
+                    final_state = await self.QA_mode(processing_config, state, websocket)
+                elif focus_mode == "ultrasearch":
+                    final_state = await self.ultra_search_mode(processing_config, state, websocket)
+
+
+            # Memories are consolidated in the background, batched per user
             # user_prompt = extract_dataclass_messages(final_state['message_history'])
-            history = final_state['ws_message']['history']
-            print(history)
-            mem_agent_response = await mem_agent.run(user_prompt=str(history))
-            result_data = mem_agent_response.data
-            store.put((user_id, "memories"), ID.unique(), {"text": result_data.summary})
+            memory_consolidator.enqueue(user_id, session_id, final_state['ws_message']['history'])
 
         except WebSocketDisconnect:
             logger.warning(f"WebSocket disconnected for user {user_id} during message handling.")
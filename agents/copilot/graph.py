@@ -8,7 +8,7 @@ from ..followup_agent import followup_agent_node
 
 # from langgraph.checkpoint.mongodb.aio import AsyncMongoDBSaver
 from langgraph.graph import StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from utils.checkpointer import checkpointer_for
 
 builder = StateGraph(State)
 
@@ -28,7 +28,7 @@ builder.set_entry_point(agent_manager.meta_agent)
 
 
 # # Compile the graph
-checkpointer = MemorySaver()
+checkpointer = checkpointer_for("copilot")
 copilot_agent_graph = builder.compile(checkpointer=checkpointer)
 
 # async def build_copilot_agent_graph():
@@ -7,7 +7,7 @@ from .writer_agent import web_writer_agent_node
 
 
 from langgraph.graph import StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from utils.checkpointer import checkpointer_for
 
 builder = StateGraph(State)
 
@@ -25,5 +25,5 @@ builder.set_entry_point(agent_manager.web_query_agent)
 
 
 # # Compile the graph
-checkpointer = MemorySaver()
+checkpointer = checkpointer_for("insights")
 insights_agent_graph = builder.compile(checkpointer=checkpointer)
@@ -1,8 +1,13 @@
 # from abc import ABC
 from datetime import datetime, timezone
-from typing import Literal, TypeVar, Optional, List
+from typing import Any, Awaitable, Callable, Literal, TypeVar, Optional, List
+from functools import lru_cache
+from contextlib import asynccontextmanager
+from pydantic import ValidationError
 from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.openai import OpenAIProvider
+from pydantic_ai.providers.google_gla import GoogleGLAProvider
 
 from ..config import agent_manager
 from config import ApiKeyConfig
@@ -30,7 +35,7 @@ from schema.dataclass.dependencies import get_dependencies, BaseDependencies
 #     WebSchema,
 #     )
 
-from .llm import check_credits, track_llm_call
+from .llm import check_credits, track_llm_call, reserve_credits, commit_credits, refund_credits, get_session_budget, get_cost
 from ..state import State
 from config import DB_PATH
 from utils.websocket import WebSocketManager, ImageMetadata, ProductSchema, SourceMetadata
@@ -39,6 +44,8 @@ from utils.url_shortener import URLShortener
 from utils.rerank import ReRanker
 from utils._craw4ai import CrawlerManager
 from utils.helper_state import update_history
+from utils.key_scheduler import gemini_keys, is_rate_limited
+from utils.llm_cache import llm_cache, CachePolicy, CacheMode, OFF
 from utils.ecommerce_manager import EcommerceManager
 from schema.dataclass.decourator import extract_agent_results
 # from utils.db_manager import ProductDBManager
@@ -53,9 +60,56 @@ from pydantic_ai.tools import AgentDepsT
 from pydantic_ai import models, messages as _messages
 from pydantic_ai.settings import ModelSettings
 from ..tools.search import search_tool
+from ..tools.markdown import convert_to_markdown
 
 BaseSchemaType = TypeVar('BaseSchemaType', bound=BaseSchema)
 
+
+def gemini_model_name(model) -> Optional[str]:
+    """Bare Gemini model name for model strings served by the Gemini API, else None."""
+    if not isinstance(model, str):
+        return None
+    if model.startswith('google-gla:'):
+        return model.split(':', 1)[1]
+    if model.startswith('gemini'):
+        return model
+    return None
+
+
+@lru_cache(maxsize=64)
+def gemini_model(name: str, api_key: str) -> GeminiModel:
+    """One model per (name, key) so calls on the same key share a provider client."""
+    return GeminiModel(name, provider=GoogleGLAProvider(api_key=api_key))
+
+
+# Called with each partially validated result while a response streams in
+OnPartial = Callable[[Any], Awaitable[None]]
+
+
+class StreamedResult:
+    """A finished streamed run, shaped like a pydantic-ai run result."""
+
+    def __init__(self, data, new_messages: list, all_messages: list, usage):
+        self.data = data
+        self._new_messages = new_messages
+        self._all_messages = all_messages
+        self._usage = usage
+
+    def new_messages(self) -> list:
+        return self._new_messages
+
+    def all_messages(self) -> list:
+        return self._all_messages
+
+    def usage(self):
+        return self._usage
+
+
+def estimate_tokens(user_prompt: str, message_history: list | None = None) -> int:
+    """Rough prompt plus response size, about four characters per token."""
+    chars = len(str(user_prompt)) + sum(len(str(m)) for m in message_history or [])
+    return chars // 4 + 512
+
 class BaseAgent:
     def __init__(
         self, 
@@ -67,10 +121,15 @@ class BaseAgent:
         deps_type: BaseDependencies=None,
         timeout:int = 30,
         retries: int = 3,
+        cache: Optional[CachePolicy] = None,
     ):
         self.timeout = timeout
         self.agent_name = name
         self.model = model
+        self.system_prompt = system_prompt
+        self.result_type = result_type
+        # Response caching for call_llm, see utils.llm_cache.AGENT_POLICIES
+        self.cache_policy = cache or llm_cache.policy_for(name)
         self.background_task = background_task
         self.search_tool = search_tool
         self.semaphore = Semaphore(3)
@@ -204,15 +263,53 @@ class BaseAgent:
                 "original_products": original_products
             }
 
+    @asynccontextmanager
+    async def stream_to_socket(self, ws_id: int, field: str = "content"):
+        """
+        Yields an on_partial callback for call_llm that sends the growing text
+        field of the result to the websocket as it is generated, converted with
+        convert_to_markdown like the final message. The line being written is
+        held back until it is complete, since an escape or list marker cut off
+        mid-token converts differently once the rest arrives.
+        """
+        stream = self.websocket_manager.message_stream(ws_id)
+        if stream is None:
+            yield None
+            return
+
+        latest = {"text": ""}
+
+        async def send(converted: str):
+            # Converted text only ever extends what was sent
+            if len(converted) > len(stream.text) and converted.startswith(stream.text):
+                await stream.write(converted[len(stream.text):])
+
+        async def on_partial(partial):
+            latest["text"] = getattr(partial, field, None) or ""
+            converted = convert_to_markdown(latest["text"])
+            await send(converted[:converted.rfind("\n") + 1])
+
+        async with stream:
+            yield on_partial
+            await send(convert_to_markdown(latest["text"]))
+
     async def send_signals(
         self, 
         state: State,
         content: str,
         images: List[ImageMetadata] = None,
         sources: List[SourceMetadata] = None,
-        products : List[ProductSchema] = None        
+        products : List[ProductSchema] = None,
+        streamed: bool = False
         )-> None:
-            
+        """
+        Send the final message with its sources, images and products, then messageEnd.
+
+        The client appends the content of every "message" frame and messageEnd
+        carries the complete text either way. When the text was already streamed
+        with stream_to_socket the message frame only has the metadata, with
+        empty content, so the streamed text is not repeated.
+        """
         
         ws_id = state["ws_id"]
         message = state["ws_message"]
@@ -227,11 +324,11 @@ class BaseAgent:
             "products": products,
             "sources": sources,
             "type": "message",
-            "content": content
+            "content": "" if streamed else content
         }
 
         await self.websocket_manager.send_json(ws_id, data)
-        await self.websocket_manager.send_json(ws_id, {"type": "messageEnd"})
+        await self.websocket_manager.send_json(ws_id, {"type": "messageEnd", "content": content})
 
 
         source_data= None
@@ -287,6 +384,77 @@ class BaseAgent:
         state["next_node"] = go_back_to_node
         return Command(goto=agent_manager.human_node, update=state)
 
+    async def _invoke(self, on_partial: Optional[OnPartial] = None, **kwargs) -> ResultDataT:
+        """Run the agent once, streaming partial results to on_partial when given."""
+        if on_partial is None:
+            return await self.llm.run(**kwargs)
+
+        async with self.llm.run_stream(**kwargs) as result:
+            async for message, is_last in result.stream_structured(debounce_by=None):
+                try:
+                    partial = await result.validate_structured_result(message, allow_partial=not is_last)
+                except ValidationError:
+                    # Too little of the response has arrived to validate yet
+                    continue
+                await on_partial(partial)
+            data = await result.get_data()
+        return StreamedResult(data, result.new_messages(), result.all_messages(), result.usage())
+
+    async def _run_llm(
+        self,
+        user_prompt: str,
+        message_history=None,
+        model=None,
+        on_partial: Optional[OnPartial] = None,
+        **kwargs
+        ) -> ResultDataT:
+        """
+        Run the agent, on the Gemini key with the most quota left when the model is a Gemini one.
+        A 429 quarantines the key and the call is retried once on another key if one has headroom.
+        """
+        name = gemini_model_name(model or self.model)
+        if name is None or not gemini_keys.keys:
+            return await self._invoke(
+                on_partial, user_prompt=user_prompt, message_history=message_history, model=model, **kwargs
+            )
+
+        tokens = estimate_tokens(user_prompt, message_history)
+        for attempt in range(2):
+            lease = await gemini_keys.acquire(tokens)
+            try:
+                result = await self._invoke(
+                    on_partial,
+                    user_prompt=user_prompt,
+                    message_history=message_history,
+                    model=gemini_model(name, lease.key),
+                    **kwargs
+                )
+            except Exception as e:
+                if not is_rate_limited(e):
+                    lease.release()
+                    raise
+                lease.rate_limited()
+                if attempt > 0 or not gemini_keys.has_headroom(tokens):
+                    raise
+                continue
+            except BaseException:
+                lease.release()
+                raise
+
+            lease.complete(result.usage().total_tokens)
+            return result
+
+    def _cache_policy(self, cache: Optional[CacheMode], model_settings: ModelSettings | None) -> CachePolicy:
+        if cache == "off":
+            return OFF
+        temperature = (model_settings or {}).get("temperature")
+        if temperature is not None and temperature != 0:
+            # Only a temperature 0 answer is worth replaying
+            return OFF
+        if cache is None:
+            return self.cache_policy
+        return CachePolicy(mode=cache, ttl=self.cache_policy.ttl)
+
     async def call_llm(
         self, 
         user_id: str, 
@@ -296,27 +464,80 @@ class BaseAgent:
         model: models.Model | models.KnownModelName | None = None,
         deps: AgentDepsT = None,
         model_settings: ModelSettings | None = None,
-        infer_name: bool = True) -> ResultDataT:
-            
-        has_credits, balance = await check_credits(user_id, type)
-        if not has_credits:
-            raise ValueError(f"Insufficient credits. Available: {balance}")
-                       
-        result =  await self.llm.run(
+        infer_name: bool = True,
+        cache: Optional[CacheMode] = None,
+        on_partial: Optional[OnPartial] = None) -> ResultDataT:
+        """
+        Run the agent for a user, charging their credits.
+
+        Repeated calls are answered from the LLM cache according to the agent's cache
+        policy; pass cache="off" for calls that must reach the model. A cache hit is
+        not charged, but the user still needs the balance the call would have cost.
+        With on_partial the response is streamed and on_partial gets each partial result.
+        """
+        policy = self._cache_policy(cache, model_settings)
+        if policy.mode != "off":
+            # A cached call runs at temperature 0, so the answer replayed is the one the model would give
+            model_settings = {**(model_settings or {}), "temperature": 0}
+            namespace, key = llm_cache.make_key(
+                model or self.model, self.system_prompt, self.result_type, user_prompt, message_history
+            )
+            cached = await llm_cache.get(namespace, key, user_prompt, policy, message_history)
+            if cached is not None:
+                await self._ensure_credits(user_id, type)
+                if on_partial is not None:
+                    await on_partial(cached.data)
+                return cached
+
+        result = await self._call_llm_billed(
+            user_id,
+            type,
             user_prompt=user_prompt,
             message_history=message_history,
             model=model,
             deps=deps,
             infer_name=infer_name,
-            model_settings=model_settings        
+            model_settings=model_settings,
+            on_partial=on_partial
         )
 
-        # print(result)
+        if policy.mode != "off":
+            await llm_cache.set(namespace, key, user_prompt, result, policy, message_history)
+        return result
+
+    async def _ensure_credits(self, user_id: str, type: str) -> None:
+        """Raise like a billed call would when the user could not afford it."""
+        budget = get_session_budget(user_id)
+        if budget is not None and budget.remaining >= get_cost(type):
+            return
+        has_credits, balance = await check_credits(user_id, type)
+        if not has_credits:
+            raise ValueError(f"Insufficient credits. Available: {balance}")
+
+    async def _call_llm_billed(self, user_id: str, type: str, **run_kwargs) -> ResultDataT:
+        # Inside a websocket/graph run the cost comes out of the run's budget, no round trips
+        budget = get_session_budget(user_id)
+        if budget is not None:
+            cost = await budget.consume(type)
+            try:
+                return await self._run_llm(**run_kwargs)
+            except BaseException:
+                budget.release(cost)
+                raise
+
+        # Hold the cost before the call so parallel agent calls can't overdraw
+        reservation, balance = await reserve_credits(user_id, type)
+        if reservation is None:
+            raise ValueError(f"Insufficient credits. Available: {balance}")
+
+        try:
+            result =  await self._run_llm(**run_kwargs)
+        except BaseException:
+            await refund_credits(reservation)
+            raise
 
-        cost = result.cost()
-        await track_llm_call(
-            user_id, 
-            "text", 
+        await commit_credits(
+            reservation,
             # {
             #     "input_tokens": cost.request_tokens,
             #     "output_tokens": cost.response_tokens,
@@ -7,7 +7,15 @@ from db._appwrite.model_base import AppwriteModelBase
 # from api.auth.model import UserCredits
 # from api.payments.model import DailyUsage
 # from utils.logging import logger
-from api.auth.credit_manager import check_credits, track_credits as track_llm_call
+from api.auth.credit_manager import (
+    check_credits,
+    track_credits as track_llm_call,
+    reserve_credits,
+    commit_credits,
+    refund_credits,
+    get_session_budget,
+    get_cost,
+)
 
 class LLMCall(AppwriteModelBase):
     user_id: str = AppwriteField()
@@ -0,0 +1,210 @@
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from appwrite.id import ID
+
+from config import MEMORY_DEBOUNCE, MEMORY_MAX_WAIT, MEMORY_QUEUE_SIZE
+from utils.logging import logger
+from utils.memory import store
+from .memory import mem_agent
+
+
+# Users consolidated at once, each is one mem_agent call
+CONSOLIDATION_CONCURRENCY = 4
+# Sessions kept per pending user, older ones are dropped first
+MAX_SESSIONS_PER_USER = 5
+# A failed batch goes back in the queue this many times before it is dropped
+MAX_ATTEMPTS = 2
+
+
+@dataclass
+class PendingMemory:
+    first_at: float
+    last_at: float
+    # session id -> latest history; a session's history is cumulative, so a newer turn supersedes older ones
+    sessions: "OrderedDict[str, Any]" = field(default_factory=OrderedDict)
+    turns: int = 0
+    attempts: int = 0
+
+
+@dataclass
+class MemoryStats:
+    enqueued: int = 0
+    merged: int = 0
+    dropped: int = 0
+    batches: int = 0
+    turns_consolidated: int = 0
+    failures: int = 0
+    pending_users: int = 0
+    last_batch_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "turns_consolidated": self.turns_consolidated,
+            "turns_per_batch": round(self.turns_consolidated / self.batches, 2) if self.batches else 0.0,
+            "failures": self.failures,
+            "pending_users": self.pending_users,
+            "last_batch_seconds": round(self.last_batch_seconds, 3),
+        }
+
+
+class MemoryConsolidator:
+    """
+    Turns conversation turns into long-term memories off the response path.
+
+    enqueue() only records the turn. A user's turns are consolidated debounce
+    seconds after their last one (or max_wait after their first, for users who
+    keep talking), with one mem_agent call covering every pending turn, and the
+    summary is written to the memory store from a worker thread.
+
+    At most queue_size users wait at once; past that the user waiting longest
+    is dropped. Turns of the same session merge into one, since later history
+    contains the earlier.
+    """
+
+    def __init__(
+        self,
+        debounce: float = MEMORY_DEBOUNCE,
+        max_wait: float = MEMORY_MAX_WAIT,
+        queue_size: int = MEMORY_QUEUE_SIZE,
+        concurrency: int = CONSOLIDATION_CONCURRENCY,
+    ):
+        self.debounce = debounce
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.stats = MemoryStats()
+        # Ordered by first pending turn, so the front is always the user waiting longest
+        self._pending: "OrderedDict[str, PendingMemory]" = OrderedDict()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._running: Dict[str, asyncio.Task] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, user_id: str, session_id: str, history: Any) -> None:
+        now = time.monotonic()
+        self.stats.enqueued += 1
+
+        pending = self._pending.get(user_id)
+        if pending is None:
+            if len(self._pending) >= self.queue_size:
+                _, oldest = self._pending.popitem(last=False)
+                self.stats.dropped += oldest.turns
+            pending = self._pending[user_id] = PendingMemory(first_at=now, last_at=now)
+
+        if session_id in pending.sessions:
+            self.stats.merged += 1
+            pending.sessions.move_to_end(session_id)
+        pending.sessions[session_id] = history
+        while len(pending.sessions) > MAX_SESSIONS_PER_USER:
+            pending.sessions.popitem(last=False)
+            self.stats.dropped += 1
+
+        pending.turns += 1
+        pending.last_at = now
+        self.stats.pending_users = len(self._pending)
+
+    def _due(self, now: float, force: bool = False) -> List[str]:
+        return [
+            user_id for user_id, pending in self._pending.items()
+            if user_id not in self._running and (
+                force
+                or now - pending.last_at >= self.debounce
+                or now - pending.first_at >= self.max_wait
+            )
+        ]
+
+    @staticmethod
+    def build_prompt(pending: PendingMemory) -> str:
+        histories = list(pending.sessions.values())
+        if len(histories) == 1:
+            return str(histories[0])
+        return "\n\n".join(
+            f"Conversation {n}:\n{history}" for n, history in enumerate(histories, start=1)
+        )
+
+    async def _consolidate(self, user_id: str, pending: PendingMemory):
+        started = time.monotonic()
+        try:
+            async with self._semaphore:
+                response = await mem_agent.run(user_prompt=self.build_prompt(pending))
+                summary = response.data.summary
+                # The store computes embeddings and writes to disk, keep both off the loop
+                await asyncio.to_thread(
+                    store.put, (user_id, "memories"), ID.unique(), {"text": summary}
+                )
+            self.stats.batches += 1
+            self.stats.turns_consolidated += pending.turns
+            self.stats.last_batch_seconds = time.monotonic() - started
+        except Exception as e:
+            self.stats.failures += 1
+            logger.error(f"Memory consolidation failed for user {user_id}: {str(e)}")
+            self._requeue(user_id, pending)
+        finally:
+            self._running.pop(user_id, None)
+
+    def _requeue(self, user_id: str, pending: PendingMemory):
+        pending.attempts += 1
+        if pending.attempts >= MAX_ATTEMPTS:
+            self.stats.dropped += pending.turns
+            return
+
+        newer = self._pending.get(user_id)
+        if newer is not None:
+            # Turns that arrived meanwhile win for the same session
+            for session_id, history in pending.sessions.items():
+                newer.sessions.setdefault(session_id, history)
+            newer.turns += pending.turns
+            newer.first_at = min(newer.first_at, pending.first_at)
+        elif len(self._pending) < self.queue_size:
+            self._pending[user_id] = pending
+            self._pending.move_to_end(user_id, last=False)
+        else:
+            self.stats.dropped += pending.turns
+        self.stats.pending_users = len(self._pending)
+
+    def _dispatch(self, force: bool = False) -> List[asyncio.Task]:
+        tasks = []
+        for user_id in self._due(time.monotonic(), force):
+            pending = self._pending.pop(user_id)
+            task = asyncio.create_task(self._consolidate(user_id, pending))
+            self._running[user_id] = task
+            tasks.append(task)
+        self.stats.pending_users = len(self._pending)
+        return tasks
+
+    async def _loop(self):
+        tick = max(0.5, min(self.debounce, self.max_wait) / 4)
+        while True:
+            await asyncio.sleep(tick)
+            try:
+                self._dispatch()
+            except Exception as e:
+                logger.error(f"Memory consolidation loop failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._loop())
+
+    async def close(self, timeout: float = 30.0):
+        """Stop the loop and consolidate whatever is still pending."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        tasks = list(self._running.values()) + self._dispatch(force=True)
+        if tasks:
+            _, not_done = await asyncio.wait(tasks, timeout=timeout)
+            for task in not_done:
+                task.cancel()
+        if self._pending:
+            logger.warning(f"Memories lost on shutdown: {self.stats.to_dict()}")
+
+
+memory_consolidator = MemoryConsolidator()
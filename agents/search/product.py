@@ -4,7 +4,7 @@ from typing import List, Dict, Any
 from schema import GeminiDependencies
 from .prompts import product_agent_prompt
 
-from ..legacy.llm import check_credits, track_llm_call
+from ..legacy.llm import check_credits, track_llm_call, reserve_credits, commit_credits, refund_credits
 from ..tools.search import search_tool
 from ..tools.general import (
     # track_product_price,
@@ -73,14 +73,12 @@ agent = Agent(
 )
 
 async def product_agent(websocker_id, user_id, query, products, message_history): 
-    from api.auth.model import UserCredits
-    
     user_preferences = await get_user_preferences(user_id)
     query = f"USER_PREFERENCES: {user_preferences} \n USER QUESTION: {query} \n PRODUCTS IN QUESTION: {products}"
 
-    # Check credits upfront
-    has_credits, credits = await check_credits(user_id, "text", amount=20)
-    if has_credits is False:
+    # Hold the credits upfront
+    reservation, credits = await reserve_credits(user_id, "amount", amount=20)
+    if reservation is None:
         await websocket_manager.send_json(websocker_id,
         data={
             "type": "ERROR", 
@@ -93,12 +91,8 @@ async def product_agent(websocker_id, user_id, query, products, message_history)
         response = await agent.run(query, message_history=message_history)
         message_history = message_history + response.new_messages()
 
-        # Deduct credits only after successful agent run
-        await UserCredits.update_balance(
-            user_id, 
-            -20,
-            transaction_type="product_agent_query"
-        )
+        # Spend the credits only after successful agent run
+        await commit_credits(reservation)
 
         # Process and send results
         result = preprocess_results(response.data, products)
@@ -115,6 +109,8 @@ async def product_agent(websocker_id, user_id, query, products, message_history)
         return message_history
 
     except Exception as e:
+        # No-op if the credits were already spent
+        await refund_credits(reservation)
         logger.error(f"Error in product agent for user {user_id}: {e}")
         await websocket_manager.send_json(websocker_id,
         {
@@ -10,7 +10,7 @@ from ..config import agent_manager
 from ..state import State
 
 from langgraph.graph import StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from utils.checkpointer import checkpointer_for
 
 builder = StateGraph(State)
 
@@ -32,7 +32,7 @@ builder.set_entry_point(agent_manager.planner_agent)
 
 
 # # Compile the graph
-checkpointer = MemorySaver()
+checkpointer = checkpointer_for("ultra_search")
 ultra_search_agent_graph = builder.compile(checkpointer=checkpointer, store=store)
 
 # async def build_copilot_agent_graph():
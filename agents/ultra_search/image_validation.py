@@ -1,6 +1,6 @@
+import re
 import asyncio
-from typing import Dict, Any
-import aiohttp
+from typing import Dict, Any, Optional
 # from urllib.parse import urljoin, urlparse
 
 from ..legacy.base import BaseAgent
@@ -9,6 +9,8 @@ from ..state import State
 from .schema import ImageValidationSchema, ProductImage, ValidationResult
 from .prompt import image_validation_prompt
 from utils._craw4ai import CrawlerManager
+from utils.crawl_cache import crawl_cache
+from utils.image_validator import image_validator
 from utils.logging import logger
 from schema import ScrapingDependencies
 from langgraph.types import Command
@@ -37,16 +39,20 @@ class ImageValidationAgent(BaseAgent):
         return config
 
     async def validate_image_url(self, url: str) -> bool:
-        """Check if an image URL is valid by making a HEAD request"""
-        if not url:
-            return False
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.head(url, allow_redirects=True, timeout=10) as response:
-                    content_type = response.headers.get('content-type', '')
-                    return response.status == 200 and content_type.startswith('image/')
-        except:
-            return False
+        """Check if an image URL is valid through the shared image validator"""
+        return await image_validator.validate(url)
+
+    @staticmethod
+    def get_og_image(html: str) -> Optional[str]:
+        """Read the Open Graph image of a page, most shops set it to the main product image"""
+        if not html:
+            return None
+        match = re.search(
+            r'<meta[^>]+property=["\']og:image["\'][^>]+content=["\']([^"\']+)["\']',
+            html,
+            re.IGNORECASE,
+        )
+        return match.group(1) if match else None
 
     async def fix_image_url(self, product: Dict) -> str:
         """Attempt to fix an invalid image URL by crawling the product page"""
@@ -54,8 +60,13 @@ class ImageValidationAgent(BaseAgent):
             crawler = await CrawlerManager.get_crawler()
             
             # Crawl the product page
-            results = await crawler.arun(product['url'], config=self.crawler_config)
-            
+            results = await crawl_cache.arun(product['url'], config=self.crawler_config, crawler=crawler)
+
+            # Cheap path first, only fall back to the LLM when the page has no usable og:image
+            og_image = self.get_og_image(results.html)
+            if og_image and await self.validate_image_url(og_image):
+                return og_image
+
             # Extract markdown content
             markdown = results.markdown
             if not markdown:
@@ -95,33 +106,38 @@ class ImageValidationAgent(BaseAgent):
                 comment="No products to validate"
             )
 
-        # Create a semaphore to limit concurrent operations
+        # Validate every image in one batch over the pooled session,
+        # only the broken ones go through the crawl and LLM fix path
+        validity = await image_validator.validate_many(
+            product.get('image', '') for product in all_products
+        )
+
+        # Create a semaphore to limit concurrent fix attempts
         semaphore = asyncio.Semaphore(5)
 
         async def process_product(product: Dict):
-            async with semaphore:
-                try:
-                    image_url = product.get('image', '')
-                    is_valid = await self.validate_image_url(image_url)
-                    
-                    if not is_valid:
+            image_url = product.get('image', '')
+            is_valid = validity.get(image_url, False)
+            try:
+                if not is_valid:
+                    async with semaphore:
                         # Try to fix the image URL
                         fixed_url = await self.fix_image_url(product)
-                        if fixed_url:
-                            image_url = fixed_url
-                            is_valid = await self.validate_image_url(image_url)
-                    
-                    if is_valid:
-                        # Update the product's image URL directly
-                        product['image'] = image_url
-                        return ProductImage(
-                            image_url=image_url,
-                            product_id=product.get('product_id', '')
-                        )
-                    return None
-                except Exception as e:
-                    logger.error(f"Error processing product: {str(e)}")
-                    return None
+                    if fixed_url:
+                        image_url = fixed_url
+                        is_valid = await self.validate_image_url(image_url)
+
+                if is_valid:
+                    # Update the product's image URL directly
+                    product['image'] = image_url
+                    return ProductImage(
+                        image_url=image_url,
+                        product_id=product.get('product_id', '')
+                    )
+                return None
+            except Exception as e:
+                logger.error(f"Error processing product: {str(e)}")
+                return None
 
         # Process all products concurrently
         tasks = [process_product(product) for product in all_products]
@@ -13,6 +13,8 @@ from ..tools.rate_converter import CURRENCY_SYMBOLS, convert_currency, normalize
 from schema import ScrapingDependencies
 
 from utils.logging import logger
+from utils.markdown_chunker import MarkdownChunker
+from utils.crawl_cache import crawl_cache
 # from ..legacy.llm import check_credits, track_llm_call
 
 from langgraph.types import Command
@@ -28,7 +30,7 @@ class ResearchAgent(BaseAgent):
             result_type=Product,
             **kwargs
             )
-        self.word_threshold = 1000
+        self.chunker = MarkdownChunker(max_tokens=1500, top_k=3)
         self.crawler_config = self.get_crawler_config()
 
 
@@ -53,7 +55,7 @@ class ResearchAgent(BaseAgent):
             )
 
             crawler = await self.get_crawler()
-            results = await crawler.arun(url, config=self.crawler_config)
+            results = await crawl_cache.arun(url, config=self.crawler_config, crawler=crawler)
 
             state['agent_results'][agent_manager.research_agent]['n_scraped_items'] += 1
             await self.websocket_manager.send_progress(
@@ -62,22 +64,15 @@ class ResearchAgent(BaseAgent):
                 searched_items=state['agent_results'][agent_manager.research_agent]['n_scraped_items'],
             )
             
-            markdown = self.get_markdown_content(results.markdown)
+            markdown = self.get_markdown_content(results)
             if markdown is None:
                 return None
-            
-            # self.rerank.chunk_rerank(
-            #     query=search_config["query"] + " price name features product details",
-            #     texts=markdown,
-            # )
-
-            # Determine if markdown is large enough to be chunked
-            words = markdown.split()
-            if len(words) > self.word_threshold:
-                mid_index = len(markdown) // 2
-                markdown_chunks = [markdown[:mid_index], markdown[mid_index:]]
-            else:
-                markdown_chunks = [markdown]
+
+            # Only send the chunks that look like product content to the LLM
+            markdown_chunks = self.chunker.select(markdown, search_config["query"])
+            if not markdown_chunks:
+                return None
+            logger.info(f"Chunking stats: {self.chunker.stats.to_dict()}")
 
             page_contents = [
                 {"Page URL": results.url, "Page Markdown": chunk} for chunk in markdown_chunks
@@ -292,7 +287,7 @@ class ResearchAgent(BaseAgent):
             user_query="price name features product details",  # tailored query
             bm25_threshold=1.2  # higher value for stricter, more relevant matches
         )
-        md_generator = DefaultMarkdownGenerator()
+        md_generator = DefaultMarkdownGenerator(content_filter=bm25_filter)
         
         config = CrawlerRunConfig(
             # word_count_threshold=3,  # allow even short text blocks typical of product info
@@ -326,13 +321,16 @@ class ResearchAgent(BaseAgent):
         
         return products
     
-    def get_markdown_content(self, content) -> Optional[str]:
-        if content is None:
+    def get_markdown_content(self, results) -> Optional[str]:
+        if results is None:
             return None
-        # if isinstance(content, MarkdownGenerationResult):
-        # else:
-        #     return content.markdown
-        return content
+        # Prefer the BM25 filtered markdown, the raw page is the fallback when
+        # the filter was too strict and dropped everything
+        markdown_v2 = getattr(results, "markdown_v2", None)
+        fit_markdown = getattr(markdown_v2, "fit_markdown", None)
+        if fit_markdown and fit_markdown.strip():
+            return fit_markdown
+        return results.markdown
 
 
 
@@ -7,7 +7,7 @@ from ..state import State
 from utils.memory import store
 
 from langgraph.graph import StateGraph
-from langgraph.checkpoint.memory import MemorySaver
+from utils.checkpointer import checkpointer_for
 
 builder = StateGraph(State)
 
@@ -25,7 +25,7 @@ builder.set_entry_point(agent_manager.web_query_agent)
 
 
 # # Compile the graph
-checkpointer = MemorySaver()
+checkpointer = checkpointer_for("web")
 web_agent_graph = builder.compile(checkpointer=checkpointer, store=store)
 
 # async def build_copilot_agent_graph():
@@ -19,7 +19,7 @@ class WebWriterAgent(WriterAgent):
         super().__init__(system_prompt=system_prompt,*args, **kwargs)
 
     @extract_agent_results(agent_manager.writer_agent)
-    async def run(self,state: State, user_input: str | None = None) -> ResultDataT:
+    async def run(self,state: State, user_input: str | None = None, on_partial=None) -> ResultDataT:
         user_id = state.get("user_id")
         if not user_id:
             raise ValueError("User ID not found in state")
@@ -47,7 +47,8 @@ class WebWriterAgent(WriterAgent):
             type='text', 
             user_prompt=str(prompt),
             deps=model_config["deps"],
-            model=model_config["model"]
+            model=model_config["model"],
+            on_partial=on_partial
             )
         state["message_history"] = previous_messages + response.new_messages()
         return response
@@ -56,9 +57,10 @@ class WebWriterAgent(WriterAgent):
         Literal[agent_manager.end, agent_manager.human_node]]:
             
         user_input = state["human_response"] if "human_response" in state else None
-        response = await self.run(state, user_input)
+        # Tokens go to the socket as they are generated
+        async with self.stream_to_socket(state["ws_id"]) as on_partial:
+            response = await self.run(state, user_input, on_partial=on_partial)
         content = convert_to_markdown(response.data.content)
-        ws_id = state["ws_id"]
         sources, images = self.extract_results(state)
        
         await self.send_signals(
@@ -67,6 +69,7 @@ class WebWriterAgent(WriterAgent):
             images=images,
             sources=sources,
             # products=product_data
+            streamed=on_partial is not None
         )
 
         # await self.evaluate_chat_limit(state)
@@ -42,7 +42,7 @@ class WriterAgent(BaseAgent):
 
     # Secure wrapper to handle agent responses safely
     @extract_agent_results(agent_manager.writer_agent)
-    async def run(self,state: State) -> ResultDataT:
+    async def run(self,state: State, on_partial=None) -> ResultDataT:
         search_result = state["agent_results"][agent_manager.search_tool]
         instructions = state["agent_results"][agent_manager.planner_agent]["content"]["writer_instructions"]
         
@@ -57,14 +57,16 @@ class WriterAgent(BaseAgent):
         # ws = state["ws"]
         # await ws.send_json()
         # we for started compiling
-        response = await self.llm.run(str(prompt), message_history=past_conversations)
+        response = await self._run_llm(str(prompt), message_history=past_conversations, on_partial=on_partial)
         return response
 
     async def __call__(self, state: State, config={}) -> Command[Literal[agent_manager.end]]:
         try:
-            response = await self.run(state)
-            content = convert_to_markdown(response.data.content)
             ws_id: WebSocket = state["ws_id"]
+            # Tokens go to the socket as they are generated
+            async with self.stream_to_socket(ws_id) as on_partial:
+                response = await self.run(state, on_partial=on_partial)
+            content = convert_to_markdown(response.data.content)
             search_results = state["agent_results"][agent_manager.search_tool]
             
             images = []
@@ -91,7 +93,8 @@ class WriterAgent(BaseAgent):
 
 
             await self.websocket_manager.send_sources(ws_id, sources)
-            await self.websocket_manager.send_json(ws_id, {"type":"message","content":content})
+            if on_partial is None:
+                await self.websocket_manager.send_json(ws_id, {"type":"message","content":content})
             await self.websocket_manager.send_json(ws_id, {"type":"messageEnd","content":content})
             await self.websocket_manager.send_images(ws_id, images)
             state["ai_response"] = content
@@ -1,6 +1,6 @@
 from .chat.route import router as chat_router
 from .auth.route import router as auth_router
-from .product.route import router as product_router, queue_worker
+from .product.route import router as product_router
 from .track.route import router as track_router
 from .payments.route import router as payment_router
 from .admin.route import router as admin_router
@@ -11,7 +11,6 @@ __all__ = [
     "auth_router",
     "product_router",
     "track_router",
-    "queue_worker",
     "payment_router",
     "admin_router",
 ]
\ No newline at end of file
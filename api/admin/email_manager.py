@@ -1,5 +1,7 @@
+import asyncio
 from typing import List, Dict, Optional, Union
 from utils.celery_tasks import send_bulk_email
+from utils.email_manager import manager as account_manager
 from utils.logging import logger
 from .model import EmailConfig, EmailTemplate
 
@@ -65,6 +67,27 @@ class EmailManager:
             logger.error(f"Error sending bulk email: {str(e)}")
             raise
 
+    def get_delivery_stats(self) -> Dict:
+        """SMTP pool, rate limit and dead letter counters"""
+        delivery = account_manager.delivery
+        return {**delivery.stats.to_dict(), "dead_letters": len(delivery.dead_letters)}
+
+    async def replay_dead_letters(self, limit: Optional[int] = None) -> Dict:
+        """
+        Send dead lettered emails again
+
+        Args:
+            limit: Most emails to replay, all of them when None
+
+        Returns:
+            Dict with sent and failed counts; failures go back in the queue
+        """
+        try:
+            return await asyncio.to_thread(account_manager.delivery.replay_dead_letters, limit)
+        except Exception as e:
+            logger.error(f"Error replaying dead letters: {str(e)}")
+            raise
+
     async def _get_recipients(self, filter_criteria: str) -> List[str]:
         """
         Get list of recipient emails based on filter criteria
@@ -20,6 +20,11 @@ from .email_manager import EmailManager
 from .schema import AdminUserIn, EmailTemplatePreview, EmailTemplateResponse, SendEmailRequest
 from ..auth.services import get_user_by_email, authenticate_user, create_access_token, split_name
 from db import user_db
+from api.payments.usage import usage_aggregator
+from utils.queue import scheduler
+from utils.key_scheduler import gemini_keys, serp_keys
+from utils.llm_cache import llm_cache
+from agents.memory_consolidation import memory_consolidator
 
 from utils.decorator import admin_required, super_admin_required
 from utils.logging import logger
@@ -274,6 +279,61 @@ async def get_dashboard_stats():
 
 
 # @admin_required
+@router.get("/usage-metrics")
+@admin_required
+async def get_usage_metrics(request: Request):
+    """Buffered usage counters and how far behind Appwrite they are"""
+    return usage_aggregator.stats.to_dict()
+
+
+@router.get("/queue-metrics")
+@admin_required
+async def get_queue_metrics(request: Request):
+    """Search admission queue depth, shedding and wait times"""
+    return {
+        **scheduler.stats.to_dict(),
+        "estimated_wait": round(scheduler.estimated_wait(), 3),
+    }
+
+
+@router.get("/memory-metrics")
+@admin_required
+async def get_memory_metrics(request: Request):
+    """Background memory consolidation backlog, batching and drops"""
+    return memory_consolidator.stats.to_dict()
+
+
+@router.get("/email-metrics")
+@admin_required
+async def get_email_metrics(request: Request):
+    """SMTP sends, retries, rate limit waits and dead letters"""
+    return email_manager.get_delivery_stats()
+
+
+@router.post("/email/dead-letters/replay")
+@admin_required
+async def replay_dead_letters(request: Request, limit: Optional[int] = Query(None, ge=1)):
+    """Send dead lettered emails again"""
+    return await email_manager.replay_dead_letters(limit)
+
+
+@router.get("/llm-keys")
+@admin_required
+async def get_llm_key_utilization(request: Request):
+    """Per key Gemini quota use, 429s and quarantine"""
+    return {
+        gemini_keys.name: gemini_keys.utilization(),
+        serp_keys.name: serp_keys.utilization(),
+    }
+
+
+@router.get("/llm-cache")
+@admin_required
+async def get_llm_cache_stats(request: Request):
+    """Agent response cache hit rate and tokens saved"""
+    return llm_cache.stats.to_dict()
+
+
 @router.get("/charts")
 async def get_dashboard_graphs():
     """Get graph data for dashboard visualizations"""
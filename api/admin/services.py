@@ -62,38 +62,36 @@ def generate_email_html(request: 'SendEmailRequest', template: Dict[str, str]) -
 
 async def get_user_growth_data(today: datetime) -> Dict:
     """Get monthly user growth data for the last 6 months"""
-    months_data = {"labels": [], "data": []}
-    
+    months = []
     for i in range(5, -1, -1):  # Last 6 months
         # Calculate target month
         target_date = today.replace(day=1) - timedelta(days=1)  # Last day of previous month
         target_date = target_date.replace(day=1)  # First day of that month
         target_date = target_date - timedelta(days=30*i)  # Go back i months
-        
-        month_str = target_date.strftime("%Y-%m")
-        month_name = target_date.strftime("%b")  # Short month name
-        
-        # Get monthly stats
-        monthly_stats = await MonthlyLog.get_or_create(month_str)
-        
-        months_data["labels"].append(month_name)
-        months_data["data"].append(monthly_stats.total_users)
-    
-    return months_data
+        months.append(target_date)
+
+    # Issued together so the reads are batched into one Appwrite call
+    monthly_stats = await gather(
+        *(MonthlyLog.get_or_create(target_date.strftime("%Y-%m")) for target_date in months)
+    )
+
+    return {
+        "labels": [target_date.strftime("%b") for target_date in months],  # Short month name
+        "data": [stats.total_users for stats in monthly_stats]
+    }
+
+async def get_last_week_logs(today: datetime) -> List[tuple]:
+    """(date, DailyLog) pairs for the last 7 days, read in one batch"""
+    days = [today - timedelta(days=i) for i in range(6, -1, -1)]
+    daily_stats = await gather(*(DailyLog.get_or_create(day.strftime("%Y-%m-%d")) for day in days))
+    return list(zip(days, daily_stats))
 
 async def get_daily_users_data(today: datetime) -> Dict:
     """Get daily new users data for the last 7 days"""
     days_data = {"labels": [], "data": []}
     
-    for i in range(6, -1, -1):  # Last 7 days
-        target_date = today - timedelta(days=i)
-        day_str = target_date.strftime("%Y-%m-%d")
-        day_name = target_date.strftime("%a")  # Short day name
-        
-        # Get daily stats
-        daily_stats = await DailyLog.get_or_create(day_str)
-        
-        days_data["labels"].append(day_name)
+    for target_date, daily_stats in await get_last_week_logs(today):
+        days_data["labels"].append(target_date.strftime("%a"))  # Short day name
         days_data["data"].append(daily_stats.total_users)
     
     return days_data
@@ -102,20 +100,13 @@ async def get_error_rate_data(today: datetime) -> Dict:
     """Get daily error rate data for the last 7 days"""
     error_data = {"labels": [], "data": []}
     
-    for i in range(6, -1, -1):  # Last 7 days
-        target_date = today - timedelta(days=i)
-        day_str = target_date.strftime("%Y-%m-%d")
-        day_name = target_date.strftime("%a")  # Short day name
-        
-        # Get daily stats
-        daily_stats = await DailyLog.get_or_create(day_str)
-        
+    for target_date, daily_stats in await get_last_week_logs(today):
         # Calculate error rate
         error_rate = 0
         if daily_stats.no_of_transactions > 0:
             error_rate = round((daily_stats.no_of_errors / daily_stats.no_of_transactions) * 100, 1)
         
-        error_data["labels"].append(day_name)
+        error_data["labels"].append(target_date.strftime("%a"))  # Short day name
         error_data["data"].append(error_rate)
     
     return error_data
@@ -1,7 +1,8 @@
-from typing import Optional
+from typing import Any, Optional
+import time
 import random
 
-from config import EMAIL_CACHE_DIR  # Make sure to set this in your config
+from config import EMAIL_CACHE_DIR, USER_CACHE_DIR, USER_CACHE_TTL  # Make sure to set this in your config
 from utils.logging import logger
 from diskcache import Cache
 
@@ -46,5 +47,79 @@ class EmailValidationManager:
             logger.error(f"Failed to validate code for {email}: {str(e)}")
             return False
 
+
+class UserCache:
+    """
+    Authenticated users keyed by token jti (or subject for older tokens).
+
+    Entries live for USER_CACHE_TTL seconds at most and never past the token's
+    own expiry. Every entry is tagged with the user id, so invalidate(user_id)
+    drops all of a user's tokens at once. It is disk backed so an invalidation
+    in one worker is seen by the others on the same host.
+    """
+
+    VERSION_KEY = "__version__"
+    # Credentials never leave Appwrite, the cache is plain pickles on local disk
+    SECRET_FIELDS = ("hash", "password", "hashOptions", "passwordUpdate")
+
+    def __init__(self, ttl: int = USER_CACHE_TTL):
+        self.cache = Cache(directory=str(USER_CACHE_DIR))
+        self.cache.create_tag_index()
+        self.ttl = ttl
+
+    @staticmethod
+    def token_key(claims: dict) -> Optional[str]:
+        key = claims.get("jti") or claims.get("sub")
+        return f"user:{key}" if key else None
+
+    def version(self) -> int:
+        return self.cache.get(self.VERSION_KEY, 0)
+
+    @classmethod
+    def principal(cls, user: Any) -> Any:
+        """The user without password hashes or hashing options."""
+        return user.model_copy(update={field: None for field in cls.SECRET_FIELDS})
+
+    def get(self, claims: dict) -> Optional[Any]:
+        key = self.token_key(claims)
+        if key is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Failed to read cached user: {str(e)}")
+            return None
+
+    def set(self, claims: dict, user: Any, version: int):
+        """
+        Cache the user loaded for these claims, without its secrets. version is
+        version() read before the load started, if anything was invalidated
+        since the load may be stale.
+        """
+        key = self.token_key(claims)
+        if key is None or self.version() != version:
+            return
+
+        expire = float(self.ttl)
+        if claims.get("exp"):
+            expire = min(expire, float(claims["exp"]) - time.time())
+        if expire <= 0:
+            return
+
+        try:
+            self.cache.set(key, self.principal(user), expire=expire, tag=user.id)
+        except Exception as e:
+            logger.error(f"Failed to cache user {user.id}: {str(e)}")
+
+    def invalidate(self, user_id: str):
+        """Call after changing a user's profile, labels, prefs, password or status."""
+        try:
+            self.cache.incr(self.VERSION_KEY)
+            self.cache.evict(user_id)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached user {user_id}: {str(e)}")
+
+
 # Create a singleton instance
 email_validation_manager = EmailValidationManager()
+user_cache = UserCache()
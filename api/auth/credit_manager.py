@@ -1,38 +1,174 @@
 import asyncio
-from api.auth.model import UserCredits
-from api.payments.model import DailyUsage
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional
+
+from api.auth.ledger import credit_ledger, Reservation
+from api.payments.usage import usage_aggregator
 from utils.logging import logger
 
-async def check_credits(user_id: str, type: str, amount: int = None) -> tuple[bool, int]:
-    """
-    Checks if the user has enough credits.
-    """
+
+def get_cost(type: str, amount: int = None) -> int:
     cost_map = {"text": 5, "image": 10, "amount": amount}
     cost = cost_map.get(type)
 
     if cost is None:
         raise ValueError("Invalid type. Must be 'text' or 'image' or 'amount'.")
+    return cost
 
-    credits = await UserCredits.get_or_create(user_id)
-    if credits.balance < cost:
-        return False, credits.balance
+async def check_credits(user_id: str, type: str, amount: int = None) -> tuple[bool, int]:
+    """
+    Checks if the user has enough credits.
+    Only a hint, use reserve_credits when the spend must not overdraw.
+    """
+    cost = get_cost(type, amount)
+
+    balance = await credit_ledger.balance(user_id)
+    if balance < cost:
+        return False, balance
 
-    return True, credits.balance - cost
+    return True, balance - cost
+
+async def reserve_credits(user_id: str, type: str, amount: int = None) -> tuple[Optional[Reservation], int]:
+    """
+    Holds the cost of an operation before it runs.
+    Returns (reservation, balance), reservation is None if the user can't afford it.
+    """
+    cost = get_cost(type, amount)
+    return await credit_ledger.reserve(user_id, cost, f"llm_usage_{type}")
+
+async def commit_credits(reservation: Reservation, amount: int = None) -> int:
+    """
+    Spends a reservation once the operation succeeded and records the daily usage.
+    """
+    spent = reservation.amount if amount is None else amount
+    new_balance = await credit_ledger.commit(reservation, spent)
+    usage_aggregator.record(reservation.user_id, spent)
+    logger.info(f"Credits tracked for user {reservation.user_id}: cost {spent}, new balance {new_balance}")
+    return new_balance
+
+async def refund_credits(reservation: Reservation) -> int:
+    """
+    Releases a reservation after the operation failed.
+    """
+    return await credit_ledger.refund(reservation)
 
 async def track_credits(user_id: str, type: str, amount=None, tokens: dict = None) -> None:
     """
     Tracks credit usage and updates balances.
     """
-    cost_map = {"text": 5, "image": 10, "amount": amount}
-    cost = cost_map.get(type)
-
-    if cost is None:
-        raise ValueError("Invalid type. Must be 'text' or 'image'.")
+    cost = get_cost(type, amount)
 
-    # Deduct credits atomically
-    new_balance, success = await UserCredits.update_balance(user_id, -cost, f"llm_usage_{type}")
+    # Reserve and spend in one step, the ledger serializes it per user
+    new_balance, success = await credit_ledger.charge(user_id, cost, f"llm_usage_{type}")
     if not success:
         raise ValueError("Insufficient credits")
 
-    await DailyUsage.update_usage(user_id, cost)
-    logger.info(f"Credits tracked for user {user_id}: cost {cost}, new balance {new_balance}") 
\ No newline at end of file
+    usage_aggregator.record(user_id, cost)
+    logger.info(f"Credits tracked for user {user_id}: cost {cost}, new balance {new_balance}")
+
+
+# Estimated credits a run holds up front, per focus mode. A run that needs
+# more tops up, one that needs less gets the rest back at the end.
+SESSION_BUDGETS = {"ultrasearch": 100, "copilot": 40, "insights": 40, "all": 25}
+DEFAULT_SESSION_BUDGET = 25
+
+_session_budget: ContextVar[Optional["CreditBudget"]] = ContextVar("credit_budget", default=None)
+
+
+class CreditBudget:
+    """
+    Credits reserved once for a whole agent run.
+
+    LLM calls inside the run spend from it locally, with no ledger or Appwrite
+    round trip, and only go back to the ledger to top up when it runs out.
+    The run settles it once at the end, see session_budget().
+    """
+
+    def __init__(self, user_id: str, reason: str, top_up: int):
+        self.user_id = user_id
+        self.reason = reason
+        self.top_up = top_up
+        self.reservations: List[Reservation] = []
+        self.reserved = 0
+        self.spent = 0
+        self.calls = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def remaining(self) -> int:
+        return self.reserved - self.spent
+
+    async def _reserve(self, amount: int) -> bool:
+        reservation, available = await credit_ledger.reserve(self.user_id, amount, self.reason)
+        if reservation is None and available > 0:
+            # Take what is left rather than failing a run that may fit in it
+            reservation, _ = await credit_ledger.reserve(self.user_id, min(amount, available), self.reason)
+        if reservation is None:
+            return False
+        self.reservations.append(reservation)
+        self.reserved += reservation.amount
+        return True
+
+    async def consume(self, type: str, amount: int = None) -> int:
+        """Spend the cost of one call, raises ValueError when the user is out of credits."""
+        cost = get_cost(type, amount)
+        if self.remaining < cost:
+            async with self._lock:
+                while self.remaining < cost:
+                    if not await self._reserve(max(cost, self.top_up)):
+                        raise ValueError(f"Insufficient credits. Available: {self.remaining}")
+        self.spent += cost
+        self.calls += 1
+        return cost
+
+    def release(self, cost: int):
+        """Give back the cost of a call that failed."""
+        self.spent -= cost
+        self.calls -= 1
+
+    async def settle(self) -> Optional[int]:
+        """Spend what the run used and refund the rest, returns the balance afterwards."""
+        balance = None
+        left = self.spent
+        for reservation in self.reservations:
+            used = min(reservation.amount, left)
+            left -= used
+            balance = await credit_ledger.commit(reservation, used)
+        if self.spent:
+            usage_aggregator.record(self.user_id, self.spent)
+        logger.info(
+            f"Credit budget for user {self.user_id} settled: {self.spent}/{self.reserved} "
+            f"credits over {self.calls} calls, new balance {balance}"
+        )
+        self.reservations = []
+        return balance
+
+
+def get_session_budget(user_id: str) -> Optional[CreditBudget]:
+    """Budget of the agent run in progress for this user, None outside a run."""
+    budget = _session_budget.get()
+    if budget is not None and budget.user_id == user_id:
+        return budget
+    return None
+
+
+@asynccontextmanager
+async def session_budget(user_id: str, focus_mode: str = None) -> AsyncIterator[CreditBudget]:
+    """
+    Reserve an estimated budget for a websocket/graph run and settle it once at the end.
+
+        async with session_budget(user_id, focus_mode):
+            await graph.ainvoke(state, config)
+    """
+    estimate = SESSION_BUDGETS.get(focus_mode, DEFAULT_SESSION_BUDGET)
+    budget = CreditBudget(user_id, f"session_{focus_mode}", top_up=max(estimate // 2, get_cost("text")))
+    # Nothing reserved is fine here, the first call tops up or reports the shortfall
+    await budget._reserve(estimate)
+
+    token = _session_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _session_budget.reset(token)
+        await budget.settle()
@@ -0,0 +1,442 @@
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as redis
+
+from config import CREDIT_LEDGER_REDIS_URL, CREDIT_FLUSH_INTERVAL
+from utils.logging import logger
+from .model import UserCredits
+
+
+# Idle in-process accounts are reloaded from Appwrite after this long so
+# changes made elsewhere (Celery price tracking, admin edits) show up
+ACCOUNT_REFRESH_SECONDS = 60
+# Redis accounts with nothing pending expire after a day of inactivity
+REDIS_ACCOUNT_TTL = 24 * 60 * 60
+# A per-user Redis write lock outlives a crashed holder by at most this long
+WRITE_LOCK_TTL_MS = 30_000
+# Longest a deposit or flush waits for another process's write to the same user
+WRITE_LOCK_WAIT = 30.0
+# A flush taken this long ago without being settled belongs to a process that died
+STALE_FLUSH_SECONDS = 120
+
+# balance + pending + flushing - reserved is what the user can still spend.
+# Returns {1, available_after} on success, {-1, available} when short and
+# {-2} when the account is not loaded yet.
+RESERVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then return {-2} end
+local acc = redis.call('HMGET', KEYS[1], 'balance', 'reserved', 'pending', 'flushing')
+local available = tonumber(acc[1]) + tonumber(acc[3] or 0) + tonumber(acc[4] or 0) - tonumber(acc[2] or 0)
+local amount = tonumber(ARGV[1])
+if available < amount then return {-1, available} end
+redis.call('HINCRBY', KEYS[1], 'reserved', amount)
+redis.call('PERSIST', KEYS[1])
+return {1, available - amount}
+"""
+
+# Release a reservation and record what was actually spent, ARGV = reserved, spent, user_id
+COMMIT_SCRIPT = """
+redis.call('HINCRBY', KEYS[1], 'reserved', -tonumber(ARGV[1]))
+if tonumber(ARGV[2]) ~= 0 then
+    redis.call('HINCRBY', KEYS[1], 'pending', -tonumber(ARGV[2]))
+    redis.call('SADD', KEYS[2], ARGV[3])
+end
+local acc = redis.call('HMGET', KEYS[1], 'balance', 'reserved', 'pending', 'flushing')
+return tonumber(acc[1] or 0) + tonumber(acc[3] or 0) + tonumber(acc[4] or 0) - tonumber(acc[2] or 0)
+"""
+
+# Move pending into flushing so new commits keep accumulating while the write is in flight.
+# ARGV = now, stale_after, flush_id. Returns {1, pending}; {-1} while another flush is in
+# flight; {-2, flushing, flush_id} when that flush started stale_after ago and was abandoned.
+TAKE_SCRIPT = """
+local acc = redis.call('HMGET', KEYS[1], 'flushing', 'flush_started', 'flush_id')
+if tonumber(acc[1] or 0) ~= 0 then
+    if tonumber(ARGV[1]) - tonumber(acc[2] or 0) < tonumber(ARGV[2]) then return {-1} end
+    return {-2, tonumber(acc[1]), acc[3] or ''}
+end
+local pending = tonumber(redis.call('HGET', KEYS[1], 'pending') or 0)
+if pending ~= 0 then
+    redis.call('HSET', KEYS[1], 'pending', 0, 'flushing', pending, 'flush_started', ARGV[1], 'flush_id', ARGV[3])
+end
+return {1, pending}
+"""
+
+# ARGV = new persisted balance on success, or '' to put the delta back after a failed write
+SETTLE_SCRIPT = """
+if ARGV[1] == '' then
+    local flushing = tonumber(redis.call('HGET', KEYS[1], 'flushing') or 0)
+    redis.call('HINCRBY', KEYS[1], 'pending', flushing)
+else
+    redis.call('HSET', KEYS[1], 'balance', ARGV[1])
+end
+redis.call('HSET', KEYS[1], 'flushing', 0)
+local acc = redis.call('HMGET', KEYS[1], 'reserved', 'pending')
+if tonumber(acc[1] or 0) == 0 and tonumber(acc[2] or 0) == 0 then
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 1
+"""
+
+# Delete the write lock only if this process still holds it, ARGV = token
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class Reservation:
+    """Credits held for one operation until it is committed or refunded."""
+    user_id: str
+    amount: int
+    reason: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    settled: bool = False
+
+
+@dataclass
+class Account:
+    balance: int = 0        # last balance persisted in Appwrite
+    reserved: int = 0       # held by open reservations
+    pending: int = 0        # committed spend not flushed yet (negative)
+    loaded_at: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Serializes Appwrite writes for the user, update_balance is read-modify-write
+    write_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def available(self) -> int:
+        return self.balance + self.pending - self.reserved
+
+
+class CreditLedger:
+    """
+    Credit accounts that serialize spending per user.
+
+    Spend is reserved before the work and committed (or refunded) after it,
+    so concurrent requests can't both pass the balance check and overdraw.
+    Commits only touch the account; the net spend per user is written to
+    Appwrite in batches every CREDIT_FLUSH_INTERVAL seconds. Deposits
+    (payments, referral bonuses) are written through immediately.
+
+    With a redis_url the accounts live in Redis and every change is a Lua
+    script, so several processes can share them. Without one they live in
+    this process behind a per-user asyncio lock.
+    """
+
+    def __init__(self, redis_url: Optional[str] = None, flush_interval: float = CREDIT_FLUSH_INTERVAL):
+        self.use_redis = redis_url is not None
+        if self.use_redis:
+            self.redis = redis.from_url(redis_url, decode_responses=True)
+            self._reserve = self.redis.register_script(RESERVE_SCRIPT)
+            self._commit = self.redis.register_script(COMMIT_SCRIPT)
+            self._take = self.redis.register_script(TAKE_SCRIPT)
+            self._settle = self.redis.register_script(SETTLE_SCRIPT)
+            self._release = self.redis.register_script(RELEASE_SCRIPT)
+        else:
+            self.accounts: Dict[str, Account] = {}
+            self._dirty: set = set()
+
+        self.flush_interval = flush_interval
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    # Keys
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return f"credits:{user_id}"
+
+    DIRTY_KEY = "credits:dirty"
+
+    @staticmethod
+    def _write_key(user_id: str) -> str:
+        return f"ledger:{user_id}:write"
+
+    @asynccontextmanager
+    async def _redis_write_lock(self, user_id: str):
+        """
+        Serializes Appwrite writes for the user across processes, as
+        Account.write_lock does in one; update_balance is read-modify-write.
+        """
+        key = self._write_key(user_id)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + WRITE_LOCK_WAIT
+        while not await self.redis.set(key, token, nx=True, px=WRITE_LOCK_TTL_MS):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for the credit write lock of user {user_id}")
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            await self._release(keys=[key], args=[token])
+
+    # Accounts
+
+    def _account(self, user_id: str) -> Account:
+        account = self.accounts.get(user_id)
+        if account is None:
+            account = self.accounts[user_id] = Account()
+        return account
+
+    async def _refresh(self, user_id: str, account: Account):
+        """Load the balance from Appwrite when new or idle for a while, caller holds account.lock."""
+        idle = account.reserved == 0 and account.pending == 0
+        if account.loaded_at and not (idle and time.monotonic() - account.loaded_at > ACCOUNT_REFRESH_SECONDS):
+            return
+        credits = await UserCredits.get_or_create(user_id)
+        account.balance = credits.balance
+        account.loaded_at = time.monotonic()
+
+    async def _load_redis(self, user_id: str):
+        credits = await UserCredits.get_or_create(user_id)
+        key = self._key(user_id)
+        # Another process may have loaded it meanwhile, HSETNX keeps theirs
+        await self.redis.hsetnx(key, "balance", credits.balance)
+        await self.redis.expire(key, REDIS_ACCOUNT_TTL)
+
+    async def balance(self, user_id: str) -> int:
+        """Credits the user can still spend, open reservations excluded."""
+        if self.use_redis:
+            values = await self.redis.hmget(self._key(user_id), "balance", "reserved", "pending", "flushing")
+            if values[0] is None:
+                await self._load_redis(user_id)
+                return await self.balance(user_id)
+            balance, reserved, pending, flushing = (int(v or 0) for v in values)
+            return balance + pending + flushing - reserved
+
+        account = self._account(user_id)
+        async with account.lock:
+            await self._refresh(user_id, account)
+            return account.available
+
+    # Spending
+
+    async def reserve(self, user_id: str, amount: int, reason: str = "unknown") -> Tuple[Optional[Reservation], int]:
+        """
+        Hold amount credits for an operation.
+
+        Returns (reservation, available_after). The reservation is None when the
+        user can't afford it, available is then what they have.
+        """
+        if amount < 0:
+            raise ValueError("Reservation amount must not be negative")
+
+        if self.use_redis:
+            key = self._key(user_id)
+            result = await self._reserve(keys=[key], args=[amount])
+            if result[0] == -2:
+                await self._load_redis(user_id)
+                result = await self._reserve(keys=[key], args=[amount])
+            if result[0] != 1:
+                return None, int(result[1]) if len(result) > 1 else 0
+            return Reservation(user_id, amount, reason), int(result[1])
+
+        account = self._account(user_id)
+        async with account.lock:
+            await self._refresh(user_id, account)
+            if account.available < amount:
+                return None, account.available
+            account.reserved += amount
+            return Reservation(user_id, amount, reason), account.available
+
+    async def commit(self, reservation: Reservation, amount: Optional[int] = None) -> int:
+        """
+        Spend a reservation. amount defaults to the reserved amount, a smaller
+        amount releases the rest. Returns the available balance afterwards.
+        """
+        if reservation.settled:
+            raise ValueError(f"Reservation {reservation.id} is already settled")
+        reservation.settled = True
+        spent = reservation.amount if amount is None else max(0, amount)
+
+        if self.use_redis:
+            available = await self._commit(
+                keys=[self._key(reservation.user_id), self.DIRTY_KEY],
+                args=[reservation.amount, spent, reservation.user_id],
+            )
+            return int(available)
+
+        account = self._account(reservation.user_id)
+        async with account.lock:
+            account.reserved -= reservation.amount
+            account.pending -= spent
+            if spent:
+                self._dirty.add(reservation.user_id)
+            return account.available
+
+    async def refund(self, reservation: Reservation) -> int:
+        """Release a reservation without spending it."""
+        if reservation.settled:
+            return await self.balance(reservation.user_id)
+        return await self.commit(reservation, 0)
+
+    async def charge(self, user_id: str, amount: int, reason: str = "unknown") -> Tuple[int, bool]:
+        """Reserve and commit in one go, for spend that happens after the fact."""
+        reservation, available = await self.reserve(user_id, amount, reason)
+        if reservation is None:
+            return available, False
+        return await self.commit(reservation), True
+
+    async def deposit(self, user_id: str, amount: int, reason: str = "unknown") -> Tuple[int, bool]:
+        """Add (or with a negative amount, take) credits and persist them right away."""
+        if self.use_redis:
+            async with self._redis_write_lock(user_id):
+                new_balance, success = await UserCredits.update_balance(user_id, amount, reason)
+                if success:
+                    key = self._key(user_id)
+                    if await self.redis.hexists(key, "balance"):
+                        await self.redis.hincrby(key, "balance", amount)
+            return new_balance, success
+
+        account = self._account(user_id)
+        async with account.write_lock:
+            new_balance, success = await UserCredits.update_balance(user_id, amount, reason)
+            if success:
+                async with account.lock:
+                    account.balance = new_balance
+                    account.loaded_at = time.monotonic()
+            return new_balance, success
+
+    # Flushing
+
+    async def flush(self) -> int:
+        """Write the net committed spend of every dirty account to Appwrite. Returns accounts written."""
+        async with self._flush_lock:
+            if self.use_redis:
+                return await self._flush_redis()
+            return await self._flush_local()
+
+    async def _flush_local(self) -> int:
+        dirty, self._dirty = self._dirty, set()
+        written = 0
+        for user_id in dirty:
+            account = self.accounts.get(user_id)
+            if account is None:
+                continue
+            async with account.write_lock:
+                async with account.lock:
+                    delta = account.pending
+                if delta == 0:
+                    continue
+                try:
+                    new_balance, _ = await UserCredits.update_balance(
+                        user_id, delta, "ledger_flush", allow_negative=True
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to flush {delta} credits for user {user_id}: {str(e)}")
+                    self._dirty.add(user_id)
+                    continue
+                async with account.lock:
+                    account.balance = new_balance
+                    account.pending -= delta
+                    account.loaded_at = time.monotonic()
+                written += 1
+
+        # Drop idle accounts so the dict doesn't grow with every user ever seen
+        cutoff = time.monotonic() - ACCOUNT_REFRESH_SECONDS * 10
+        for user_id, account in list(self.accounts.items()):
+            if account.reserved == 0 and account.pending == 0 and account.loaded_at < cutoff and not account.lock.locked():
+                del self.accounts[user_id]
+        return written
+
+    async def _flush_redis(self) -> int:
+        written = 0
+        busy = []
+        try:
+            while True:
+                user_id = await self.redis.spop(self.DIRTY_KEY)
+                if user_id is None:
+                    return written
+                try:
+                    async with self._redis_write_lock(user_id):
+                        flushed = await self._flush_redis_account(user_id)
+                except Exception as e:
+                    logger.error(f"Failed to flush credits for user {user_id}: {str(e)}")
+                    await self.redis.sadd(self.DIRTY_KEY, user_id)
+                    return written
+                if flushed is None:
+                    busy.append(user_id)
+                else:
+                    written += flushed
+        finally:
+            # Their spend is still pending, keep them for the next flush
+            if busy:
+                await self.redis.sadd(self.DIRTY_KEY, *busy)
+
+    async def _take_pending(self, user_id: str, flush_id: str) -> list:
+        return await self._take(
+            keys=[self._key(user_id)], args=[time.time(), STALE_FLUSH_SECONDS, flush_id]
+        )
+
+    async def _reclaim(self, user_id: str, delta: int, flush_id: str):
+        """
+        Settle a flush whose process died between TAKE and SETTLE. Its write
+        landed if the credits record still names it, otherwise the delta goes
+        back to pending.
+        """
+        key = self._key(user_id)
+        credits = await UserCredits.get_or_create(user_id)
+        if flush_id and credits.last_transaction == f"ledger_flush:{flush_id}:{delta}":
+            await self._settle(keys=[key], args=[credits.balance, REDIS_ACCOUNT_TTL])
+        else:
+            await self._settle(keys=[key], args=["", REDIS_ACCOUNT_TTL])
+        logger.warning(f"Reclaimed an abandoned flush of {delta} credits for user {user_id}")
+
+    async def _flush_redis_account(self, user_id: str) -> Optional[int]:
+        """Write one user's pending spend, caller holds their write lock. None while another flush is in flight."""
+        key = self._key(user_id)
+        flush_id = uuid.uuid4().hex
+        result = await self._take_pending(user_id, flush_id)
+        if result[0] == -1:
+            return None
+        if result[0] == -2:
+            await self._reclaim(user_id, int(result[1]), result[2])
+            result = await self._take_pending(user_id, flush_id)
+            if result[0] != 1:
+                return None
+
+        delta = int(result[1])
+        if delta == 0:
+            return 0
+        try:
+            # The flush id in last_transaction lets _reclaim tell whether this write landed
+            new_balance, _ = await UserCredits.update_balance(
+                user_id, delta, f"ledger_flush:{flush_id}", allow_negative=True
+            )
+        except Exception:
+            await self._settle(keys=[key], args=["", REDIS_ACCOUNT_TTL])
+            raise
+        await self._settle(keys=[key], args=[new_balance, REDIS_ACCOUNT_TTL])
+        return 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Credit ledger flush failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flush loop and write everything still pending."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+        if self.use_redis:
+            await self.redis.aclose()
+
+
+credit_ledger = CreditLedger(CREDIT_LEDGER_REDIS_URL)
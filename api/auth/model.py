@@ -139,8 +139,9 @@ class Referral(AppwriteModelBase):
             })
 
             # Update credits for both users
-            await UserCredits.update_balance(user_to_refer_id, 250, "referral_bonus_recipient")
-            await UserCredits.update_balance(user_id, 500, "referral_bonus_referrer")
+            from .ledger import credit_ledger
+            await credit_ledger.deposit(user_to_refer_id, 250, "referral_bonus_recipient")
+            await credit_ledger.deposit(user_id, 500, "referral_bonus_referrer")
 
             # Get and return updated referral object
             return await cls.get_referral_by_user_id(user_id)
@@ -231,14 +232,21 @@ class UserCredits(AppwriteModelBase):
             raise
 
     @classmethod
-    async def update_balance(cls, user_id: str, delta: int, transaction_type: str = "unknown") -> tuple[int, bool]:
+    async def update_balance(
+        cls, user_id: str, delta: int, transaction_type: str = "unknown", allow_negative: bool = False
+        ) -> tuple[int, bool]:
         """
-        Update user's credit balance atomically.
+        Write a balance change straight to Appwrite (read-modify-write).
+
+        Request handlers should go through api.auth.ledger.credit_ledger, which
+        serializes spending per user and calls this when it flushes.
         
         Args:
             user_id: The user's ID
             delta: Amount to add (positive) or subtract (negative)
             transaction_type: Type of transaction for logging
+            allow_negative: Record the change even if the balance goes below zero,
+                used for spend the ledger already approved
             
         Returns:
             tuple[new_balance, success]
@@ -251,12 +259,10 @@ class UserCredits(AppwriteModelBase):
             # Calculate new balance
             new_balance = current_balance + delta
             
-            if new_balance < 0:
+            if new_balance < 0 and not allow_negative:
                 logger.warning(f"Attempted negative balance for user {user_id}: current={current_balance}, delta={delta}")
                 return current_balance, False
             
-            now = datetime.now().isoformat()
-            
             # Update with transaction info
             await cls.update(user_id, {
                 "balance": new_balance,
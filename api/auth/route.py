@@ -18,7 +18,7 @@ from config import (
 
 from utils.decorator import auth_required
 from utils.logging import logger
-from .cache import email_validation_manager
+from .cache import email_validation_manager, user_cache
 
 from appwrite import query
 from fastapi import Request, Query
@@ -134,7 +134,7 @@ async def google_callback(request: Request, background_tasks: BackgroundTasks, c
         # For existing users, format the response
         is_pro = True if "subscribed" in existing_user["labels"] else False
         first_name, last_name = existing_user["name"].rsplit("_", 1)
-        access_token = services.create_access_token(data={"sub": existing_user["email"]})
+        access_token = services.create_access_token(data={"sub": existing_user["email"], "uid": existing_user["$id"]})
         
         user_data = {
             "id": existing_user["$id"],
@@ -188,6 +188,7 @@ async def verify_account(
     if code == valid_code:
         await asyncio.to_thread(user_db.update_status, user.id, True)
         await asyncio.to_thread(user_db.update_email_verification, user.id, True)
+        user_cache.invalidate(user.id)
         background.add_task(send_formal_welcome_email, email, name[0])
         return {"message": "success"}
     raise HTTPException(status_code=400, detail="Invalid verification code")
@@ -210,6 +211,7 @@ async def verify_account(
     
     await asyncio.to_thread(user_db.update_status, user["user_id"], True)
     await asyncio.to_thread(user_db.update_email_verification, user["user_id"], True)
+    user_cache.invalidate(user["user_id"])
     background.add_task(send_formal_welcome_email, payload.email, user["first_name"])
 
     return user_dict
@@ -224,6 +226,7 @@ async def forgot_password(background_tasks: BackgroundTasks, email: str = Body()
 
     code = services.generate_random_six_digit_number()
     user_db.update_prefs(user.id, {"code": code})
+    user_cache.invalidate(user.id)
     first_name, last_name = services.split_name(user.name)
     # send user email for otp
     background_tasks.add_task(send_forgot_password_email, email, first_name, code)
@@ -261,6 +264,7 @@ async def change_forgot_password(email: str = Body(), code: int = Body(),  passw
 
     password = services.get_password_hash(password)
     await asyncio.to_thread(user_db.update_password, user.id, password)
+    user_cache.invalidate(user.id)
     return {"message": "success"}
 
     
@@ -277,6 +281,7 @@ async def change_user_password(request: Request, currentPassword: str = Body(),
 
     new_hash_password = services.get_password_hash(newPassword)
     await asyncio.to_thread(user_db.update_password, user.id, new_hash_password)
+    user_cache.invalidate(user.id)
 
     return {"message": "Password changes successfully"}
 
@@ -309,7 +314,7 @@ async def login(request: Request, payload: LoginSchema):
             detail="Incorrect email or password"
         )
     
-    access_token = services.create_access_token(data={"sub": user.email})
+    access_token = services.create_access_token(data={"sub": user.email, "uid": user.id})
     first_name, last_name = user.name.rsplit("_", 1)
     is_pro = True if "subscribed" in user.labels else False
     image_data = None
@@ -360,7 +365,9 @@ async def set_notifications(
     notifications: bool ):
         
     user = request.state.user      
-    return await asyncio.to_thread(user_db.update_prefs, user.id, {"notification": notifications})
+    response = await asyncio.to_thread(user_db.update_prefs, user.id, {"notification": notifications})
+    user_cache.invalidate(user.id)
+    return response
 
 
 @auth_required
@@ -470,6 +477,7 @@ async def update_profile(request: Request, payload: Profile = Depends()):
 
     if tasks:
         await asyncio.gather(*tasks)
+        user_cache.invalidate(user.id)
 
     return {"message": "Profile updated successfully"}
 
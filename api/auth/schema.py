@@ -112,6 +112,11 @@ class UserPublic(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class TokenUser(BaseModel):
+    """Identity carried in the access token, trusted by read-only routes."""
+    id: str
+    email: str
+
 
 class ReferralSchemaOut(BaseModel):
     id: str 
@@ -1,3 +1,4 @@
+import uuid
 import random
 import asyncio
 from typing import Any, Optional
@@ -8,7 +9,8 @@ from db import user_db
 from .model import UserProfile, UserPreferences
 
 from config import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
-from .schema import UserIn, TokenData, UserOut
+from .schema import UserIn, TokenData, TokenUser, UserOut
+from .cache import user_cache
 from .schema_in import ProfileSchema, UserCreate
 
 from api.admin.services import system_log
@@ -69,9 +71,13 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+    """
+    data carries "sub" (email) and, where known, "uid" (user id). The jti keys
+    the authenticated user cache and uid lets read-only routes skip the lookup.
+    """
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
@@ -139,13 +145,39 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserIn:
         token_data = TokenData(email=email)
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
-    
+
+    user = user_cache.get(payload)
+    if user is not None:
+        return user
+
+    version = user_cache.version()
     user = await get_user_by_email(token_data.email)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
+    # Same shape as a cache hit, so no route comes to rely on the hash being there
+    user = user_cache.principal(user)
+    user_cache.set(payload, user, version)
     return user
 
 
+async def get_token_user(token: str = Depends(oauth2_scheme)) -> TokenUser:
+    """
+    Identity straight from the token claims, for read-only routes that only
+    need the user's id. Costs a signature check, no Appwrite lookup. Tokens
+    issued before uid was embedded fall back to get_current_user.
+    """
+    try:
+        payload = decode_access_token(token)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if payload.get("uid") and payload.get("sub"):
+        return TokenUser(id=payload["uid"], email=payload["sub"])
+
+    user = await get_current_user(token)
+    return TokenUser(id=user.id, email=user.email)
+
+
 async def create_new_user(payload: UserCreate, background_tasks: BackgroundTasks):
     user = await get_user_by_email(payload.email)
     if user:
@@ -211,7 +243,7 @@ async def create_new_user(payload: UserCreate, background_tasks: BackgroundTasks
         updated_at=response["$updatedAt"]
     )
     
-    access_token = create_access_token(data={"sub": payload.email})
+    access_token = create_access_token(data={"sub": payload.email, "uid": response["$id"]})
     await system_log("user")
     return  {
         "user": user,
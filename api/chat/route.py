@@ -8,8 +8,8 @@ from utils.decorator import auth_required
 from utils.search_cache import search_cache_manager
 
 from config import PRODUCTION_MODE
-from ..auth.services import get_current_user
-from ..auth.schema import UserIn, SearchSuggestion
+from ..auth.services import get_current_user, get_token_user
+from ..auth.schema import UserIn, TokenUser, SearchSuggestion
 from .model import Chat, Message, SavedChat, File
 from .schema import ChatOut, MessageOut, FileOut
 
@@ -61,14 +61,11 @@ async def get_search_suggestions(
 async def get_saved_chats(
     limit: int = Query(25),
     page: int = Query(1),
-    user: UserIn = Depends(get_current_user)):
+    user: TokenUser = Depends(get_token_user)):
 
     saved_chats = await SavedChat.list([query.Query.equal("user_id", user.id)], limit=limit, offset=(page - 1) * limit)
-    chats = []
-    
-    for c in saved_chats["documents"]:
-        chat = await Chat.read(c.chat_id)
-        chats.append(chat.to_dict())
+    chats = await Chat.read_many([c.chat_id for c in saved_chats["documents"]])
+    chats = [chat.to_dict() for chat in chats]
 
     
     return {"message": "Chat starred successfully", "data": chats}
@@ -78,7 +75,7 @@ async def filter_chats(
     dateRange: Literal["all", "today", "week", "month"] = Query(),
     sortBy: Literal["recent", "oldest"] = Query(),
     focusMode: Literal["Q/A" ,"all", "product_hunt"] = Query(),
-    user: UserIn = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     # Calculate the date range filter
     current_date = datetime.now(timezone.utc)
@@ -140,7 +137,7 @@ async def create_new_chat(
 async def get_chats(
     limit: int = Query(25),
     page: int = Query(1),
-    user: UserIn = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
     ):
     response = await Chat.list([
         query.Query.limit(limit), query.Query.offset((page - 1) * limit), 
@@ -154,7 +151,7 @@ async def get_chats(
 
 
 @router.get("/{chat_id}", response_model=MessageOut)
-async def get_chat(chat_id: str, user: UserIn = Depends(get_current_user)):
+async def get_chat(chat_id: str, user: TokenUser = Depends(get_token_user)):
     # Get the chat document
     try:
         chat = await Chat.read(chat_id)
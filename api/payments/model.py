@@ -1,6 +1,7 @@
 import pytz
 import hashlib
-from datetime import datetime
+from typing import Optional
+from datetime import datetime, timezone
 
 from api.auth.schema import UserIn
 from db._appwrite.fields import AppwriteField
@@ -38,6 +39,7 @@ class SubscriptionLog(AppwriteModelBase):
 
 class DailyUsage(AppwriteModelBase):
     collection_id = "daily_usage"
+    metric = "total_credits_used"
     
     # Define model attributes (for schema and local validation if needed)
     user_id: str = AppwriteField()
@@ -45,9 +47,31 @@ class DailyUsage(AppwriteModelBase):
     total_credits_used: int = AppwriteField(type="int", default=0)
 
     @classmethod
-    async def update_usage(cls, user_id: str, credits_used: int, timestamp: datetime = datetime.now(), user_timezone: str = 'UTC') -> None:
+    def period(cls, local_time: datetime) -> dict:
+        return {"day": local_time.strftime("%Y-%m-%d")}
+
+    @classmethod
+    def document_id(cls, user_id: str, local_time: datetime) -> str:
+        # Build a unique document id for daily usage (e.g. "1a2b3c4d_2024-01-15")
+        short_user_id = hashlib.md5(user_id.encode()).hexdigest()[:8]
+        return f"{short_user_id}_{local_time.strftime('%Y-%m-%d')}"
+
+    @classmethod
+    async def increment(cls, document_id: str, data: dict, delta: int) -> None:
+        """Add delta to the usage document, creating it with data if it does not exist yet."""
+        try:
+            # Try to read the existing document.
+            doc = await cls.read(document_id)
+            await cls.update(document_id, {cls.metric: (getattr(doc, cls.metric, 0) or 0) + delta})
+        except AppwriteException:
+            # Document does not exist; create a new one.
+            await cls.create(document_id, {**data, cls.metric: delta})
+
+    @classmethod
+    async def update_usage(cls, user_id: str, credits_used: int, timestamp: Optional[datetime] = None, user_timezone: str = 'UTC') -> None:
         """
         Update daily usage for a given user at the provided timestamp.
+        Writes straight to Appwrite, request paths record through usage_aggregator instead.
         
         :param user_id: The user’s ID.
         :param timestamp: The UTC timestamp of the transaction.
@@ -55,39 +79,32 @@ class DailyUsage(AppwriteModelBase):
         :param user_timezone: The user's timezone (e.g. "America/New_York").
         """
         # Convert the provided timestamp to the user's local timezone.
-        if user_timezone is None:
-            user_timezone = 'UTC'
-        tz = pytz.timezone(user_timezone)
-        local_time = timestamp.astimezone(tz)
-        short_user_id = hashlib.md5(user_id.encode()).hexdigest()[:8]
-        day_str = local_time.strftime("%Y-%m-%d")
-        
-        # Build a unique document id for daily usage (e.g. "userID_2024-01-15")
-        document_id = f"{short_user_id}_{day_str}"
-        
-        try:
-            # Try to read the existing document.
-            daily_doc = await cls.read(document_id)
-            new_total = daily_doc.total_credits_used + credits_used
-            await cls.update(document_id, {"total_credits_used": new_total})
-        except AppwriteException:
-            # Document does not exist; create a new one.
-            data = {
-                "user_id": user_id,
-                "day": day_str,
-                "total_credits_used": credits_used
-            }
-            await cls.create(document_id, data)
+        local_time = to_local_time(timestamp, user_timezone)
+        await cls.increment(
+            cls.document_id(user_id, local_time),
+            {"user_id": user_id, **cls.period(local_time)},
+            credits_used,
+        )
 
 
-class MonthlyUsage(AppwriteModelBase):
+class MonthlyUsage(DailyUsage):
     collection_id = "monthly_usage"
+    metric = "total_credits"
     
     # Define model attributes.
     user_id: str = AppwriteField()
     month: str = AppwriteField() # store as YYYY-MM (e.g. 2024-01)
     total_credits: int = AppwriteField(type="int", default=0)
-    
+
+    @classmethod
+    def period(cls, local_time: datetime) -> dict:
+        return {"month": local_time.strftime("%Y-%m")}
+
+    @classmethod
+    def document_id(cls, user_id: str, local_time: datetime) -> str:
+        # Full user ids plus the month go past Appwrite's 36 character id limit
+        short_user_id = hashlib.md5(user_id.encode()).hexdigest()[:8]
+        return f"{short_user_id}_{local_time.strftime('%Y-%m')}"
 
     @classmethod
     async def update_usage(cls, user_id: str, timestamp: datetime, delta: int, user_timezone: str) -> None:
@@ -99,21 +116,11 @@ class MonthlyUsage(AppwriteModelBase):
         :param delta: The amount to add (can be negative).
         :param user_timezone: The user's timezone.
         """
-        tz = pytz.timezone(user_timezone)
-        local_time = timestamp.astimezone(tz)
-        month_str = local_time.strftime("%Y-%m")
-        
-        document_id = f"{user_id}_{month_str}"
-        
-        try:
-            monthly_doc = await cls.read(document_id)
-            new_total = monthly_doc.total_credits + delta
-            await cls.update(document_id, {"total_credits": new_total})
-        except AppwriteException:
-            data = {
-                "user_id": user_id,
-                "month": month_str,
-                "total_credits": delta
-            }
-            await cls.create(document_id, data)
+        await super().update_usage(user_id, delta, timestamp, user_timezone)
+
 
+def to_local_time(timestamp: Optional[datetime], user_timezone: Optional[str]) -> datetime:
+    if user_timezone is None:
+        user_timezone = 'UTC'
+    tz = pytz.timezone(user_timezone)
+    return (timestamp or datetime.now(timezone.utc)).astimezone(tz)
@@ -6,7 +6,8 @@ from .schema import PaymentData
 from .services import send_payment_acknowledgement
 from config import PAYSTACK_SECRET_KEY
 from api.auth.schema import UserIn
-from api.auth.model import UserCredits
+from api.auth.ledger import credit_ledger
+from api.auth.cache import user_cache
 from db import user_db
 from utils.logging import logger
 from api.admin.services import system_log
@@ -108,8 +109,8 @@ async def verify_payment(
         )
         
         try:
-            # Update credits atomically using the new UserCredits model
-            new_balance, success = await UserCredits.update_balance(
+            # Add the purchased credits through the ledger, written through to Appwrite
+            new_balance, success = await credit_ledger.deposit(
                 user.id, 
                 pplan["credits"],
                 transaction_type=f"payment_{plan_name}"
@@ -121,6 +122,7 @@ async def verify_payment(
                         
             # Update labels and create subscription
             await asyncio.to_thread(user_db.update_labels, user.id, ["subscribed"])
+            user_cache.invalidate(user.id)
             await Subscription.create(Subscription.get_unique_id(), data)
             
             
@@ -151,7 +153,8 @@ async def get_billing_data(
     if user is None:
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
     
-    credits = await UserCredits.get_or_create(user.id)
+    # Includes spend the ledger has not flushed to Appwrite yet
+    balance = await credit_ledger.balance(user.id)
     credit_usage = await DailyUsage.list(
         queries=[
             query.Query.equal("user_id", user.id),
@@ -183,8 +186,8 @@ async def get_billing_data(
     return {
         "currentPlan": plan_name + " Plan",
         "usedCredits": total_usage, 
-        "totalCredits": credits.balance + total_usage,
-        "remainingCredits": credits.balance,
+        "totalCredits": balance + total_usage,
+        "remainingCredits": balance,
         "creditHistory": [
             {
                 "date": du.created_at,
@@ -0,0 +1,255 @@
+import time
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple, Type
+
+import pytz
+from appwrite.exception import AppwriteException
+
+from config import USAGE_FLUSH_INTERVAL, USAGE_FLUSH_THRESHOLD
+from utils.logging import logger
+from .model import DailyUsage, MonthlyUsage, to_local_time
+
+
+# Usage documents written in parallel during a flush
+FLUSH_CONCURRENCY = 10
+# Users whose daily usage window is kept in memory, least recently checked are dropped first
+MAX_WINDOWS = 10_000
+# Day boundary for usage documents; callers of record() and the limit window must agree on it
+USAGE_TIMEZONE = "UTC"
+
+UsageKey = Tuple[Type[DailyUsage], str]
+
+
+@dataclass
+class UsageStats:
+    recorded: int = 0
+    flushes: int = 0
+    documents_written: int = 0
+    write_failures: int = 0
+    last_flush_at: Optional[float] = None
+    last_flush_seconds: float = 0.0
+    oldest_pending_at: Optional[float] = None
+    pending_documents: int = 0
+    pending_credits: int = 0
+
+    @property
+    def lag_seconds(self) -> float:
+        """Age of the oldest usage that is not in Appwrite yet."""
+        if self.oldest_pending_at is None:
+            return 0.0
+        return time.monotonic() - self.oldest_pending_at
+
+    def to_dict(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "documents_written": self.documents_written,
+            "write_failures": self.write_failures,
+            "pending_documents": self.pending_documents,
+            "pending_credits": self.pending_credits,
+            "lag_seconds": round(self.lag_seconds, 2),
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+            "seconds_since_flush": (
+                round(time.monotonic() - self.last_flush_at, 2) if self.last_flush_at else None
+            ),
+        }
+
+
+@dataclass
+class UsageWindow:
+    """A user's credits spent so far in the current USAGE_TIMEZONE day."""
+    day: str
+    resets_at: datetime
+    total: int = 0
+
+    @classmethod
+    def starting(cls, now: datetime, total: int = 0) -> "UsageWindow":
+        tz = pytz.timezone(USAGE_TIMEZONE)
+        day_time = now.astimezone(tz)
+        midnight = tz.localize(datetime.combine(day_time.date() + timedelta(days=1), datetime.min.time()))
+        return cls(
+            day=day_time.strftime("%Y-%m-%d"),
+            resets_at=midnight.astimezone(timezone.utc),
+            total=total,
+        )
+
+    def roll(self, now: datetime) -> "UsageWindow":
+        """The window covering now, starting from zero once midnight has passed."""
+        if now < self.resets_at:
+            return self
+        return UsageWindow.starting(now)
+
+
+class UsageAggregator:
+    """
+    Buffers DailyUsage/MonthlyUsage increments in memory.
+
+    record() only adds to a counter per (model, usage document), so tracking
+    an LLM call costs no database round trips. The counters are written every
+    flush_interval seconds, or as soon as flush_threshold documents are pending,
+    with one read-modify-write per document however many calls it covers.
+    Failed writes go back into the buffer for the next flush.
+    """
+
+    def __init__(self, flush_interval: float = USAGE_FLUSH_INTERVAL, flush_threshold: int = USAGE_FLUSH_THRESHOLD):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.stats = UsageStats()
+        # key -> (fields to create the document with, delta)
+        self._pending: Dict[UsageKey, Tuple[dict, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        # user id -> today's running total, so daily limit checks need no reads
+        self._windows: "OrderedDict[str, UsageWindow]" = OrderedDict()
+
+    def record(
+        self,
+        user_id: str,
+        credits_used: int,
+        timestamp: Optional[datetime] = None,
+        user_timezone: Optional[str] = USAGE_TIMEZONE
+        ) -> None:
+        """Count credits against the user's day and month."""
+        local_time = to_local_time(timestamp, user_timezone)
+        for model in (DailyUsage, MonthlyUsage):
+            key = (model, model.document_id(user_id, local_time))
+            data, delta = self._pending.get(key, (None, 0))
+            if data is None:
+                data = {"user_id": user_id, **model.period(local_time)}
+            self._pending[key] = (data, delta + credits_used)
+
+        if user_id in self._windows:
+            window = self._windows[user_id] = self._windows[user_id].roll(timestamp or datetime.now(timezone.utc))
+            window.total += credits_used
+
+        self.stats.recorded += 1
+        if self.stats.oldest_pending_at is None:
+            self.stats.oldest_pending_at = time.monotonic()
+        self._update_pending_stats()
+
+        if len(self._pending) >= self.flush_threshold and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self, model: Type[DailyUsage], document_id: str) -> int:
+        """Credits recorded for a usage document that are not written yet."""
+        return self._pending.get((model, document_id), (None, 0))[1]
+
+    def window(self, user_id: str, now: Optional[datetime] = None) -> Optional[UsageWindow]:
+        """The user's usage for the current day, if it is loaded."""
+        window = self._windows.get(user_id)
+        if window is None:
+            return None
+        window = self._windows[user_id] = window.roll(now or datetime.now(timezone.utc))
+        self._windows.move_to_end(user_id)
+        return window
+
+    async def load_window(self, user_id: str, now: Optional[datetime] = None) -> UsageWindow:
+        """
+        Start tracking a user's day from their usage document plus what is still buffered.
+
+        The window follows the same USAGE_TIMEZONE day that record() writes
+        DailyUsage documents for, so the stored total, the pending count and
+        later increments all belong to one document and reset together.
+        """
+        now = now or datetime.now(timezone.utc)
+        document_id = DailyUsage.document_id(user_id, to_local_time(now, USAGE_TIMEZONE))
+        try:
+            doc = await DailyUsage.read(document_id)
+            stored = getattr(doc, DailyUsage.metric, 0) or 0
+        except AppwriteException:
+            # If no document exists, then total is zero.
+            stored = 0
+
+        if user_id in self._windows:
+            # Loaded concurrently, and kept up to date by record() since
+            return self.window(user_id, now)
+        window = UsageWindow.starting(now, stored + self.pending(DailyUsage, document_id))
+        self._windows[user_id] = window
+        while len(self._windows) > MAX_WINDOWS:
+            self._windows.popitem(last=False)
+        return window
+
+    def _update_pending_stats(self):
+        self.stats.pending_documents = len(self._pending)
+        self.stats.pending_credits = sum(
+            delta for (model, _), (_, delta) in self._pending.items() if model is DailyUsage
+        )
+
+    async def flush(self) -> int:
+        """Write every pending counter. Returns the number of documents written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            started = time.monotonic()
+            batch, self._pending = self._pending, {}
+            oldest, self.stats.oldest_pending_at = self.stats.oldest_pending_at, None
+            semaphore = asyncio.Semaphore(FLUSH_CONCURRENCY)
+
+            async def write(key: UsageKey, data: dict, delta: int) -> bool:
+                model, document_id = key
+                async with semaphore:
+                    try:
+                        await model.increment(document_id, data, delta)
+                        return True
+                    except Exception as e:
+                        logger.error(f"Failed to write usage {document_id} to {model.collection_id}: {str(e)}")
+                        return False
+
+            items = [(key, data, delta) for key, (data, delta) in batch.items() if delta]
+            results = await asyncio.gather(*(write(*item) for item in items))
+
+            failed = 0
+            for (key, data, delta), ok in zip(items, results):
+                if ok:
+                    continue
+                # Merge back with anything recorded while the flush ran
+                failed += 1
+                _, newer = self._pending.get(key, (data, 0))
+                self._pending[key] = (data, delta + newer)
+
+            if failed:
+                self.stats.oldest_pending_at = oldest
+            written = len(items) - failed
+            self.stats.flushes += 1
+            self.stats.documents_written += written
+            self.stats.write_failures += failed
+            self.stats.last_flush_at = time.monotonic()
+            self.stats.last_flush_seconds = self.stats.last_flush_at - started
+            self._update_pending_stats()
+            return written
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Usage flush failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the flush loop and write everything still buffered."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+            self._wakeup = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Usage lost on shutdown: {self.stats.to_dict()}")
+
+
+usage_aggregator = UsageAggregator()
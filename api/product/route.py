@@ -1,4 +1,3 @@
-import time
 import asyncio
 from typing import List, Optional, Literal
 
@@ -7,14 +6,14 @@ from appwrite.client import AppwriteException
 from . import services
 from .agent import query_agent
 from .schema import ProductResponse, ProductDetail, WishListProductSchema, SearchRequest
-from ..auth.schema import UserIn
+from ..auth.schema import UserIn, TokenUser
 from ..track.scrape import scraper
-from ..auth.services import get_current_user
+from ..auth.services import get_current_user, get_token_user
 from .model import Product, WishList
 
 from utils.logging import logger
 from utils.decorator import credit_required
-from utils.queue import processing_semaphore, determine_priority, request_queues,  QUEUE_TIMEOUT, limiter
+from utils.queue import scheduler, determine_priority, limiter
 from utils.image import image_analysis, get_product_prompt, IMAGE_DESCRIPTION_PROMPT
 
 from appwrite import query
@@ -41,40 +40,12 @@ async def search_products(
     request: Request,
     payload: SearchRequest = Depends()
 ):
-    """Optimized search endpoint with queueing and prioritization"""
+    """Optimized search endpoint with weighted fair admission and prioritization"""
+    user = request.state.user
     try:
-        # Try immediate processing
-        if processing_semaphore.locked():
-            priority = determine_priority(request.state.user)
-            response_channel = asyncio.Queue(maxsize=1)
-            
-            if request_queues[priority].full():
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail="Queue overflow"
-                )
-                
-            await request_queues[priority].put({
-                "request": request,
-                "payload": payload,
-                "response_channel": response_channel,
-                "timestamp": time.time()
-            })
-            
-            try:
-                result = await asyncio.wait_for(
-                    response_channel.get(),
-                    timeout=QUEUE_TIMEOUT
-                )
-                if "error" in result:
-                    raise HTTPException(500, result["error"])
-                return result
-            except asyncio.TimeoutError:
-                raise HTTPException(504, "Queue processing timeout")
-
-        # Process immediately if capacity available
-        async with processing_semaphore:
-            return await process_request(request.state.user, request, payload)
+        # Waits for a slot in the user's fair share, or sheds with 429/Retry-After
+        async with scheduler.slot(user.id, determine_priority(user)):
+            return await process_request(user, request, payload)
 
     except HTTPException:
         raise
@@ -132,25 +103,6 @@ async def process_request(user: UserIn, request: Request, payload: SearchRequest
         raise
     
 
-async def queue_worker(priority_level: int):
-    """Process queued requests with priority handling"""
-    while True:
-        request_data = await request_queues[priority_level].get()
-        async with processing_semaphore:
-            try:
-                result = await process_request(
-                    request_data["request"],
-                    request_data["payload"]
-                )
-                await request_data["response_channel"].put(result)
-            except Exception as e:
-                await request_data["response_channel"].put({
-                    "error": f"Priority {priority_level} processing failed: {str(e)}"
-                })
-            finally:
-                request_queues[priority_level].task_done()
-
-
 @credit_required(2)
 @router.get("/detail/{product_id}", response_model=ProductDetail)
 async def get_product_detail(
@@ -193,7 +145,7 @@ async def get_trending_products(
     limit: int = Query(50, description="Number of products per page"),
     page: int = Query(1, description="Page number"),
     max_results: int = Query(3, description="Maximum results per category"),
-    user: UserIn = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
 ):
     """
     Get trending products across different categories.
@@ -210,7 +162,7 @@ async def get_trending_products(
 
 
 @router.post("/check-saved")
-async def check_product_saved(product_id: str = Body(), user: UserIn = Depends(get_current_user)):
+async def check_product_saved(product_id: str = Body(), user: TokenUser = Depends(get_token_user)):
     try:
         product = await WishList.get(user.id, product_id)
         if product is None:
@@ -236,17 +188,13 @@ async def unsave_product(product_id: str, user: UserIn = Depends(get_current_use
 async def get_saved_products(
     page: int = Query(1, description="Page number"),
     limit: int = Query(10, description="Results per page"),
-    user: UserIn = Depends(get_current_user)):
+    user: TokenUser = Depends(get_token_user)):
         
     wishlists = await WishList.list([query.Query.equal("user_id", user.id)], limit=limit, offset=(page - 1) * limit)
 
     if wishlists["total"] == 0:
         return []
 
-    products = []
-    for w in wishlists["documents"]:
-        product = await Product.read(w.product_id)
-        products.append(product.to_dict())
-
-    return products
+    products = await Product.read_many([w.product_id for w in wishlists["documents"]])
+    return [product.to_dict() for product in products]
  
\ No newline at end of file
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 from datetime import datetime, timezone
+from typing import List
 
 from db._appwrite.fields import AppwriteField
 from db._appwrite.model_base import AppwriteModelBase
+from db._appwrite.bulk import BulkWriteResult
 from appwrite.query import Query
 
 
@@ -18,6 +20,27 @@ class PriceHistory(AppwriteModelBase):
     price: float = AppwriteField(type="float", required=True, default=0.0)
 
 
+    @classmethod
+    async def record_many(cls, entries: List[dict]) -> BulkWriteResult:
+        """
+        Store price points, at most one per tracked item per day.
+
+        Each entry is keyed by tracked_id and the day of its timestamp, so a
+        retried scrape task or a rerun of the daily batch writes nothing twice.
+        """
+        documents, keys = [], []
+        for entry in entries:
+            timestamp = entry.get("timestamp") or datetime.now(timezone.utc).isoformat()
+            documents.append({**entry, "timestamp": timestamp})
+            keys.append(f"{entry['tracked_id']}:{timestamp[:10]}")
+        return await cls.bulk_create(documents, keys=keys)
+
+    @classmethod
+    async def record(cls, user_id: str, tracked_id: str, price: float, timestamp: str) -> BulkWriteResult:
+        return await cls.record_many(
+            [{"user_id": user_id, "tracked_id": tracked_id, "price": price, "timestamp": timestamp}]
+        )
+
     @classmethod
     async def get_current_price(cls, user_id: str, tracked_id: str)-> float:
         price_history = await super().list(
@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 
 from appwrite.client import AppwriteException
@@ -12,9 +13,9 @@ from .schema import (
     )
 
 from .model import PriceHistory, TrackedItem
-from ..auth.services import get_current_user
+from ..auth.services import get_current_user, get_token_user
 from ..chat.model import Chat
-from ..auth.schema import UserIn
+from ..auth.schema import UserIn, TokenUser
 from ..product.model import Product
 from ..product.services import save_product
 from .scrape import EcommerceWebScraper
@@ -29,14 +30,16 @@ router = APIRouter()
 
 
 @router.get("/stats", response_model=DashBoardStat)
-async def get_stats(user: UserIn = Depends(get_current_user)):
+async def get_stats(user: TokenUser = Depends(get_token_user)):
 
     try:
     
-        chat_count = await Chat.count([query.Query.equal("user_id", user.id)])
-        tracked_items = await TrackedItem.count([query.Query.equal("user_id", user.id)])
-        price_alerts   = await TrackedItem.count(
-            [query.Query.equal("user_id", user.id), query.Query.equal("alert_sent", True)])
+        chat_count, tracked_items, price_alerts = await asyncio.gather(
+            Chat.cached_count([query.Query.equal("user_id", user.id)]),
+            TrackedItem.cached_count([query.Query.equal("user_id", user.id)]),
+            TrackedItem.cached_count(
+                [query.Query.equal("user_id", user.id), query.Query.equal("alert_sent", True)]),
+        )
 
         return {
             "chat_count": chat_count,
@@ -51,7 +54,7 @@ async def get_stats(user: UserIn = Depends(get_current_user)):
 async def get_price_history(
     limit: int = Query(25),
     page: int = Query(1),
-    user: UserIn = Depends(get_current_user)):
+    user: TokenUser = Depends(get_token_user)):
     try:
         response = await PriceHistory.list(
             limit=limit, offset=(page - 1) * limit, queries=[query.Query.equal("user_id", user.id)])
@@ -65,7 +68,7 @@ async def get_price_history(
 @router.get("/price-history/{track_id}", response_model=List[PriceHistorySchema])
 async def get_price_history(
     track_id: str, 
-    user: UserIn = Depends(get_current_user)
+    user: TokenUser = Depends(get_token_user)
     ):
     
     documents = await PriceHistory.list([
@@ -80,17 +83,13 @@ async def get_price_history(
 async def get_tracked_items(
     limit: int = Query(50),
     page: int = Query(1),
-    user: UserIn = Depends(get_current_user)):
+    user: TokenUser = Depends(get_token_user)):
     
     r = await TrackedItem.list(
         [query.Query.equal("user_id", user.id)], 
             limit=limit, offset=(page - 1) * limit)
 
-    products = []
-
-    for tracked_item in r["documents"]:
-        product = await Product.read(tracked_item.product_id)
-        products.append(product)
+    products = await Product.read_many([tracked_item.product_id for tracked_item in r["documents"]])
 
     responses = []
     for r, product in zip(r["documents"], products):
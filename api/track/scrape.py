@@ -12,6 +12,7 @@ from pydantic import BaseModel
 from algoliasearch.search.client import SearchClient
 
 from utils.url_shortener import URLShortener
+from utils.crawl_cache import crawl_cache
 
 
 T = TypeVar('T', bound=BaseModel)
@@ -46,8 +47,11 @@ class EcommerceWebScraper:
 
         extraction_strategy= JsonCssExtractionStrategy(schema=self.get_jumia_schema(), verbose=True)
 
+        config = CrawlerRunConfig(extraction_strategy=extraction_strategy, bypass_cache=True)
+
         scraper: AsyncWebCrawler  = await self.get_crawler()
-        response = await scraper.arun(url=url, extraction_strategy=extraction_strategy, bypass_cache=True)
+        # Tracked prices must be current, only reuse the cached page if the origin confirms it
+        response = await crawl_cache.arun(url, config, freshness="revalidate", crawler=scraper)
         extracted_content = loads(response.extracted_content)
         if not extracted_content:
             return {}
@@ -170,7 +174,7 @@ class EcommerceWebScraper:
         )
 
         scraper: AsyncWebCrawler  = await self.get_crawler()
-        response = await scraper.arun(url=url, config=config)
+        response = await crawl_cache.arun(url, config, freshness="revalidate", crawler=scraper)
         extracted_content = loads(response.extracted_content)
         extracted_content = extracted_content[0] if isinstance(extracted_content, list) else extracted_content if extracted_content else {}
    
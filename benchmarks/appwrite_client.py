@@ -0,0 +1,63 @@
+"""
+Compare the thread pool wrapped Appwrite SDK with the async REST client.
+
+Runs the same concurrent document reads through both clients against a real
+Appwrite project (configured through .env) and prints latency percentiles
+and throughput.
+
+    python -m benchmarks.appwrite_client --collection users --requests 200 --concurrency 50
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from appwrite.query import Query
+
+from db._appwrite.base import AsyncAppWriteClient
+from db._appwrite.rest_client import AsyncAppwriteRESTClient
+
+
+async def run(client: AsyncAppWriteClient, collection_id: str, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await client.list_documents(collection_id, queries=[Query.limit(1)])
+            latencies.append(time.perf_counter() - start)
+
+    # Warm up connections so both clients start from a steady state
+    await one()
+    latencies.clear()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--collection", required=True)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    for name, client in (("sdk+executor", AsyncAppWriteClient()), ("rest", AsyncAppwriteRESTClient())):
+        result = await run(client, args.collection, args.requests, args.concurrency)
+        print(f"{name:>14}: {result}")
+        await client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Compare email sending in utils/email_manager.py against the connection per message it replaced.
+
+Sends --messages emails to a local SMTP sink, first the old way (smtplib,
+connect and send for every message, one at a time as each Celery task did)
+and then through EmailDelivery's pool. --latency adds a delay to every SMTP
+reply, standing in for the round trips to a real provider.
+
+    python -m benchmarks.email_delivery --messages 2000 --latency 0.02
+"""
+import time
+import socket
+import asyncio
+import smtplib
+import argparse
+import tempfile
+
+from utils.email_delivery import EmailDelivery
+from utils.email_manager import EmailAccountManager
+from test.smtp_sink import SMTPSink
+
+
+class SlowSink(SMTPSink):
+    def __init__(self, latency: float, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        return await super().handle_EHLO(server, session, envelope, hostname, responses)
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        return await super().handle_DATA(server, session, envelope)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def per_message(manager: EmailAccountManager, messages: int) -> float:
+    account = manager.accounts["sink"]
+    start = time.perf_counter()
+    for n in range(messages):
+        message = manager.build_message("sink", f"user{n}@example.com", "Price drop", f"<p>Hi user {n}</p>")
+        with smtplib.SMTP(account.smtp_server, account.smtp_port) as smtp:
+            smtp.send_message(message)
+    return time.perf_counter() - start
+
+
+def pooled(manager: EmailAccountManager, messages: int) -> float:
+    recipients = [(f"user{n}@example.com", {"n": str(n)}) for n in range(messages)]
+    start = time.perf_counter()
+    counts = manager.send_bulk("sink", "Price drop", "<p>Hi user {{n}}</p>", recipients)
+    elapsed = time.perf_counter() - start
+    assert counts["sent"] == messages, counts
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    with SlowSink(args.latency, port=free_port()) as sink, tempfile.TemporaryDirectory() as tmp:
+        manager = EmailAccountManager()
+        manager.accounts = {"sink": sink.account()}
+        # No provider limit, this measures the transport
+        manager.delivery = EmailDelivery(
+            manager.accounts, pool_size=args.pool_size, default_rpm=10 ** 9, dead_letter_dir=tmp
+        )
+
+        old = per_message(manager, args.messages)
+        new = pooled(manager, args.messages)
+        manager.delivery.close()
+
+        print(f"{args.messages} messages, {args.latency * 1000:.0f} ms per SMTP reply")
+        print(f"  connection per message: {old:8.2f} s  {args.messages / old:8.1f} msg/s")
+        print(f"  pooled ({args.pool_size} connections): {new:8.2f} s  {args.messages / new:8.1f} msg/s")
+        print(f"  connections opened: {manager.delivery.stats.connections_opened}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Compare the rate limit algorithms in utils/limiter.py.
+
+Runs the same stream of checks through each algorithm, spread over a number of
+clients, and prints checks per second and the memory state held per key. Pass
+--redis-url to time the Redis implementations (one round trip per check) too.
+
+    python -m benchmarks.limiter --checks 200000 --clients 1000 --times 100
+"""
+import sys
+import time
+import asyncio
+import argparse
+
+from utils.limiter import Limiter, RateLimit, ALGORITHMS
+
+
+def run_memory(algorithm: str, checks: int, clients: int, times: int) -> dict:
+    limiter = Limiter()
+    limit = RateLimit(times=times, seconds=60, algorithm=algorithm)
+    # Simulated clock so every algorithm sees the same arrival pattern
+    step = 60 / (times * 2)
+
+    start = time.perf_counter()
+    allowed = 0
+    for i in range(checks):
+        result = limiter._check_limit_memory(f"client:{i % clients}", limit, now=(i // clients) * step)
+        allowed += result["allowed"]
+    elapsed = time.perf_counter() - start
+
+    state_bytes = sum(
+        sys.getsizeof(state) + (sum(sys.getsizeof(v) for v in state) if state is not None and not isinstance(state, float) else 0)
+        for state, _ in limiter.memory_store.values()
+    )
+    return {
+        "checks_per_s": round(checks / elapsed),
+        "us_per_check": round(elapsed / checks * 1e6, 2),
+        "allowed": allowed,
+        "keys": len(limiter.memory_store),
+        "bytes_per_key": round(state_bytes / max(1, len(limiter.memory_store))),
+    }
+
+
+async def run_redis(redis_url: str, algorithm: str, checks: int, clients: int, times: int) -> dict:
+    limiter = Limiter(redis_url=redis_url)
+    limit = RateLimit(times=times, seconds=60, algorithm=algorithm)
+
+    start = time.perf_counter()
+    for i in range(checks):
+        await limiter._check_limit(f"bench:{i % clients}", limit)
+    elapsed = time.perf_counter() - start
+
+    await limiter.redis.aclose()
+    return {
+        "checks_per_s": round(checks / elapsed),
+        "ms_per_check": round(elapsed / checks * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--checks", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--times", type=int, default=100)
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+
+    for algorithm in ALGORITHMS:
+        result = run_memory(algorithm, args.checks, args.clients, args.times)
+        print(f"{'memory ' + algorithm:>22}: {result}")
+
+    if args.redis_url:
+        redis_checks = min(args.checks, 10_000)
+        for algorithm in ALGORITHMS:
+            result = asyncio.run(run_redis(args.redis_url, algorithm, redis_checks, args.clients, args.times))
+            print(f"{'redis ' + algorithm:>22}: {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Compare memory search in utils/memory.py against the linear scan it replaced.
+
+Builds a namespace of random embeddings at each size and reports, per search,
+the old per-item cosine loop, the VectorIndex (exact below HNSW_THRESHOLD, HNSW
+above it) and its recall@k against the exact answer. With --store it also times
+DiskCacheStore writes one put() at a time against put_many(), using FastEmbed
+so the batching gain is the real one.
+
+    python -m benchmarks.memory_store --sizes 10000 100000 --queries 200
+"""
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from utils.vector_index import VectorIndex, normalize
+
+
+def linear_scan(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    # What DiskCacheStore.search did per item, minus reading each item from disk
+    scores = []
+    for i, vector in enumerate(vectors):
+        score = np.dot(query, vector) / (np.linalg.norm(query) * np.linalg.norm(vector))
+        scores.append((score, i))
+    scores.sort(reverse=True)
+    return [i for _, i in scores[:k]]
+
+
+def run_index(size: int, dim: int, queries: int, k: int, linear_queries: int) -> dict:
+    rng = np.random.default_rng(0)
+    # Clustered like real memory embeddings (uniform random vectors are a worst case for HNSW);
+    # queries are paraphrase-distance from a stored memory
+    centers = normalize(rng.standard_normal((max(1, size // 100), dim)))
+    vectors = normalize(centers[rng.integers(0, len(centers), size)] + 0.5 * normalize(rng.standard_normal((size, dim))))
+    probes = normalize(vectors[rng.integers(0, size, queries)] + 0.05 * rng.standard_normal((queries, dim)))
+
+    start = time.perf_counter()
+    index = VectorIndex(dim)
+    for i, vector in enumerate(vectors):
+        index.add(str(i), vector)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [[int(label) for _, label in index.search(q, k)] for q in probes]
+    index_ms = (time.perf_counter() - start) / queries * 1000
+
+    exact = np.argsort(-(probes @ vectors.T), axis=1)[:, :k]
+    recall = np.mean([len(set(f) & set(e.tolist())) / k for f, e in zip(found, exact)])
+
+    start = time.perf_counter()
+    for q in probes[:linear_queries]:
+        linear_scan(vectors, q, k)
+    linear_ms = (time.perf_counter() - start) / linear_queries * 1000
+
+    return {
+        "index": "hnsw" if index.hnsw else "flat",
+        "build_s": round(build_s, 2),
+        "linear_ms": round(linear_ms, 2),
+        "index_ms": round(index_ms, 3),
+        "speedup": round(linear_ms / index_ms, 1),
+        f"recall@{k}": round(float(recall), 3),
+    }
+
+
+def run_store(items: int) -> dict:
+    from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+    from utils.memory import DiskCacheStore
+
+    embeddings = FastEmbedEmbeddings()
+    values = [{"text": f"user prefers product {i} in colour {i % 17} under {i % 300} dollars"} for i in range(items)]
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DiskCacheStore(cache_dir=f"{tmp}/single", index={"embed": embeddings})
+        start = time.perf_counter()
+        for i, value in enumerate(values):
+            store.put(("bench", "memories"), str(i), value)
+        result["put_per_s"] = round(items / (time.perf_counter() - start), 1)
+
+        store = DiskCacheStore(cache_dir=f"{tmp}/batched", index={"embed": embeddings})
+        start = time.perf_counter()
+        store.put_many(("bench", "memories"), [(str(i), value) for i, value in enumerate(values)])
+        result["put_many_per_s"] = round(items / (time.perf_counter() - start), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--linear-queries", type=int, default=5)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--store", type=int, default=0, help="items to write through DiskCacheStore")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        result = run_index(size, args.dim, args.queries, args.k, args.linear_queries)
+        print(f"{size:>8} memories: {result}")
+
+    if args.store:
+        print(f"{args.store:>8} writes:   {run_store(args.store)}")
+
+
+if __name__ == "__main__":
+    main()
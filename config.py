@@ -27,6 +27,21 @@ else:
 SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")) * 24 * 60
+# Longest an authenticated user is served from cache before Appwrite is asked again
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))
+# Credit ledger, set a Redis URL to share accounts between processes, otherwise they are kept in process
+CREDIT_LEDGER_REDIS_URL = os.getenv("CREDIT_LEDGER_REDIS_URL") or None
+CREDIT_FLUSH_INTERVAL = float(os.getenv("CREDIT_FLUSH_INTERVAL", "5"))
+# Usage counters are written every interval, or sooner once this many documents are pending
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "30"))
+USAGE_FLUSH_THRESHOLD = int(os.getenv("USAGE_FLUSH_THRESHOLD", "500"))
+# Memory consolidation waits this long after a user's last turn (and at most MEMORY_MAX_WAIT)
+MEMORY_DEBOUNCE = float(os.getenv("MEMORY_DEBOUNCE", "20"))
+MEMORY_MAX_WAIT = float(os.getenv("MEMORY_MAX_WAIT", "120"))
+MEMORY_QUEUE_SIZE = int(os.getenv("MEMORY_QUEUE_SIZE", "1000"))
+# Graph checkpoints kept per conversation thread, and how long an idle thread is kept
+CHECKPOINT_KEEP = int(os.getenv("CHECKPOINT_KEEP", "5"))
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", str(3 * 24 * 60 * 60)))
 
 PORT = os.getenv("PORT")
 SEARCH_ENGINE_URL = str(os.getenv("SEARCH_ENGINE_URL"))
@@ -63,6 +78,22 @@ MEMORY_CACHE_DIR = Path("data/memory_cache")
 MEMORY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 EMAIL_CACHE_DIR = Path("data/email_val")
 EMAIL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CRAWL_CACHE_DIR = Path("data/crawl_cache")
+CRAWL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+EXTRACTION_CACHE_DIR = Path("data/extraction_cache")
+EXTRACTION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+USER_CACHE_DIR = Path("data/user_cache")
+USER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+LLM_CACHE_DIR = Path("data/llm_cache")
+LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+FLARE_CLEARANCE_DIR = Path("data/flare_clearance")
+FLARE_CLEARANCE_DIR.mkdir(parents=True, exist_ok=True)
+CHECKPOINT_DIR = Path("data/checkpoints")
+CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+IMAGE_CACHE_DIR = Path("data/image_cache")
+IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+EMAIL_DEAD_LETTER_DIR = Path("data/email_dead_letters")
+EMAIL_DEAD_LETTER_DIR.mkdir(parents=True, exist_ok=True)
 
 USER_AGENT= str(os.getenv("USER_AGENT"))
 
@@ -77,8 +108,44 @@ class ApiKeyConfig:
     OPEN_ROUTER_API_KEY = str(os.getenv("OPEN_ROUTER_API_KEY"))
     DEEPSEEK_API_KEY = str(os.getenv("DEEPSEEK_API_KEY"))
 
+# Per key Gemini quota the key scheduler spreads calls under
+GEMINI_KEY_RPM = int(os.getenv("GEMINI_KEY_RPM", "15"))
+GEMINI_KEY_TPM = int(os.getenv("GEMINI_KEY_TPM", "1000000"))
+
+# Appwrite client, "rest" uses the async httpx client and "sdk" the thread pool wrapped SDK
+APPWRITE_CLIENT = os.getenv("APPWRITE_CLIENT", "rest").lower()
+APPWRITE_MAX_CONNECTIONS = int(os.getenv("APPWRITE_MAX_CONNECTIONS", "50"))
+APPWRITE_MAX_CONCURRENCY = int(os.getenv("APPWRITE_MAX_CONCURRENCY", "50"))
+# Writes a single bulk_create/bulk_update keeps in flight, producers wait beyond that
+APPWRITE_BULK_CONCURRENCY = int(os.getenv("APPWRITE_BULK_CONCURRENCY", "10"))
+
 # Flare Bypasser Configuration
 FLARE_BYPASSER_URL = os.getenv("FLARE_BYPASSER_URL", "http://flare-bypasser:20080") if PRODUCTION_MODE else None 
+# Longest a solved Cloudflare clearance is reused for, when its cookie does not expire sooner
+FLARE_CLEARANCE_TTL = int(os.getenv("FLARE_CLEARANCE_TTL", "1800"))
+# Browser solves the bypasser container runs at once, further ones queue
+FLARE_MAX_SOLVES = int(os.getenv("FLARE_MAX_SOLVES", "3"))
+
+# Longest side image uploads are downsized to; gemini-1.5-pro bills a flat 258 tokens per
+# image, so this only trims upload size and must keep labels and model numbers legible
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1536"))
+# Threads for image preprocessing and analysis calls, and how many run at once
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "4"))
+
+# Open SMTP connections kept per email account
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "4"))
+# Messages per minute each SMTP provider accepts, as host=rpm pairs; other hosts get EMAIL_DEFAULT_RPM
+EMAIL_RATE_LIMITS = {
+    host.strip(): int(rpm)
+    for host, rpm in (
+        pair.split("=") for pair in os.getenv(
+            "EMAIL_RATE_LIMITS", "smtp.gmail.com=20,smtp-relay.brevo.com=300"
+        ).split(",") if pair.strip()
+    )
+}
+EMAIL_DEFAULT_RPM = int(os.getenv("EMAIL_DEFAULT_RPM", "60"))
+# Attempts per message before it goes to the dead letter queue
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "3"))
 
 proxy_host = os.getenv('PROXY_HOST')
 proxy_port = os.getenv('PROXY_PORT')
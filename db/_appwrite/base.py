@@ -1,6 +1,6 @@
 import asyncio
 import inspect
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any
 from concurrent.futures import ThreadPoolExecutor
 
 from config import (
@@ -12,7 +12,7 @@ from config import (
     )
 
 from appwrite.id import ID
-# from appwrite.query import Query
+from appwrite.query import Query
 from appwrite.client import Client
 from appwrite.services.users import Users
 from appwrite.services.storage import Storage
@@ -38,6 +38,9 @@ class AsyncAppWriteClient:
     def get_unique_id(self):
         return ID.unique()
 
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
     # async def create_bucket(
     #     self, 
     #     bucket_id, 
@@ -129,6 +132,45 @@ class AsyncAppWriteClient:
             self.database_id, collection_id, queries or []
         )
 
+    async def iter_documents(
+        self,
+        collection_id: str,
+        queries: Optional[List[str]] = None,
+        page_size: int = 100,
+        prefetch: bool = True,
+        ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream every document matching the queries using cursor pagination.
+
+        With prefetch the next page is requested while the caller is still
+        consuming the current one, so network time overlaps processing time.
+        Only one extra page is ever held in memory.
+        """
+        queries = list(queries or [])
+
+        def fetch(cursor: Optional[str]):
+            page_queries = queries + [Query.limit(page_size)]
+            if cursor:
+                page_queries.append(Query.cursor_after(cursor))
+            return asyncio.ensure_future(self.list_documents(collection_id, page_queries))
+
+        pending = fetch(None)
+        try:
+            while pending is not None:
+                documents = (await pending).get("documents", [])
+                pending = None
+                if len(documents) == page_size and prefetch:
+                    pending = fetch(documents[-1]["$id"])
+
+                for document in documents:
+                    yield document
+
+                if len(documents) == page_size and not prefetch:
+                    pending = fetch(documents[-1]["$id"])
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
     async def get_document(
         self, 
         collection_id,
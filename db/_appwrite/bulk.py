@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set, Tuple, Type, TYPE_CHECKING
+
+from appwrite.client import AppwriteException
+
+from config import APPWRITE_BULK_CONCURRENCY
+from utils.logging import logger
+
+if TYPE_CHECKING:
+    from .model_base import AppwriteModelBase
+
+
+@dataclass
+class BulkWriteResult:
+    """Outcome of a bulk write, one entry per document id."""
+    succeeded: List[str] = field(default_factory=list)
+    # Creates that hit an existing id, i.e. an earlier attempt already wrote them
+    duplicates: List[str] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+    @property
+    def total(self) -> int:
+        return len(self.succeeded) + len(self.duplicates) + len(self.failed)
+
+    @property
+    def failed_ids(self) -> List[str]:
+        return [document_id for document_id, _ in self.failed]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "succeeded": len(self.succeeded),
+            "duplicates": len(self.duplicates),
+            "failed": len(self.failed),
+            "errors": dict(self.failed),
+        }
+
+
+class BulkWriter:
+    """
+    Fans document writes out to one collection with at most `concurrency` in flight.
+
+    create()/update() return as soon as the write is scheduled but wait while the
+    window is full, so a producer can never get further ahead of Appwrite than
+    that. Failures are collected per document instead of aborting the batch.
+    A create that returns 409 counts as done: with ids derived from idempotency
+    keys that is a previous attempt that already landed.
+
+        async with BulkWriter(Message) as writer:
+            for key, data in rows:
+                await writer.create(Message.hash(key), data)
+        result = writer.result
+    """
+
+    def __init__(self, model: Type["AppwriteModelBase"], concurrency: int = APPWRITE_BULK_CONCURRENCY):
+        self.model = model
+        self.result = BulkWriteResult()
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "BulkWriter":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.flush()
+
+    async def create(self, document_id: str, data: Dict[str, Any]):
+        await self._submit("create", document_id, data)
+
+    async def update(self, document_id: str, data: Dict[str, Any]):
+        await self._submit("update", document_id, data)
+
+    async def flush(self) -> BulkWriteResult:
+        """Wait for every scheduled write and return the result so far."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+        if self.result.failed:
+            logger.warning(
+                f"Bulk write to {self.model.collection_id}: "
+                f"{len(self.result.failed)}/{self.result.total} failed, "
+                f"first error: {self.result.failed[0][1]}"
+            )
+        return self.result
+
+    async def _submit(self, op: str, document_id: str, data: Dict[str, Any]):
+        # Backpressure, the caller waits here until a slot frees up
+        await self._semaphore.acquire()
+        task = asyncio.ensure_future(self._write(op, document_id, data))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, op: str, document_id: str, data: Dict[str, Any]):
+        client = self.model.client
+        try:
+            if op == "create":
+                await client.create_document(
+                    collection_id=self.model.collection_id,
+                    document_id=document_id,
+                    document_data=data,
+                )
+            else:
+                self.model._forget(document_id)
+                await client.update_document(
+                    collection_id=self.model.collection_id,
+                    document_id=document_id,
+                    document_data=data,
+                )
+            self.model._forget_counts()
+            self.result.succeeded.append(document_id)
+        except AppwriteException as e:
+            if op == "create" and e.code == 409:
+                self.result.duplicates.append(document_id)
+            else:
+                self.result.failed.append((document_id, e.message or str(e)))
+        except Exception as e:
+            self.result.failed.append((document_id, str(e)))
+        finally:
+            self._semaphore.release()
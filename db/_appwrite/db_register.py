@@ -7,7 +7,7 @@ from api.auth.model import UserProfile, UserPreferences, Referral, UserCredits
 from api.admin.model import Contact
 from api.admin.model import DailyLog, MonthlyLog, AppLog, AdminUsers
 # from agents.legacy.llm import LLMCall
-from api.payments.model import Subscription, SubscriptionLog, DailyUsage
+from api.payments.model import Subscription, SubscriptionLog, DailyUsage, MonthlyUsage
 
 from .fields import AppwriteField
 
@@ -21,6 +21,7 @@ AppwriteModelBase.register_model(WaitList)
 AppwriteModelBase.register_model(Subscription)
 AppwriteModelBase.register_model(SubscriptionLog)
 AppwriteModelBase.register_model(DailyUsage)
+AppwriteModelBase.register_model(MonthlyUsage)
 AppwriteModelBase.register_model(WishList)
 AppwriteModelBase.register_model(MessageImage)
 AppwriteModelBase.register_model(PriceHistory)
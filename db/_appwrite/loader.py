@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Type, TYPE_CHECKING
+
+from appwrite.query import Query
+from appwrite.client import AppwriteException
+
+if TYPE_CHECKING:
+    from .model_base import AppwriteModelBase
+
+
+# Appwrite caps list queries at 100 documents per page
+MAX_BATCH_SIZE = 100
+
+_loaders: ContextVar[Optional[Dict[type, "ModelLoader"]]] = ContextVar("appwrite_loaders", default=None)
+
+
+class ModelLoader:
+    """
+    DataLoader for a single model within one request.
+
+    read(id) calls issued in the same event loop tick are queued and sent as
+    one Query.equal("$id", [...]) list call on the next tick. Results are
+    memoized for the rest of the request, so reading the same document twice
+    costs nothing.
+    """
+
+    def __init__(self, model: Type["AppwriteModelBase"]):
+        self.model = model
+        self.memo: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._scheduled = False
+
+    def load(self, document_id: str) -> asyncio.Future:
+        """
+        The memoized future for the document, shared by every reader of it.
+
+        Await it through asyncio.shield(), one reader being cancelled must not
+        cancel it for the others.
+        """
+        future = self.memo.get(document_id)
+        if future is not None and not future.cancelled():
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.memo[document_id] = future
+        self._queue.append(document_id)
+
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, document_ids: List[str]) -> List["AppwriteModelBase"]:
+        return await asyncio.gather(*(asyncio.shield(self.load(document_id)) for document_id in document_ids))
+
+    def clear(self, document_id: str):
+        self.memo.pop(document_id, None)
+
+    def _dispatch(self):
+        queue, self._queue, self._scheduled = self._queue, [], False
+        for start in range(0, len(queue), MAX_BATCH_SIZE):
+            asyncio.ensure_future(self._fetch(queue[start:start + MAX_BATCH_SIZE]))
+
+    async def _fetch(self, document_ids: List[str]):
+        try:
+            page = await self.model.client.list_documents(
+                collection_id=self.model.collection_id,
+                queries=[Query.equal("$id", document_ids), Query.limit(len(document_ids))],
+            )
+        except Exception as e:
+            for document_id in document_ids:
+                self._reject(document_id, e)
+            return
+
+        found = {document["$id"]: document for document in page.get("documents", [])}
+        for document_id in document_ids:
+            future = self.memo.get(document_id)
+            if future is None or future.done():
+                if future is not None and future.cancelled():
+                    # Cancelled futures are not memoized, the next read loads again
+                    del self.memo[document_id]
+                continue
+            document = found.get(document_id)
+            if document is None:
+                self._reject(
+                    document_id,
+                    AppwriteException(
+                        "Document with the requested ID could not be found.",
+                        404,
+                        "document_not_found",
+                    ),
+                )
+            else:
+                future.set_result(self.model.from_appwrite(document))
+
+    def _reject(self, document_id: str, error: Exception):
+        # Failures are not memoized, a later read in the same request retries
+        future = self.memo.pop(document_id, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+
+def get_loader(model: Type["AppwriteModelBase"]) -> Optional[ModelLoader]:
+    """Loader for the model in the current request scope, None outside a scope."""
+    loaders = _loaders.get()
+    if loaders is None:
+        return None
+    loader = loaders.get(model)
+    if loader is None:
+        loader = loaders[model] = ModelLoader(model)
+    return loader
+
+
+@contextmanager
+def loader_scope():
+    """Open a request scope, reads inside it are batched and memoized."""
+    token = _loaders.set({})
+    try:
+        yield
+    finally:
+        _loaders.reset(token)
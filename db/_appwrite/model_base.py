@@ -1,13 +1,23 @@
 from __future__ import annotations
 
-from typing import Type, List, Dict, Optional, Any #, TypeVar
+import asyncio
+import time
+from typing import AsyncIterator, Type, List, Dict, Optional, Any #, TypeVar
 from datetime import datetime
 from appwrite.client import AppwriteException
 from .base import AsyncAppWriteClient
+from .rest_client import get_appwrite_client
+from .loader import ModelLoader, get_loader
+from .bulk import BulkWriter, BulkWriteResult
 from utils.logging import logger
 from .fields import BaseField #, Field
 
 from appwrite.query import Query
+from cachetools import TTLCache
+from config import APPWRITE_BULK_CONCURRENCY
+
+# Appwrite stops counting "total" at this many documents
+APPWRITE_COUNT_LIMIT = 5000
 
 # T = TypeVar('T', bound=AppwriteModelBase)
 
@@ -28,11 +38,12 @@ class AppwriteModelBase:
     custom_metadata: Optional[Dict[str, Any]] = None
     # metadata: Optional[Dict[str, Any]] = None  # Additional metadata
 
-    client = AsyncAppWriteClient()
+    client: AsyncAppWriteClient = get_appwrite_client()
     _registered_models: Dict[str, Type["AppwriteModelBase"]] = {}
 
     collection_id: str
     _fields: dict = {}
+    _count_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
 
 
     @classmethod
@@ -42,6 +53,7 @@ class AppwriteModelBase:
             document_id=document_id,
             document_data=data,            
         )
+        cls._forget_counts()
         # try:
         #     document = await client.get_document(
         #         collection_id=CollectionMetadata.collection_id,
@@ -138,6 +150,11 @@ class AppwriteModelBase:
 
     @classmethod
     async def read(cls, document_id: str, queries: List[str] = []) -> Type["AppwriteModelBase"]:
+        # Inside a request scope plain reads are batched with the others from the same tick
+        loader = get_loader(cls)
+        if loader is not None and not queries:
+            return await asyncio.shield(loader.load(document_id))
+
         # queries.append(Query.equal("is_deleted", False))
         document = await cls.client.get_document(
             collection_id=cls.collection_id,
@@ -148,7 +165,18 @@ class AppwriteModelBase:
     
     
     @classmethod
-    async def list(cls, queries: List[str] = [], limit: int = 25, offset: int = 0) -> List[Type["AppwriteModelBase"]]:
+    async def read_many(cls, document_ids: List[str]) -> List[Type["AppwriteModelBase"]]:
+        """
+        Read several documents in as few list calls as possible, in the order given.
+        Raises AppwriteException (404) if any of them does not exist, like read().
+        """
+        loader = get_loader(cls) or ModelLoader(cls)
+        return await loader.load_many(document_ids)
+
+    @classmethod
+    async def list(cls, queries: Optional[List[str]] = None, limit: int = 25, offset: int = 0) -> List[Type["AppwriteModelBase"]]:
+        # Copy so the caller's list is never extended with our pagination queries
+        queries = list(queries or [])
         queries.extend(
             [
                 # Query.equal("is_deleted", False),
@@ -172,44 +200,65 @@ class AppwriteModelBase:
 
 
     @classmethod
-    async def count(cls, queries: List[str] = []) -> int:
-        count = 0
-        limit = 100
-        cursor = None
-
-        while True:
-            # Add dynamic queries for pagination
-            dynamic_queries = queries + [Query.limit(limit)]
-            if cursor:
-                dynamic_queries.append(Query.cursor_after(cursor))
+    async def iter_all(
+        cls,
+        queries: Optional[List[str]] = None,
+        page_size: int = 100,
+        prefetch: bool = True
+        ) -> AsyncIterator[Type["AppwriteModelBase"]]:
+        """
+        Yield every matching document one at a time using cursor pagination,
+        prefetching the next page while the current one is consumed.
 
-            # Remove None from queries
-            dynamic_queries = [q for q in dynamic_queries if q is not None]
+            async for product in Product.iter_all([Query.equal("source", "jumia")]):
+                ...
+        """
+        async for document in cls.client.iter_documents(
+            cls.collection_id, queries, page_size=page_size, prefetch=prefetch
+        ):
+            yield cls.from_appwrite(document)
 
-            # Fetch a page of documents
-            try:
-                page = await cls.client.list_documents(
-                    collection_id=cls.collection_id,
-                    queries=dynamic_queries,
-                )
-            except AppwriteException as e:
-                print(e)
-                if e.code == 404:
-                    return count
-                raise e
-            documents = page.get("documents", [])
 
-            if not documents:  # Break the loop if no more documents
+    @classmethod
+    async def count(cls, queries: Optional[List[str]] = None) -> int:
+        queries = [q for q in (queries or []) if q is not None]
+        try:
+            page = await cls.client.list_documents(
+                collection_id=cls.collection_id,
+                queries=queries + [Query.limit(1), Query.select(["$id"])],
+            )
+        except AppwriteException as e:
+            if e.code == 404:
                 return 0
+            raise e
 
-            count += len(documents)
+        total = page.get("total", 0)
+        if total < APPWRITE_COUNT_LIMIT:
+            return total
 
-            if len(documents) < limit:  # Stop if fewer documents than limit
-                break
+        # Past the count limit, walk ids only to get the exact number
+        count = 0
+        async for _ in cls.client.iter_documents(
+            cls.collection_id, queries + [Query.select(["$id"])], page_size=100
+        ):
+            count += 1
+        return count
 
-            # Update cursor to the last document's ID
-            cursor = documents[-1]["$id"]
 
+    @classmethod
+    async def cached_count(cls, queries: Optional[List[str]] = None, ttl: Optional[int] = None) -> int:
+        """
+        count() memoized for dashboards for up to 60 seconds, pass ttl to require fresher numbers.
+        Writes through create(), update() and delete() clear the collection's counts.
+        """
+        queries = [q for q in (queries or []) if q is not None]
+        key = (cls.collection_id, tuple(queries))
+        cached = cls._count_cache.get(key)
+        if cached is not None and (ttl is None or time.monotonic() - cached[1] < ttl):
+            return cached[0]
+
+        count = await cls.count(queries)
+        cls._count_cache[key] = (count, time.monotonic())
         return count
 
 
@@ -220,21 +269,38 @@ class AppwriteModelBase:
 
     @classmethod
     async def update(cls, document_id: str, data: dict) -> Type["AppwriteModelBase"]:
+        cls._forget(document_id)
         document = await cls.client.update_document(
             collection_id=cls.collection_id,
             document_id=document_id,
             document_data=data,
         )
+        cls._forget_counts()
         return cls.from_appwrite(document)
 
 
     @classmethod
     async def delete(cls, document_id: str) -> None:
-        return await cls.client.delete_document(
+        cls._forget(document_id)
+        result = await cls.client.delete_document(
             collection_id=cls.collection_id,
             document_id=document_id,
         )
+        cls._forget_counts()
+        return result
+
+
+    @classmethod
+    def _forget(cls, document_id: str) -> None:
+        loader = get_loader(cls)
+        if loader is not None:
+            loader.clear(document_id)
 
+    @classmethod
+    def _forget_counts(cls) -> None:
+        """Drop the collection's cached_count() results after a write changed what they count."""
+        for key in [key for key in list(cls._count_cache) if key[0] == cls.collection_id]:
+            cls._count_cache.pop(key, None)
 
     @classmethod
     def validate(cls, data: dict) -> None:
@@ -410,9 +476,44 @@ class AppwriteModelBase:
 
 
     @classmethod
-    async def bulk_create(cls, documents: List[Type["AppwriteModelBase"]]) -> None:
-        await cls.bulk_create(documents)
-        print(f"Created {len(documents)} documents in bulk.")
+    async def bulk_create(
+        cls,
+        documents: List[dict],
+        keys: Optional[List[str]] = None,
+        concurrency: int = APPWRITE_BULK_CONCURRENCY
+        ) -> BulkWriteResult:
+        """
+        Create many documents with bounded concurrency, failures are reported
+        per document in the result instead of raised.
+
+        keys are idempotency keys, each one is hashed into the document id so
+        retrying a partly failed batch only writes what is missing. Without keys
+        a document's "$id" is used when present, otherwise a fresh id.
+        """
+        if keys is not None and len(keys) != len(documents):
+            raise ValueError("bulk_create needs exactly one key per document")
+
+        async with BulkWriter(cls, concurrency) as writer:
+            for i, document in enumerate(documents):
+                data = dict(document)
+                document_id = data.pop("$id", None)
+                if keys is not None:
+                    document_id = cls.hash(keys[i])
+                await writer.create(document_id or cls.get_unique_id(), data)
+        return writer.result
+
+
+    @classmethod
+    async def bulk_update(
+        cls,
+        updates: Dict[str, dict],
+        concurrency: int = APPWRITE_BULK_CONCURRENCY
+        ) -> BulkWriteResult:
+        """Apply {document_id: data} patches with bounded concurrency, see bulk_create."""
+        async with BulkWriter(cls, concurrency) as writer:
+            for document_id, data in updates.items():
+                await writer.update(document_id, data)
+        return writer.result
 
 
     @classmethod
@@ -0,0 +1,203 @@
+import json
+import random
+import asyncio
+from typing import Dict, List, Optional, Any
+
+import httpx
+from appwrite.id import ID
+from appwrite.client import AppwriteException
+
+from config import (
+    ApiKeyConfig,
+    APPWRITE_DATABASE_ID,
+    APPWRITE_ENDPOINT,
+    APPWRITE_PROJECT_ID,
+    APPWRITE_MAX_CONNECTIONS,
+    APPWRITE_MAX_CONCURRENCY,
+    APPWRITE_CLIENT,
+)
+from utils.logging import logger
+from .base import AsyncAppWriteClient
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class AsyncAppwriteRESTClient(AsyncAppWriteClient):
+    """
+    Async Appwrite client that talks to the REST API directly over a shared
+    keep-alive httpx pool instead of pushing the sync SDK through a thread pool.
+
+    Document CRUD, which is what every model call goes through, is native async.
+    Storage and schema management are rare and stay on the executor backed SDK
+    methods inherited from AsyncAppWriteClient. Errors are raised as
+    AppwriteException so existing handlers keep working.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = APPWRITE_MAX_CONNECTIONS,
+        max_concurrency: int = APPWRITE_MAX_CONCURRENCY,
+        retries: int = 3,
+        backoff: float = 0.25,
+        max_backoff: float = 4.0,
+        timeout: float = 30.0,
+    ):
+        super().__init__()
+        self.endpoint = APPWRITE_ENDPOINT.rstrip("/")
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.headers = {
+            "X-Appwrite-Project": APPWRITE_PROJECT_ID or "",
+            "X-Appwrite-Key": ApiKeyConfig.APPWRITE_API_KEY or "",
+            "X-Appwrite-Response-Format": "1.6.0",
+            "Content-Type": "application/json",
+        }
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        # Pools are bound to the loop that created them, Celery tasks and
+        # scripts that call asyncio.run() get their own
+        loop = asyncio.get_running_loop()
+        if self._http is None or self._loop is not loop:
+            self._http = httpx.AsyncClient(
+                base_url=self.endpoint,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _query_params(queries: Optional[List[str]]) -> Dict[str, str]:
+        # Same flattening the Appwrite SDK uses for list parameters
+        return {f"queries[{i}]": query for i, query in enumerate(queries or [])}
+
+    @staticmethod
+    def _to_exception(response: httpx.Response) -> AppwriteException:
+        try:
+            body = response.json()
+            return AppwriteException(
+                body.get("message"), response.status_code, body.get("type"), response.text
+            )
+        except ValueError:
+            return AppwriteException(response.text, response.status_code, None, response.text)
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        http = self._get_http()
+        delay = self.backoff
+
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await http.request(
+                        method,
+                        path,
+                        params=params,
+                        content=json.dumps(payload, default=_json_default) if payload is not None else None,
+                    )
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise AppwriteException(str(e), 0, "network_error", None) from e
+                logger.warning(f"Appwrite {method} {path} failed ({str(e)}), retrying")
+            else:
+                if response.status_code < 400:
+                    return response.json() if response.content else {}
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retries:
+                    raise self._to_exception(response)
+                logger.warning(f"Appwrite {method} {path} returned {response.status_code}, retrying")
+
+            # Exponential backoff with full jitter so retries from many requests spread out
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, self.max_backoff)
+
+    def _documents_path(self, collection_id: str, document_id: Optional[str] = None) -> str:
+        path = f"/databases/{self.database_id}/collections/{collection_id}/documents"
+        return f"{path}/{document_id}" if document_id else path
+
+    async def create_document(
+        self,
+        collection_id: str,
+        document_data: Dict[str, Any],
+        document_id: Optional[str] = None,
+        permissions: Optional[List[str]] = None) -> Dict[str, Any]:
+
+        payload = {"documentId": document_id or ID.unique(), "data": document_data}
+        if permissions is not None:
+            payload["permissions"] = permissions
+        return await self._request("POST", self._documents_path(collection_id), payload=payload)
+
+    async def list_documents(
+        self,
+        collection_id: str,
+        queries: Optional[List[str]] = None
+        ) -> Dict[str, Any]:
+
+        return await self._request(
+            "GET", self._documents_path(collection_id), params=self._query_params(queries)
+        )
+
+    async def get_document(
+        self,
+        collection_id,
+        document_id: str,
+        queries: Optional[List[str]] = None
+        ) -> Dict[str, Any]:
+
+        return await self._request(
+            "GET",
+            self._documents_path(collection_id, document_id),
+            params=self._query_params(queries),
+        )
+
+    async def update_document(
+        self, collection_id: str, document_id: str, document_data: Dict[str, Any]) -> Dict[str, Any]:
+
+        return await self._request(
+            "PATCH",
+            self._documents_path(collection_id, document_id),
+            payload={"data": document_data},
+        )
+
+    async def delete_document(
+        self,
+        collection_id: str,
+        document_id: str) -> Dict[str, Any]:
+
+        return await self._request("DELETE", self._documents_path(collection_id, document_id))
+
+
+def get_appwrite_client() -> AsyncAppWriteClient:
+    """Client used by the models, APPWRITE_CLIENT=sdk switches back to the thread pool SDK."""
+    if APPWRITE_CLIENT == "sdk":
+        return AsyncAppWriteClient()
+    return AsyncAppwriteRESTClient()
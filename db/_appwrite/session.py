@@ -8,6 +8,7 @@ from api.product.model import Product
 
 
 from api.chat.model import Message,  Chat #, MessageImage
+from .bulk import BulkWriteResult
 # from .base import async_appwrite
 from utils.logging import logger
 # from utils.websocket import ImageMetadata, SourceMetadata, ProductSchema
@@ -95,18 +96,16 @@ class AppwriteSessionManager:
             raise
 
     async def log_messages(self, message_logs: Dict[str, Any]):
-        tasks = []
-        # print(message_logs)
         document_id = Message.get_unique_id()
-        products = message_logs.get("products", None)
-        # original_products = message_logs.get("original_products", None)
-            
-        if products is not None:
+        tasks = []
+
+        if message_logs.get("products", None) is not None:
+            # Product ids are deterministic, products saved by an earlier turn come back as duplicates
             original_products = message_logs.get("original_products", [])
-            
-            for product in original_products:
-                tasks.append(self.save_products(product))
-            # print(results)
+            tasks.append(Product.bulk_create(
+                [{"$id": product["product_id"], **self.product_data(product)} for product in original_products]
+            ))
+
         data = {
             "role": message_logs["role"],
             "chat_id": message_logs['chat_id'],
@@ -119,14 +118,18 @@ class AppwriteSessionManager:
 
         tasks.append(Message.create(document_id, data))
         results = await gather(*tasks, return_exceptions=True)
-        print(results)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to log message for chat {message_logs['chat_id']}: {str(result)}")
+            elif isinstance(result, BulkWriteResult) and not result.ok:
+                logger.warning(f"Some products were not saved: {result.to_dict()}")
 
-    async def save_products(self, product: Dict[str, Any]):
+    def product_data(self, product: Dict[str, Any]) -> Dict[str, Any]:
         specification = product.get('specification', [])
         features = product.get('features', [])
         original_price = product.get('old_price', float(0))
 
-        product_dict = dict(
+        return dict(
             name=product.get("name", ""),
             brand=product.get("brand", ""),
             url=product.get("url", ""),
@@ -141,7 +144,9 @@ class AppwriteSessionManager:
             reviews_count=product.get("rating_count", 0),
             currency=product.get("currency", "₦")
         )
-        return await Product.create(product["product_id"], product_dict)
+
+    async def save_products(self, product: Dict[str, Any]):
+        return await Product.create(product["product_id"], self.product_data(product))
 
     async def log_message(
         self, 
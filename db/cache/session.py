@@ -6,8 +6,7 @@ from typing import Dict, Any, List, Optional, Literal
 import redis.asyncio as redis
 
 from utils.logging import logger
-from .._appwrite.chat import create_chat, create_message
-from schema.dataclass.database import Chat, Message
+from api.chat.model import Chat, Message
 
 class RedisSessionManager:
     def __init__(self, redis_url: str = 'redis://localhost:6379/0'):
@@ -153,48 +152,50 @@ class RedisSessionManager:
             # Determine user ID and other metadata
             user_id = session_data.get('user_id', 'unknown')
             start_time = datetime.fromisoformat(session_data.get('start_time', datetime.now(timezone.utc).isoformat()))
-            end_time = datetime.fromisoformat(session_data.get('end_time', datetime.now(timezone.utc).isoformat()))
-            
-            # Create a single chat for the entire session
-            chat_payload = Chat(
-                title=session_data.get('title', f"Session {session_id}"),
-                user_id=user_id,
-                start_time=start_time,
-                end_time=end_time,
-                focus_mode=session_data.get('focus_mode', 'default'),
-                files=[]
+            
+            # Create a single chat for the entire session, keyed by the session so a retried flush reuses it
+            chat = await Chat.get_or_create(Chat.hash(f"session:{session_id}"), {
+                "title": session_data.get('title', f"Session {session_id}"),
+                "user_id": user_id,
+                "start_time": start_time.isoformat(),
+                "focus_mode": session_data.get('focus_mode', 'default'),
+                "file_ids": [],
+            })
+
+            # Each message is keyed by its Redis id, retrying after a partial failure only writes the missing ones
+            message_ids = [message_data.get('message_id', '') for message_data in messages]
+            result = await Message.bulk_create(
+                [
+                    {
+                        "content": message_data.get('content', ''),
+                        "chat_id": chat.id,
+                        "role": message_data.get('type', 'assistant'),
+                        "metadata": json.dumps({
+                            'timestamp': message_data.get('timestamp', datetime.now(timezone.utc).isoformat()),
+                            'original_message_id': message_data.get('message_id', '')
+                        }),
+                    }
+                    for message_data in messages
+                ],
+                keys=[f"{session_id}:{message_id}" for message_id in message_ids],
             )
-
-            # Create the chat in Appwrite
-            chat_result = await create_chat(chat_payload)
-            chat_id = chat_result['$id']  # Assuming the result contains the chat ID
-
-            # Prepare and create messages for this chat
-            for message_data in messages:
-                message_payload = Message(
-                    content=message_data.get('content', ''),
-                    chat_id=chat_id,
-                    role=message_data.get('type', 'assistant'),
-                    metadata=json.dumps({
-                        'timestamp': message_data.get('timestamp', datetime.now(timezone.utc).isoformat()),
-                        'original_message_id': message_data.get('message_id', '')
-                    })
+            if not result.ok:
+                # Keep the session in Redis so end_session can be called again
+                raise RuntimeError(
+                    f"{len(result.failed)} of {result.total} messages were not saved: {result.failed_ids}"
                 )
-                await create_message(message_payload)
 
             # Clean up Redis data
             user_id = session_data.get('user_id')
             if user_id:
                 await self.redis.srem(f"{self.USER_SESSIONS_PREFIX}{user_id}", session_id)
             
-            # Delete session and its messages from Redis
-            await self.redis.delete(f"{self.SESSION_PREFIX}{session_id}")
-            await self.redis.delete(f"{self.SESSION_PREFIX}{session_id}:messages")
-            
-            # Delete all associated message entries
-            message_ids = await self.redis.lrange(f"{self.SESSION_PREFIX}{session_id}:messages", 0, -1)
-            for msg_id in message_ids:
-                await self.redis.delete(f"{self.MESSAGE_PREFIX}{msg_id}")
+            # Delete session, its message list and every message entry
+            await self.redis.delete(
+                f"{self.SESSION_PREFIX}{session_id}",
+                f"{self.SESSION_PREFIX}{session_id}:messages",
+                *(f"{self.MESSAGE_PREFIX}{msg_id}" for msg_id in message_ids if msg_id),
+            )
             
             logger.info(f"Ended and synced session: {session_id}")
 
@@ -1,10 +1,19 @@
 from contextlib import asynccontextmanager
-from asyncio import create_task
+import asyncio
 
 from config import PORT, DB_PATH, SENTRY_API_KEY, PRODUCTION_MODE
 from _websockets import websocket_router
 from db.cache.dict import DiskCacheDB, VectorStore
 from db._appwrite.db_register import prepare_database
+from db._appwrite.model_base import AppwriteModelBase
+from db._appwrite.loader import loader_scope
+from api.auth.ledger import credit_ledger
+from api.payments.usage import usage_aggregator
+from agents.memory_consolidation import memory_consolidator
+from utils.memory import store as memory_store
+from utils.checkpointer import checkpointers
+from utils.flare_bypasser import flare_gateway
+from utils.email_manager import manager as email_account_manager
 from api.product.deep_search import initialize_list_tools
 from utils.backup_manager import BackupManager
 
@@ -13,15 +22,15 @@ from api import (
     auth_router, 
     product_router, 
     track_router, 
-    queue_worker, 
     payment_router, 
     admin_router
 )
 
 from utils.logging import logger
-from utils.queue import PRIORITY_LEVELS
 from utils.middleware import AuthenticationMiddleware
 from utils._craw4ai import CrawlerManager
+from utils.crawl_cache import crawl_cache
+from utils.image_validator import image_validator
 from utils.background import background_task
 from utils.request_session import http_client
 from utils.exceptions import PaymentRequiredError
@@ -88,8 +97,12 @@ async def lifespan(app: FastAPI):
         stats = await db_cache.get_stats()
         logger.info(f"Initial cache stats: {stats}")
 
-        for level in range(PRIORITY_LEVELS):
-            create_task(queue_worker(level))
+        credit_ledger.start()
+        usage_aggregator.start()
+        memory_consolidator.start()
+        for saver in checkpointers.values():
+            saver.start()
+        await flare_gateway.start()
     
         
         yield
@@ -101,12 +114,34 @@ async def lifespan(app: FastAPI):
         logger.info("Cleaning up web crawler...")
         await CrawlerManager.cleanup()
         logger.info("Web crawler cleanup completed.")
+        logger.info(f"Crawl cache stats: {crawl_cache.stats.to_dict()}")
+        await crawl_cache.close()
+        await image_validator.close()
 
         await background_task.close()
         logger.info("Background task closed successfully")
 
-        # await flare_bypasser.close()
-        # logger.info("Flare bypasser client closed successfully")
+        await credit_ledger.close()
+        logger.info("Credit ledger flushed successfully")
+
+        await usage_aggregator.close()
+        logger.info(f"Usage aggregator flushed: {usage_aggregator.stats.to_dict()}")
+
+        await memory_consolidator.close()
+        logger.info(f"Memory consolidator drained: {memory_consolidator.stats.to_dict()}")
+        memory_store.flush()
+        await asyncio.to_thread(email_account_manager.delivery.close)
+        logger.info(f"Email delivery closed: {email_account_manager.delivery.stats.to_dict()}")
+
+        for name, saver in checkpointers.items():
+            await saver.close()
+            logger.info(f"Checkpointer {name} closed: {saver.stats.to_dict()}")
+
+        await AppwriteModelBase.client.close()
+        logger.info("Appwrite client closed successfully")
+
+        await flare_gateway.close()
+        logger.info(f"Flare bypasser gateway closed: {flare_gateway.stats.to_dict()}")
 
         db_cache.close()
         logger.info("Database manager closed successfully")
@@ -141,9 +176,10 @@ app.router.lifespan_context = lifespan
 # Make db_manager available to request state
 @app.middleware("http")
 async def add_db_manager(request: Request, call_next):
-    """Add database manager to request state."""
+    """Add database manager to request state and open the Appwrite read batching scope."""
     request.state.db_cache = db_cache
-    response = await call_next(request)
+    with loader_scope():
+        response = await call_next(request)
     return response
 
 
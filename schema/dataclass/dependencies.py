@@ -1,7 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from config import ApiKeyConfig
 from httpx import AsyncClient
-from itertools import cycle
+from utils.key_scheduler import gemini_keys, serp_keys
 
 
 GEMINI_API_KEY_2 = ApiKeyConfig.GEMINI_API_KEY_2
@@ -9,29 +9,25 @@ GEMINI_API_KEY = ApiKeyConfig.GEMINI_API_KEY
 GEMINI_API_KEY_4 = ApiKeyConfig.GEMINI_API_KEY_4
 GEMINI_API_KEY_3 = ApiKeyConfig.GEMINI_API_KEY_3
 
-# Create a cycle iterator for the API keys
-_api_key_cycle = cycle([GEMINI_API_KEY, GEMINI_API_KEY_2])
-_serp_api_key_cycle = cycle([GEMINI_API_KEY_3, GEMINI_API_KEY_4])
 
 def get_next_gemini_api_key() -> str:
     """
-    Returns the next Gemini API key in the rotation.
-    This function alternates between the two available API keys.
+    Returns the Gemini API key with the most quota left right now.
+    Calls made through BaseAgent.call_llm lease keys from the scheduler directly.
     
     Returns:
-        str: The next API key to use
+        str: The API key to use
     """
-    return next(_api_key_cycle)
+    return gemini_keys.pick()
 
 def get_next_serp_api_key() -> str:
     """
-    Returns the next Gemini API key in the rotation.
-    This function alternates between the two available API keys.
+    Returns the scraping Gemini API key with the most quota left right now.
     
     Returns:
-        str: The next API key to use
+        str: The API key to use
     """
-    return next(_serp_api_key_cycle)
+    return serp_keys.pick()
 
 
 @dataclass
@@ -41,11 +37,11 @@ class BaseDependencies:
 
 @dataclass
 class GeminiDependencies(BaseDependencies):
-    api_key: str = get_next_gemini_api_key()
+    api_key: str = field(default_factory=get_next_gemini_api_key)
 
 @dataclass
 class ScrapingDependencies(BaseDependencies):
-    api_key: str = get_next_serp_api_key()
+    api_key: str = field(default_factory=get_next_serp_api_key)
 
 
 @dataclass
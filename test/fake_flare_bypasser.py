@@ -0,0 +1,66 @@
+import json
+import time
+import asyncio
+from typing import List, Set
+
+import httpx
+
+
+class FakeBypasser:
+    """
+    In-process stand-in for the bypasser container and the Cloudflare sites behind it.
+
+    Pass .transport to BypasserGateway. Solves answer /v1 after solve_delay with
+    a fresh cf_clearance cookie; site requests succeed with a cookie that has not
+    been revoked and get a 403 challenge otherwise.
+    """
+
+    def __init__(self, solve_delay: float = 0.0, clearance_ttl: float = 1800):
+        self.solve_delay = solve_delay
+        self.clearance_ttl = clearance_ttl
+        self.solves: List[str] = []
+        self.site_requests = 0
+        self.max_concurrent = 0
+        self._running = 0
+        self._valid: Set[str] = set()
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def revoke(self):
+        """Make every clearance issued so far fail, as when Cloudflare rotates them."""
+        self._valid.clear()
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/v1":
+            return await self._solve(request)
+        self.site_requests += 1
+        cookies = dict(
+            part.strip().split("=", 1) for part in request.headers.get("cookie", "").split(";") if "=" in part
+        )
+        if cookies.get("cf_clearance") in self._valid:
+            return httpx.Response(200, text=f"page {request.url.path}")
+        return httpx.Response(403, headers={"cf-mitigated": "challenge", "server": "cloudflare"})
+
+    async def _solve(self, request: httpx.Request) -> httpx.Response:
+        self._running += 1
+        self.max_concurrent = max(self.max_concurrent, self._running)
+        try:
+            await asyncio.sleep(self.solve_delay)
+        finally:
+            self._running -= 1
+
+        url = httpx.URL(json.loads(request.content)["url"])
+        self.solves.append(url.host)
+        value = f"clearance-{len(self.solves)}"
+        self._valid.add(value)
+        return httpx.Response(200, json={
+            "status": "ok",
+            "solution": {
+                "url": str(url),
+                "status": 200,
+                "cookies": [{"name": "cf_clearance", "value": value, "expires": time.time() + self.clearance_ttl}],
+                "userAgent": "Mozilla/5.0 (fake bypasser)",
+            },
+        })
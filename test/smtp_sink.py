@@ -0,0 +1,66 @@
+import threading
+from email import message_from_bytes
+from email.message import Message
+from typing import List, Set
+
+from aiosmtpd.controller import Controller
+
+from utils.email_manager import EmailAccount
+
+
+class SMTPSink:
+    """
+    Local SMTP server that keeps what it receives, for tests and benchmarks.
+
+    Use it as a context manager and send through .account(). Recipients in
+    reject get a permanent 550; the next fail_next messages get a 451.
+    """
+
+    def __init__(self, port: int = 8025, reject: Set[str] = None, fail_next: int = 0):
+        self.port = port
+        self.reject = reject or set()
+        self.fail_next = fail_next
+        self.messages: List[Message] = []
+        self.envelopes = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self.controller = Controller(self, hostname="127.0.0.1", port=port)
+
+    def account(self, from_email: str = "no-reply@volera.app") -> EmailAccount:
+        return EmailAccount(
+            name="Sink",
+            from_email=from_email,
+            smtp_password=None,
+            login_email=from_email,
+            smtp_server="127.0.0.1",
+            smtp_port=self.port,
+            starttls=False,
+        )
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        with self._lock:
+            self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.reject:
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return "451 Try again later"
+            self.envelopes.append(envelope)
+            self.messages.append(message_from_bytes(envelope.content))
+        return "250 Message accepted for delivery"
+
+    def __enter__(self) -> "SMTPSink":
+        self.controller.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.controller.stop()
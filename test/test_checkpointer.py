@@ -0,0 +1,53 @@
+import asyncio
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.graph import StateGraph
+
+from utils.checkpointer import DiskCheckpointer
+
+
+class CounterState(TypedDict):
+    turns: Annotated[list, operator.add]
+
+
+def build_graph(checkpointer):
+    builder = StateGraph(CounterState)
+    builder.add_node("reply", lambda state: {"turns": [f"reply {len(state['turns'])}"]})
+    builder.set_entry_point("reply")
+    builder.set_finish_point("reply")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def test_state_survives_reopen(tmp_path):
+    path = str(tmp_path / "graph.sqlite")
+    config = {"configurable": {"thread_id": "user-1"}}
+
+    graph = build_graph(DiskCheckpointer(path))
+    asyncio.run(graph.ainvoke({"turns": ["hello"]}, config))
+
+    reopened = build_graph(DiskCheckpointer(path))
+    result = asyncio.run(reopened.ainvoke({"turns": ["again"]}, config))
+
+    assert result["turns"] == ["hello", "reply 1", "again", "reply 3"]
+
+
+def test_keeps_only_last_checkpoints(tmp_path):
+    saver = DiskCheckpointer(str(tmp_path / "graph.sqlite"), keep=3)
+    graph = build_graph(saver)
+    config = {"configurable": {"thread_id": "user-1"}}
+
+    for n in range(5):
+        graph.invoke({"turns": [f"turn {n}"]}, config)
+
+    assert len(list(saver.list(config))) == 3
+    assert len(graph.get_state(config).values["turns"]) == 10
+
+
+def test_idle_threads_expire(tmp_path):
+    saver = DiskCheckpointer(str(tmp_path / "graph.sqlite"), ttl=60)
+    graph = build_graph(saver)
+    graph.invoke({"turns": ["hi"]}, {"configurable": {"thread_id": "old"}})
+
+    assert saver.expire_threads(now=10**10) == 1
+    assert saver.get_tuple({"configurable": {"thread_id": "old"}}) is None
@@ -0,0 +1,94 @@
+import time
+import socket
+
+import pytest
+
+import utils.email_delivery as email_delivery
+from utils.email_delivery import EmailDelivery, render_template
+from utils.email_manager import EmailAccountManager
+from test.smtp_sink import SMTPSink
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def sink():
+    with SMTPSink(port=free_port()) as sink:
+        yield sink
+
+
+def make_manager(tmp_path, sink, rpm=6000, pool_size=2):
+    manager = EmailAccountManager()
+    manager.accounts = {"sink": sink.account()}
+    manager.delivery = EmailDelivery(
+        manager.accounts,
+        pool_size=pool_size,
+        default_rpm=rpm,
+        dead_letter_dir=str(tmp_path / "dead_letters"),
+    )
+    return manager
+
+
+def test_bulk_send_reuses_pooled_connections(tmp_path, sink):
+    manager = make_manager(tmp_path, sink)
+    recipients = [(f"user{n}@example.com", {"name": f"User {n}"}) for n in range(30)]
+
+    counts = manager.send_bulk("sink", "Price drop", "<p>Hi {{name}}, see {{url}}</p>", recipients)
+    manager.delivery.close()
+
+    assert counts == {"sent": 30, "failed": 0}
+    assert len(sink.messages) == 30
+    assert sink.connections <= 2
+    bodies = {m["To"]: m.get_payload()[0].get_payload(decode=True).decode() for m in sink.messages}
+    assert bodies["user7@example.com"] == "<p>Hi User 7, see {{url}}</p>"
+
+
+def test_transient_failures_are_retried(tmp_path, sink, monkeypatch):
+    monkeypatch.setattr(email_delivery, "RETRY_BASE", 0.01)
+    sink.fail_next = 2
+    manager = make_manager(tmp_path, sink)
+    manager.choose_account("sink")
+
+    manager.send_email("user@example.com", "Hello", "<p>Hello</p>", recipients=["hidden@example.com"])
+    manager.delivery.close()
+
+    assert manager.delivery.stats.retried == 2
+    assert sink.envelopes[0].rcpt_tos == ["user@example.com", "hidden@example.com"]
+    assert "Bcc" not in sink.messages[0]
+
+
+def test_rejected_messages_are_dead_lettered_and_replayed(tmp_path, sink):
+    sink.reject = {"gone@example.com"}
+    manager = make_manager(tmp_path, sink)
+
+    assert manager.delivery.send("sink", manager.build_message("sink", "gone@example.com", "Hi", "<p>Hi</p>")) is False
+    assert len(manager.delivery.dead_letters) == 1
+    assert manager.delivery.dead_letters[0].attempts == 1
+
+    sink.reject = set()
+    assert manager.delivery.replay_dead_letters() == {"sent": 1, "failed": 0}
+    manager.delivery.close()
+    assert len(manager.delivery.dead_letters) == 0
+    assert sink.messages[0]["To"] == "gone@example.com"
+
+
+def test_sends_are_paced_by_provider_rate(tmp_path, sink):
+    # 1200 a minute is 20 a second, with a burst of 20
+    manager = make_manager(tmp_path, sink, rpm=1200, pool_size=4)
+    recipients = [(f"user{n}@example.com", {}) for n in range(30)]
+
+    started = time.monotonic()
+    manager.send_bulk("sink", "Hi", "<p>Hi</p>", recipients)
+    elapsed = time.monotonic() - started
+    manager.delivery.close()
+
+    assert elapsed >= 0.45
+    assert manager.delivery.stats.rate_limited_seconds > 0
+
+
+def test_render_template_keeps_unknown_placeholders():
+    assert render_template("{{a}} and {{b}}", {"a": "1"}) == "1 and {{b}}"
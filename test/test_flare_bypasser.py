@@ -0,0 +1,65 @@
+import asyncio
+
+from utils.flare_bypasser import BypasserGateway, ClearanceStore, FlareBypasserClient
+from test.fake_flare_bypasser import FakeBypasser
+
+
+def make_gateway(tmp_path, fake, max_solves=3):
+    return BypasserGateway(
+        base_url="http://bypasser",
+        max_solves=max_solves,
+        store=ClearanceStore(str(tmp_path / "clearance")),
+        transport=fake.transport,
+    )
+
+
+def test_one_solve_per_domain_across_clients(tmp_path):
+    fake = FakeBypasser(solve_delay=0.05)
+    gateway = make_gateway(tmp_path, fake)
+
+    async def run():
+        clients = [FlareBypasserClient(gateway=gateway) for _ in range(3)]
+        responses = await asyncio.gather(*(
+            client.get(f"https://jiji.ng/item/{n}") for n, client in enumerate(clients * 4)
+        ))
+        await gateway.close()
+        return responses
+
+    responses = asyncio.run(run())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert fake.solves == ["jiji.ng"]
+    assert gateway.stats.coalesced == 11
+
+
+def test_solves_are_bounded(tmp_path):
+    fake = FakeBypasser(solve_delay=0.05)
+    gateway = make_gateway(tmp_path, fake, max_solves=2)
+
+    async def run():
+        client = FlareBypasserClient(gateway=gateway)
+        await asyncio.gather(*(client.get(f"https://shop{n}.example/") for n in range(6)))
+        await gateway.close()
+
+    asyncio.run(run())
+
+    assert len(fake.solves) == 6
+    assert fake.max_concurrent == 2
+
+
+def test_challenged_clearance_is_resolved(tmp_path):
+    fake = FakeBypasser()
+    gateway = make_gateway(tmp_path, fake)
+
+    async def run():
+        client = FlareBypasserClient(gateway=gateway)
+        await client.get("https://jiji.ng/")
+        fake.revoke()
+        response = await client.get("https://jiji.ng/")
+        await gateway.close()
+        return response
+
+    response = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert len(fake.solves) == 2
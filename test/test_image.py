@@ -0,0 +1,54 @@
+import io
+import random
+
+from diskcache import Cache
+from PIL import Image, ImageDraw
+
+import utils.image as image_module
+from utils.image import cached_analysis, hamming, prepare_image, store_analysis
+
+PROMPT = "Find this product"
+
+
+def photo(seed: int, size=(2400, 1800)) -> bytes:
+    """A synthetic product photo: random shapes on a background, different for every seed."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        w, h = rng.randrange(200, 900), rng.randrange(200, 900)
+        draw.rectangle((x, y, x + w, y + h), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return encode(image)
+
+
+def encode(image: Image.Image, quality: int = 95) -> bytes:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=quality)
+    return buffered.getvalue()
+
+
+def test_prepare_image_caps_the_longest_side():
+    prepared = prepare_image(photo(1), max_dimension=1536)
+    assert (prepared.width, prepared.height) == (1536, 1152)
+    assert Image.open(io.BytesIO(prepared.data)).size == (1536, 1152)
+
+    small = prepare_image(photo(1, size=(800, 600)), max_dimension=1536)
+    assert (small.width, small.height) == (800, 600)
+
+
+def test_near_identical_photos_reuse_an_analysis_but_different_ones_do_not(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_module, "_cache", Cache(str(tmp_path)))
+    original = prepare_image(photo(1))
+    # The same photo uploaded again, smaller and recompressed
+    resized = Image.open(io.BytesIO(photo(1))).resize((1200, 900))
+    reupload = prepare_image(encode(resized, quality=70))
+    other = prepare_image(photo(2))
+
+    assert hamming(original.dhash, reupload.dhash) <= image_module.HASH_DISTANCE
+    assert hamming(original.dhash, other.dhash) > image_module.HASH_DISTANCE
+
+    store_analysis(PROMPT, (original.dhash,), "red sneakers")
+    assert cached_analysis(PROMPT, (reupload.dhash,)) == "red sneakers"
+    assert cached_analysis(PROMPT, (other.dhash,)) is None
+    assert cached_analysis("Find something else", (original.dhash,)) is None
@@ -0,0 +1,41 @@
+import pytest
+
+from utils.limiter import Limiter, RateLimit
+
+
+@pytest.mark.parametrize("algorithm", ["gcra", "token_bucket", "sliding_window"])
+def test_allows_burst_then_rejects(algorithm):
+    limiter = Limiter()
+    limit = RateLimit(times=5, seconds=60, algorithm=algorithm)
+
+    results = [limiter._check_limit_memory("ip:1", limit, now=0.0) for _ in range(6)]
+
+    assert [r["allowed"] for r in results] == [True] * 5 + [False]
+    assert results[4]["remaining"] == 0
+    assert results[5]["retry_after"] > 0
+
+
+@pytest.mark.parametrize("algorithm", ["gcra", "token_bucket"])
+def test_refills_at_sustained_rate(algorithm):
+    limiter = Limiter()
+    limit = RateLimit(times=5, seconds=60, algorithm=algorithm)
+    for _ in range(5):
+        limiter._check_limit_memory("ip:1", limit, now=0.0)
+
+    assert not limiter._check_limit_memory("ip:1", limit, now=11.0)["allowed"]
+    assert limiter._check_limit_memory("ip:1", limit, now=12.0)["allowed"]
+
+
+def test_idle_keys_are_evicted():
+    limiter = Limiter(max_keys=3)
+    limit = RateLimit(times=5, seconds=60)
+
+    limiter._check_limit_memory("ip:1", limit, now=0.0)
+    limiter._check_limit_memory("ip:2", limit, now=0.0)
+    # ip:1 has fully recovered by now
+    limiter._check_limit_memory("ip:3", limit, now=100.0)
+    assert len(limiter.memory_store) == 1
+
+    for i in range(5):
+        limiter._check_limit_memory(f"ip:{i}", limit, now=101.0)
+    assert len(limiter.memory_store) <= 3
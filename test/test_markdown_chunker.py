@@ -0,0 +1,34 @@
+from utils.markdown_chunker import MarkdownChunker
+
+
+PAGE = (
+    "Home | Login | Cart\n\n"
+    "# Samsung Galaxy A15\nprice 150000 brand samsung rating 4.5\n\n"
+    "## Footer\n" + "copyright all rights reserved " * 80 + "\n\n"
+    "## HP Laptop\nname hp 250 price 420000 discount 10%"
+)
+
+
+def test_split_respects_token_budget():
+    chunker = MarkdownChunker(max_tokens=60, top_k=2)
+    chunks = chunker.split(PAGE)
+
+    assert len(chunks) > 2
+    assert all(chunker.count_tokens(chunk) <= 60 for chunk in chunks)
+
+
+def test_select_keeps_product_chunks_in_order():
+    chunker = MarkdownChunker(max_tokens=60, top_k=2)
+    selected = chunker.select(PAGE, "laptop")
+
+    assert len(selected) == 2
+    assert "Samsung" in selected[0]
+    assert "HP Laptop" in selected[1]
+    assert chunker.stats.pages == 1
+    assert chunker.stats.tokens_saved > 0
+
+
+def test_small_page_is_sent_whole():
+    chunker = MarkdownChunker(max_tokens=500, top_k=3)
+    assert chunker.select("# Phone\nprice 1000", "phone") == ["# Phone\nprice 1000"]
+    assert chunker.stats.tokens_saved == 0
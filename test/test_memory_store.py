@@ -0,0 +1,110 @@
+import hashlib
+
+import numpy as np
+
+from utils.memory import DiskCacheStore
+from utils import vector_index
+
+
+class HashEmbeddings:
+    """Deterministic stand-in for FastEmbed: the same text always maps to the same vector."""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.calls = 0
+
+    def _vector(self, text: str) -> list:
+        seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def make_store(tmp_path, embeddings=None):
+    return DiskCacheStore(
+        cache_dir=str(tmp_path / "memory"),
+        index={"embed": embeddings or HashEmbeddings()},
+    )
+
+
+def test_search_ranks_exact_match_first(tmp_path):
+    store = make_store(tmp_path)
+    for i in range(20):
+        store.put(("u1", "memories"), f"m{i}", {"text": f"memory {i}"})
+    store.put(("u2", "memories"), "other", {"text": "memory 7"})
+
+    results = store.search(("u1", "memories"), query="memory 7", limit=3)
+
+    assert [r.key for r in results][0] == "m7"
+    assert len(results) == 3
+    assert all(r.namespace == ("u1", "memories") for r in results)
+
+
+def test_put_many_embeds_in_one_call(tmp_path):
+    embeddings = HashEmbeddings()
+    store = make_store(tmp_path, embeddings)
+
+    store.put_many(("u1", "memories"), [(f"m{i}", {"text": f"memory {i}"}) for i in range(10)])
+
+    assert embeddings.calls == 1
+    assert len(store.search(("u1", "memories"), query="memory 3", limit=20)) == 10
+
+
+def test_delete_and_update_are_reflected(tmp_path):
+    store = make_store(tmp_path)
+    store.put(("u1", "memories"), "a", {"text": "alpha"})
+    store.put(("u1", "memories"), "b", {"text": "beta"})
+
+    store.delete(("u1", "memories"), "a")
+    store.put(("u1", "memories"), "b", {"text": "gamma"})
+
+    results = store.search(("u1", "memories"), query="gamma", limit=5)
+    assert [r.key for r in results] == ["b"]
+    assert results[0].value == {"text": "gamma"}
+    assert results[0].score > 0.99
+
+
+def test_index_survives_reopen_and_outside_writes(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many(("u1", "memories"), [(f"m{i}", {"text": f"memory {i}"}) for i in range(5)])
+    store.flush()
+
+    # A second store on the same directory, as another worker process would have
+    other = make_store(tmp_path)
+    other.put(("u1", "memories"), "late", {"text": "written elsewhere"})
+
+    assert other.search(("u1", "memories"), query="memory 2", limit=1)[0].key == "m2"
+    assert store.search(("u1", "memories"), query="written elsewhere", limit=1)[0].key == "late"
+
+
+def test_hnsw_index_skips_deleted(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_index, "HNSW_THRESHOLD", 16)
+    store = make_store(tmp_path)
+    store.put_many(("u1", "memories"), [(f"m{i}", {"text": f"memory {i}"}) for i in range(40)])
+    assert store._indexes["u1::memories"].hnsw
+
+    store.delete(("u1", "memories"), "m3")
+
+    keys = [r.key for r in store.search(("u1", "memories"), query="memory 3", limit=40)]
+    assert "m3" not in keys
+    assert len(keys) == 39
+
+
+def test_rebuild_reads_only_its_namespace(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    store.put_many(("u1", "memories"), [(f"m{i}", {"text": f"memory {i}"}) for i in range(5)])
+    store.put(("u1", "memories", "nested"), "n", {"text": "nested memory"})
+    store.put(("u2", "memories"), "other", {"text": "memory 1"})
+    store.delete(("u1", "memories"), "m4")
+
+    reopened = make_store(tmp_path)
+    monkeypatch.setattr(reopened.vector_cache, "iterkeys", lambda: iter(()))
+    vector_index = reopened._rebuild_index("u1::memories")
+
+    assert len(vector_index) == 4
+    assert reopened.search(("u1", "memories"), query="memory 1", limit=10)[0].key == "m1"
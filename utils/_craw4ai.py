@@ -372,7 +372,7 @@ async def extract_data_with_css(
         fields: List of fields to extract, each with 'name', 'selector', and 'type'
         js_code: Optional JavaScript code to execute before extraction
         wait_for: Optional CSS selector to wait for before extraction
-        bypass_cache: Whether to bypass the crawler's cache
+        bypass_cache: Whether to re-crawl instead of serving the page from the crawl cache
         
     Returns:
         List of extracted data items matching the schema
@@ -394,9 +394,12 @@ async def extract_data_with_css(
     #     config =config.clone(proxy_config={'server': proxy_url})
         # print(config)
 
-    result = await crawler.arun(
+    from utils.crawl_cache import crawl_cache
+    result = await crawl_cache.arun(
             url=url,
-            config=config
+            config=config,
+            freshness="bypass" if bypass_cache else "default",
+            crawler=crawler
     )
 
     extracted_data = []
@@ -1,6 +1,8 @@
 import os
 import json
 import boto3
+import asyncio
+import tempfile
 
 from datetime import datetime
 from appwrite.client import Client
@@ -35,30 +37,39 @@ class BackupManager:
         
     async def create_backup(self):
         """Create a backup of the Appwrite database"""
+        from db._appwrite.model_base import AppwriteModelBase
+        client = AppwriteModelBase.client
+
         try:
             # Get all collections in the database
-            collections = self.databases.list_collections(self.database_id)
-            
-            backup_data = {}
-            for collection in collections['collections']:
-                collection_id = collection['$id']
-                # Get all documents in the collection
-                documents = self.databases.list_documents(
-                    database_id=self.database_id,
-                    collection_id=collection_id
-                )
-                backup_data[collection_id] = documents['documents']
-            
+            collections = await asyncio.to_thread(self.databases.list_collections, self.database_id)
+
             # Create backup filename with timestamp
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             backup_filename = f'appwrite_backup_{timestamp}.json'
-            
-            # Upload backup to R2
-            self.r2_client.put_object(
-                Bucket=self.bucket_name,
-                Key=backup_filename,
-                Body=json.dumps(backup_data, indent=2)
-            )
+
+            # Documents are streamed page by page into a temp file, so the
+            # backup never holds a whole collection in memory
+            with tempfile.NamedTemporaryFile('w+', suffix='.json', delete=False) as backup_file:
+                backup_file.write('{')
+                for index, collection in enumerate(collections['collections']):
+                    collection_id = collection['$id']
+                    backup_file.write(f'{"," if index else ""}\n{json.dumps(collection_id)}: [')
+
+                    first = True
+                    async for document in client.iter_documents(collection_id, page_size=100):
+                        backup_file.write(('' if first else ',') + '\n' + json.dumps(document))
+                        first = False
+                    backup_file.write('\n]')
+                backup_file.write('\n}\n')
+
+            try:
+                # Upload backup to R2, multipart for large files
+                await asyncio.to_thread(
+                    self.r2_client.upload_file, backup_file.name, self.bucket_name, backup_filename
+                )
+            finally:
+                os.remove(backup_file.name)
             
             logger.info(f'Backup created successfully: {backup_filename}')
             return True
@@ -1,17 +1,15 @@
 from celery import Celery
 from typing import List, Dict, Optional, Union, Literal
-import smtplib
 from typing import Dict, List
-import re
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import time
 from pathlib import Path
 import os
 from celery.schedules import crontab
+from celery.signals import worker_process_shutdown
 
 from utils.logging import logger
 from utils.email_manager import manager as email_manager
+from utils.email_delivery import render_template
+from utils.exceptions import EmailDeliveryError
 
 # Get Redis URL from environment variable
 REDIS_URL = "redis://redis:6379/0"
@@ -84,11 +82,9 @@ celery_app.conf.update(
     # }
 )
 
-# Rate limiting settings
-RATE_LIMIT = {
-    'emails_per_minute': 3,  # Adjust based on your SMTP provider's limits
-    'burst_size': 50
-}
+# Bulk emails go out in batches of about this many seconds of sending at the provider's rate
+BULK_BATCH_SECONDS = 60
+BULK_BATCH_MAX = 100
 
 # Priority settings
 PRIORITY_SETTINGS = {
@@ -161,15 +157,23 @@ def send_email(self,
             "priority": priority
         }
 
+    except EmailDeliveryError as e:
+        # Already retried over the pool and kept in the dead letter queue for replay
+        error_msg = f"Error sending {priority} priority email to {to_email}: {str(e)}"
+        logger.error(error_msg)
+        return {
+            "status": "error",
+            "message": error_msg,
+            "recipient": to_email,
+            "priority": priority
+        }
+
     except Exception as e:
         error_msg = f"Error sending {priority} priority email to {to_email}: {str(e)}"
         logger.error(error_msg, exc_info=True)
         
         # Determine if we should retry based on the error type
-        should_retry = isinstance(e, (smtplib.SMTPServerDisconnected, 
-                                    smtplib.SMTPSenderRefused,
-                                    smtplib.SMTPResponseException,
-                                    ConnectionError))
+        should_retry = isinstance(e, (ConnectionError, TimeoutError))
         
         if should_retry and self.request.retries < priority_config['max_retries']:
             retry_count = self.request.retries
@@ -191,13 +195,9 @@ def substitute_variables(template: str, variables: Dict[str, str], user_name: st
     Replaces placeholders in the template with actual values from the variables dictionary.
     If user_name is provided, it substitutes {name} with the given user name.
     """
-    def replacer(match):
-        key = match.group(1)
-        if key == "name" and user_name:
-            return user_name
-        return variables.get(key, f"{{{{{key}}}}}")  # Keep placeholder if not found
-    
-    return re.sub(r"{{(\w+)}}", replacer, template)
+    if user_name:
+        variables = {**variables, "name": user_name}
+    return render_template(template, variables)
 
 @celery_app.task(name="send_bulk_email")
 def send_bulk_email(emails: List[str],
@@ -209,7 +209,12 @@ def send_bulk_email(emails: List[str],
                     attachments: Optional[List[Dict[str, Union[str, bytes]]]] = None,
                     priority: Literal['high', 'normal', 'low'] = 'low') -> Dict:
     """
-    Celery task to send bulk emails with rate limiting and priority handling.
+    Celery task that splits a bulk email into send_email_batch tasks.
+
+    Each batch holds about BULK_BATCH_SECONDS of sending at the account's SMTP
+    provider rate and is scheduled for when the one before it should be done,
+    so together the batches keep to the provider's limit while no worker is
+    held for the whole send.
 
     Args:
         emails: List of recipient email addresses
@@ -218,54 +223,74 @@ def send_bulk_email(emails: List[str],
         html_content: HTML content of the email
         from_name: Optional sender name override
         account_key: Email account to use (default: "no-reply")
-        attachments: Optional list of attachments to include
-        priority: Priority level for the bulk emails
+        attachments: Not supported for bulk sends, passing any raises ValueError
+        priority: Priority level, picks the queue the batches run on
 
     Returns:
-        Dict with status and task IDs
+        Dict with status and batch task IDs
     """
+    if attachments:
+        raise ValueError("Attachments are not supported for bulk emails")
+
     link = "https://waitlist.volera.app/unsubscribe"
-    unsubscribe_links = [link+ '?email=' + email for email in emails]
-    results = []
-    chunk_size = min(RATE_LIMIT['burst_size'], RATE_LIMIT['emails_per_minute'])
-    
-    # Split email list and names into chunks
-    email_chunks = [emails[i:i + chunk_size] for i in range(0, len(emails), chunk_size)]
-    name_chunks = [user_names[i:i + chunk_size] for i in range(0, len(user_names), chunk_size)]
-    
-    # Send emails in chunks with rate limiting
-    for i, (chunk, name_chunk, unsubscribe_link) in enumerate(zip(email_chunks, name_chunks, unsubscribe_links)):
-        # Add delay between chunks to respect rate limits
-        if i > 0:
-            time.sleep(60 / RATE_LIMIT['emails_per_minute'] * chunk_size)
-        
-        chunk_tasks = [
-            send_email.apply_async(
-                args=[
-                    email,
-                    subject,
-                    substitute_variables(html_content, {'unsubscribe_url': unsubscribe_link}, user_name),
-                    from_name,
-                    account_key
-                ],
-                kwargs={
-                    'attachments': attachments,
-                    'priority': priority
-                },
-                queue=PRIORITY_SETTINGS[priority]['queue']
-            )
-            for email, user_name in zip(chunk, name_chunk)
-        ]
-        results.extend(chunk_tasks)
-        
-        logger.info(f"[{priority.upper()} PRIORITY] Initiated sending chunk {i+1}/{len(email_chunks)} " +
-                   f"({len(chunk)} emails)")
+    recipients = [
+        [email, {"unsubscribe_url": f"{link}?email={email}", **({"name": user_name} if user_name else {})}]
+        for email, user_name in zip(emails, user_names)
+    ]
 
+    rpm = email_manager.delivery.rate_for(account_key)
+    batch_size = max(1, min(BULK_BATCH_MAX, rpm * BULK_BATCH_SECONDS // 60))
+    queue = PRIORITY_SETTINGS[priority]['queue']
+    results = [
+        send_email_batch.apply_async(
+            args=[account_key, subject, html_content, recipients[start:start + batch_size], priority],
+            countdown=n * batch_size * 60 / rpm,
+            queue=queue
+        )
+        for n, start in enumerate(range(0, len(recipients), batch_size))
+    ]
+
+    logger.info(f"[{priority.upper()} PRIORITY] Queued {len(results)} batches of up to {batch_size} emails " +
+               f"for {len(recipients)} recipients")
     return {
         "status": "success",
-        "message": f"Bulk email task initiated for {len(emails)} recipients",
-        "task_ids": [str(task.id) for task in results],
-        "total_chunks": len(email_chunks),
-        "chunk_size": chunk_size,
+        "message": f"Bulk email task initiated for {len(recipients)} recipients",
+        "task_ids": [str(result.id) for result in results],
+        "total_batches": len(results),
+        "batch_size": batch_size,
+        "priority": priority
+    }
+
+
+@celery_app.task(name="send_email_batch")
+def send_email_batch(account_key: str,
+                     subject: str,
+                     html_content: str,
+                     recipients: List[List],
+                     priority: Literal['high', 'normal', 'low'] = 'low') -> Dict:
+    """
+    Celery task sending one bulk email batch over the pooled SMTP connections.
+
+    Args:
+        account_key: Email account to use
+        subject: Email subject
+        html_content: HTML template, {{placeholders}} filled per recipient
+        recipients: [email, variables] pairs
+        priority: Priority level of the bulk email, for logging
+
+    Returns:
+        Dict with delivery counts; failed emails are in the dead letter queue
+    """
+    counts = email_manager.send_bulk(account_key, subject, html_content, recipients)
+    logger.info(f"[{priority.upper()} PRIORITY] Email batch done: {counts}")
+    return {
+        "status": "success" if not counts["failed"] else "partial",
+        "sent": counts["sent"],
+        "failed": counts["failed"],
         "priority": priority
     }
+
+
+@worker_process_shutdown.connect
+def close_email_delivery(**kwargs):
+    email_manager.delivery.close()
@@ -0,0 +1,417 @@
+import time
+import zlib
+import random
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from config import CHECKPOINT_DIR, CHECKPOINT_KEEP, CHECKPOINT_TTL
+from utils.logging import logger
+
+
+# Blobs smaller than this are stored as serialized, compression would not pay for itself
+COMPRESS_MIN_BYTES = 256
+GC_INTERVAL = 10 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+COLUMNS = (
+    "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+    "type, checkpoint, metadata_type, metadata"
+)
+
+
+@dataclass
+class CheckpointStats:
+    puts: int = 0
+    writes: int = 0
+    pruned: int = 0
+    threads_expired: int = 0
+    bytes_serialized: int = 0
+    bytes_stored: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "compression_ratio": round(self.bytes_serialized / self.bytes_stored, 2) if self.bytes_stored else 0.0,
+        }
+
+
+class DiskCheckpointer(BaseCheckpointSaver[str]):
+    """
+    SQLite-backed checkpoint saver, a drop-in for MemorySaver.
+
+    Checkpoints, metadata and writes go through the serializer (msgpack) and are
+    zlib-compressed when large enough to benefit. Only the newest keep checkpoints
+    of each thread and namespace are retained, and threads untouched for ttl
+    seconds are deleted by a periodic sweep. The database runs in WAL mode so
+    several workers can share it.
+
+    Each graph gets its own database, since graphs share thread ids (the user
+    id) but not state shape; use checkpointer_for(name).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        keep: int = CHECKPOINT_KEEP,
+        ttl: int = CHECKPOINT_TTL,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+    ) -> None:
+        super().__init__(serde=serde)
+        self.keep = max(1, keep)
+        self.ttl = ttl
+        self.stats = CheckpointStats()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._gc_task: Optional[asyncio.Task] = None
+
+    def _dumps(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(obj)
+        self.stats.bytes_serialized += len(data)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            type_, data = f"{type_}+zlib", zlib.compress(data)
+        self.stats.bytes_stored += len(data)
+        return type_, data
+
+    def _loads(self, type_: str, data: bytes) -> Any:
+        if type_.endswith("+zlib"):
+            type_, data = type_[:-len("+zlib")], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    def _pending_writes(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        rows = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [(task_id, channel, self._loads(type_, value)) for task_id, channel, type_, value in rows]
+
+    def _pending_sends(self, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]) -> List[Any]:
+        if not parent_checkpoint_id:
+            return []
+        rows = self.conn.execute(
+            "SELECT type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS),
+        ).fetchall()
+        return [self._loads(type_, value) for type_, value in rows]
+
+    def _tuple(self, row: tuple, metadata: Optional[CheckpointMetadata] = None) -> CheckpointTuple:
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata_b = row
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self._loads(type_, checkpoint),
+                "pending_sends": self._pending_sends(thread_id, checkpoint_ns, parent_checkpoint_id),
+            },
+            metadata=metadata if metadata is not None else self._loads(metadata_type, metadata_b),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_checkpoint_id,
+                }
+            }
+            if parent_checkpoint_id
+            else None,
+            pending_writes=self._pending_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {COLUMNS} FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._tuple(row) if row else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {COLUMNS} FROM checkpoints {where} "
+                "ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC",
+                params,
+            ).fetchall()
+            results = []
+            for row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self._loads(row[6], row[7])
+                # Metadata is stored serialized, so filters are matched here
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(self._tuple(row, metadata))
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends", None)  # type: ignore[misc]
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        type_, data = self._dumps(c)
+        metadata_type, metadata_b = self._dumps(metadata)
+
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),  # parent
+                        type_,
+                        data,
+                        metadata_type,
+                        metadata_b,
+                        time.time(),
+                    ),
+                )
+                self._prune(thread_id, checkpoint_ns)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.stats.puts += 1
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Drop everything older than the newest keep checkpoints of this thread and namespace."""
+        row = self.conn.execute(
+            "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep - 1),
+        ).fetchone()
+        if row is None:
+            return
+        pruned = self.conn.execute(
+            "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, row[0]),
+        ).rowcount
+        self.conn.execute(
+            "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+            (thread_id, checkpoint_ns, row[0]),
+        )
+        self.stats.pruned += pruned
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        # Special channels (errors, interrupts) overwrite, ordinary writes keep the first value
+        query = (
+            "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            if all(channel in WRITES_IDX_MAP for channel, _ in writes)
+            else "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, *self._dumps(value))
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock:
+            self.conn.executemany(query, rows)
+        self.stats.writes += len(rows)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        next_v = current_v + 1
+        next_h = random.random()
+        return f"{next_v:032}.{next_h:016}"
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self.conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+
+    def expire_threads(self, now: Optional[float] = None) -> int:
+        """Delete threads with no checkpoint in the last ttl seconds; returns how many."""
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = [
+                    (thread_id,) for (thread_id,) in self.conn.execute(
+                        "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(updated_at) < ?",
+                        (cutoff,),
+                    )
+                ]
+                self.conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", stale)
+                self.conn.executemany("DELETE FROM writes WHERE thread_id = ?", stale)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.stats.threads_expired += len(stale)
+        return len(stale)
+
+    async def _gc_loop(self):
+        while True:
+            await asyncio.sleep(GC_INTERVAL)
+            try:
+                expired = await asyncio.to_thread(self.expire_threads)
+                if expired:
+                    logger.info(f"Expired {expired} checkpoint threads")
+            except Exception as e:
+                logger.error(f"Checkpoint GC failed: {str(e)}", exc_info=True)
+
+    def start(self):
+        if self._gc_task is None or self._gc_task.done():
+            self._gc_task = asyncio.create_task(self._gc_loop())
+
+    async def close(self):
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            await asyncio.gather(self._gc_task, return_exceptions=True)
+            self._gc_task = None
+        with self._lock:
+            self.conn.close()
+
+
+checkpointers: Dict[str, DiskCheckpointer] = {}
+
+
+def checkpointer_for(graph: str) -> DiskCheckpointer:
+    if graph not in checkpointers:
+        checkpointers[graph] = DiskCheckpointer(str(CHECKPOINT_DIR / f"{graph}.sqlite"))
+    return checkpointers[graph]
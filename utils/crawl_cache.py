@@ -0,0 +1,215 @@
+import time
+import zlib
+from dataclasses import dataclass, asdict
+from typing import Dict, Literal, Optional
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import httpx
+from diskcache import Cache
+from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+
+from config import CRAWL_CACHE_DIR, USER_AGENT
+from utils.logging import logger
+
+
+# "default"    serve from cache while the entry is younger than the site TTL
+# "revalidate" always ask the origin (ETag / Last-Modified) before serving from cache
+# "bypass"     always re-crawl, the fresh page still refreshes the cache
+Freshness = Literal["default", "revalidate", "bypass"]
+
+DEFAULT_TTL = 60 * 60
+
+# Product listings move prices often, classifieds less so
+SITE_TTLS: Dict[str, int] = {
+    "jumia.com.ng": 15 * 60,
+    "konga.com": 15 * 60,
+    "jiji.ng": 30 * 60,
+    "slot.ng": 30 * 60,
+    "kara.com.ng": 30 * 60,
+}
+
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "ref", "ref_", "_ga"}
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalise a URL so the same page always maps to the same cache key."""
+    parsed = urlparse(url.strip())
+    scheme = (parsed.scheme or "https").lower()
+    netloc = parsed.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+
+    path = "/" + "/".join(part for part in parsed.path.split("/") if part)
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunparse((scheme, netloc, path, "", query, ""))
+
+
+def get_site_ttl(url: str) -> int:
+    host = urlparse(url).netloc.lower()
+    for domain, ttl in SITE_TTLS.items():
+        if host == domain or host.endswith("." + domain):
+            return ttl
+    return DEFAULT_TTL
+
+
+@dataclass
+class CrawlCacheStats:
+    hits: int = 0
+    revalidated: int = 0
+    misses: int = 0
+    stores: int = 0
+
+    def to_dict(self) -> dict:
+        total = self.hits + self.revalidated + self.misses
+        return {
+            **asdict(self),
+            "hit_rate": (self.hits + self.revalidated) / total if total else 0.0,
+        }
+
+
+class CrawlCache:
+    """
+    Rendered page cache shared by every crawl entry point.
+
+    Entries hold the zlib compressed HTML of a page together with its ETag and
+    Last-Modified validators, keyed by canonical URL. A hit is replayed through
+    crawl4ai as raw HTML, so extraction strategies and markdown generators still
+    run but the browser render and network fetch are skipped.
+    """
+
+    def __init__(self, cache_dir: str = str(CRAWL_CACHE_DIR), max_entry_age: int = 24 * 60 * 60):
+        self.cache = Cache(directory=cache_dir)
+        self.max_entry_age = max_entry_age
+        self.stats = CrawlCacheStats()
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=10,
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.cache.close()
+
+    def get_entry(self, url: str) -> Optional[dict]:
+        try:
+            return self.cache.get(canonicalize_url(url))
+        except Exception as e:
+            logger.error(f"Failed to read crawl cache: {str(e)}")
+            return None
+
+    def store(self, url: str, html: str, headers: Optional[dict] = None):
+        if not html:
+            return
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        entry = {
+            "url": url,
+            "html": zlib.compress(html.encode("utf-8"), 6),
+            "etag": headers.get("etag"),
+            "last_modified": headers.get("last-modified"),
+            "fetched_at": time.time(),
+        }
+        try:
+            self.cache.set(canonicalize_url(url), entry, expire=self.max_entry_age)
+            self.stats.stores += 1
+        except Exception as e:
+            logger.error(f"Failed to write crawl cache: {str(e)}")
+
+    def invalidate(self, url: str):
+        self.cache.delete(canonicalize_url(url))
+
+    def _touch(self, url: str, entry: dict):
+        entry["fetched_at"] = time.time()
+        self.cache.set(canonicalize_url(url), entry, expire=self.max_entry_age)
+
+    async def revalidate(self, url: str, entry: dict) -> bool:
+        """
+        Conditional HEAD against the origin, True when the cached page is still current.
+
+        HEAD rather than GET: a changed page is crawled next anyway, so its body
+        must not be downloaded here too. Origins that ignore the conditional
+        headers on HEAD still answer with their validators, which are compared.
+        """
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        if not headers:
+            return False
+
+        try:
+            response = await self._get_client().head(url, headers=headers)
+        except Exception as e:
+            logger.warning(f"Revalidation failed for {url}: {str(e)}")
+            return False
+
+        current = response.status_code == 304
+        if response.status_code == 200:
+            if entry.get("etag"):
+                current = response.headers.get("etag") == entry["etag"]
+            else:
+                current = response.headers.get("last-modified") == entry["last_modified"]
+        if current:
+            self._touch(url, entry)
+        return current
+
+    async def _replay(self, crawler: AsyncWebCrawler, url: str, entry: dict, config: CrawlerRunConfig):
+        html = zlib.decompress(entry["html"]).decode("utf-8")
+        result = await crawler.arun(url="raw:" + html, config=config)
+        result.url = url
+        return result
+
+    async def arun(
+        self,
+        url: str,
+        config: CrawlerRunConfig,
+        freshness: Freshness = "default",
+        max_age: Optional[int] = None,
+        crawler: Optional[AsyncWebCrawler] = None,
+    ):
+        """
+        Crawl a URL through the cache.
+
+        Args:
+            url: Page to crawl
+            config: crawl4ai run config, applied to both cached and fresh pages
+            freshness: "default", "revalidate" or "bypass", see Freshness
+            max_age: Overrides the per-site TTL in seconds, 0 forces revalidation
+            crawler: Crawler to use, defaults to the shared CrawlerManager instance
+        """
+        if crawler is None:
+            from utils._craw4ai import CrawlerManager
+            crawler = await CrawlerManager.get_crawler()
+
+        entry = None if freshness == "bypass" else self.get_entry(url)
+        if entry is not None:
+            ttl = get_site_ttl(url) if max_age is None else max_age
+            age = time.time() - entry["fetched_at"]
+
+            if freshness == "default" and age < ttl:
+                self.stats.hits += 1
+                return await self._replay(crawler, url, entry, config)
+
+            if await self.revalidate(url, entry):
+                self.stats.revalidated += 1
+                return await self._replay(crawler, url, entry, config)
+
+        self.stats.misses += 1
+        result = await crawler.arun(url=url, config=config)
+        if result.success:
+            self.store(url, result.html, getattr(result, "response_headers", None))
+        return result
+
+
+crawl_cache = CrawlCache()
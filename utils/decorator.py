@@ -240,14 +240,15 @@ class AsyncCache:
 
 
 def credit_required(amount: int):
-    from api.auth.credit_manager import check_credits, track_credits
+    from api.auth.credit_manager import reserve_credits, commit_credits, refund_credits
     # from api.auth.model import UserCredits
 
     from .exceptions import PaymentRequiredError
 
     """
-    Decorator that checks and deducts credits before processing the request.
-    Only deducts credits after successful operation.
+    Decorator that reserves credits before processing the request.
+    The reservation is spent after a successful operation and refunded if it fails,
+    so concurrent requests from one user can't overdraw.
     """
     def decorator(func: Callable[..., Coroutine[Any, Any, Any]]):
         @wraps(func)
@@ -264,23 +265,23 @@ def credit_required(amount: int):
                     detail="Authentication required."
                 )
     
-            # Check available credits upfront
-            has_credit, credits = await check_credits(current_user.id, "amount", amount)
-            if has_credit is False:
+            # Hold the credits upfront
+            reservation, credits = await reserve_credits(current_user.id, "amount", amount)
+            if reservation is None:
                 raise PaymentRequiredError(f"Insufficient credits. Required: {amount}, Available: {credits}")
 
             try:
                 # Execute the endpoint logic
                 result = await func(request, *args, **kwargs)
-
-                # Deduct credits only after successful execution
-                await track_credits(current_user.id, type="amount", amount=amount)
-                
-                return result
-                
-            except Exception as e:
-                logger.error(f"Error in endpoint {func.__name__} for user {current_user.id}: {e}")
+            except BaseException as e:
+                await refund_credits(reservation)
+                if isinstance(e, Exception):
+                    logger.error(f"Error in endpoint {func.__name__} for user {current_user.id}: {e}")
                 raise  # Re-raise the exception after logging
+
+            # Spend the credits only after successful execution
+            await commit_credits(reservation)
+            return result
                 
         return wrapper
     return decorator
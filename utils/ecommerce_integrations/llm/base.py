@@ -19,7 +19,7 @@ class LLMIntegration(EcommerceIntegration):
 
     async def get_product_list(self, url: str, bypass_cache, query) -> List[Dict[str, Any]]:
         product_id = self.generate_url_id(url)
-        products = await extractor.extract_products([url])
+        products = await extractor.extract_products([url], freshness="bypass" if bypass_cache else "default")
         products = products[url]
 
         # print(products)
@@ -40,13 +40,16 @@ class LLMIntegration(EcommerceIntegration):
         return products
 
     async def get_product_detail(self, url: str, product_id: str, bypass_cache) -> Dict[str, Any]:
-        # product = await self.db_manager.get(product_id, tag='list')
+        list_product = None
+        if self.db_manager is not None:
+            list_product = await self.db_manager.get(product_id, tag='list')
 
-        products = await extractor.extract_products([url])
+        products = await extractor.extract_products([url], freshness="bypass" if bypass_cache else "default")
         products = products[url]
 
-        if "error" in products:
-            return {}
+        if "error" in products or not products:
+            # The listing already carries the core fields, better than nothing
+            return list_product or {}
         
         for product in products:
             product["product_id"] = product_id
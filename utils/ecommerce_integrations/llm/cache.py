@@ -0,0 +1,71 @@
+import re
+import json
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Optional
+
+from diskcache import Cache
+
+from config import EXTRACTION_CACHE_DIR
+from utils.logging import logger
+
+
+@dataclass
+class ExtractionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    tokens_avoided: int = 0
+
+    def to_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {**asdict(self), "hit_rate": self.hits / total if total else 0.0}
+
+
+class ExtractionCache:
+    """
+    Maps the hash of a page's pruned markdown to the products the LLM extracted
+    from it. A page whose content did not change is never sent to the LLM twice,
+    whatever URL, query string or integration it was reached through.
+    """
+
+    def __init__(self, cache_dir: str = str(EXTRACTION_CACHE_DIR), ttl: int = 7 * 24 * 60 * 60):
+        self.cache = Cache(directory=cache_dir)
+        self.ttl = ttl
+        self.stats = ExtractionCacheStats()
+
+    @staticmethod
+    def normalize(markdown: str) -> str:
+        return re.sub(r"\s+", " ", markdown).strip()
+
+    def make_key(self, markdown: str, provider: str, schema: dict) -> str:
+        digest = hashlib.sha256()
+        digest.update(provider.encode("utf-8"))
+        digest.update(json.dumps(schema, sort_keys=True).encode("utf-8"))
+        digest.update(self.normalize(markdown).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            entry = self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Failed to read extraction cache: {str(e)}")
+            entry = None
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+        self.stats.tokens_avoided += entry["tokens"]
+        return entry["products"]
+
+    def set(self, key: str, products: Any, tokens: int = 0):
+        try:
+            self.cache.set(key, {"products": products, "tokens": tokens}, expire=self.ttl)
+            self.stats.stores += 1
+        except Exception as e:
+            logger.error(f"Failed to write extraction cache: {str(e)}")
+
+
+extraction_cache = ExtractionCache()
@@ -6,9 +6,12 @@ from typing import List, List
 from crawl4ai import CrawlerRunConfig, CacheMode, AsyncWebCrawler
 from crawl4ai.extraction_strategy import LLMExtractionStrategy
 from utils._craw4ai import CrawlerManager
+from utils.crawl_cache import crawl_cache, Freshness
 from .prompt import product_extractor_prompt
+from .cache import extraction_cache
 
 from schema.dataclass.dependencies import get_next_serp_api_key
+from utils.logging import logger
 
 
 class Specification(BaseModel):
@@ -50,6 +53,15 @@ class ProductExtractor:
         self.schema: BaseModel = schema
         self.llm_provider = llm_provider
         self.crawl_config = self._create_crawl_config()
+        self.page_config = self._create_page_config()
+
+    def _create_page_config(self):
+        # Same pruning as the extraction run, minus the LLM, used to fingerprint the page
+        return CrawlerRunConfig(
+            excluded_tags=["nav", "footer", "header", "script", "style"],
+            magic=True,
+            cache_mode=CacheMode.BYPASS
+        )
 
     def _create_crawl_config(self):
         return CrawlerRunConfig(
@@ -71,19 +83,41 @@ class ProductExtractor:
             cache_mode=CacheMode.BYPASS
         )
 
-    async def extract_products(self, urls: List[str]):
+    async def extract_products(self, urls: List[str], freshness: Freshness = "default"):
         results = {}
         crawler = await CrawlerManager.get_crawler() 
-        tasks = [self._process_url(crawler, url) for url in urls]
+        tasks = [self._process_url(crawler, url, freshness) for url in urls]
         results = await asyncio.gather(*tasks)
         return {url: result for url, result in zip(urls, results)}
 
-    async def _process_url(self, crawler: AsyncWebCrawler, url):
+    async def _process_url(self, crawler: AsyncWebCrawler, url, freshness: Freshness = "default"):
         try:
-            result = await crawler.arun(url=url, config=self.crawl_config)
-            if result.success:
-                return json.loads(result.extracted_content)
-            return {"error": result.error_message}
+            page = await crawl_cache.arun(url, self.page_config, freshness=freshness, crawler=crawler)
+            if not page.success:
+                return {"error": page.error_message}
+
+            key = extraction_cache.make_key(
+                page.markdown or "", self.llm_provider, self.schema.model_json_schema()
+            )
+            products = extraction_cache.get(key)
+            if products is not None:
+                return products
+
+            # The page was just stored, so this replays it from the crawl cache
+            result = await crawl_cache.arun(url, self.crawl_config, crawler=crawler)
+            if not result.success:
+                return {"error": result.error_message}
+
+            products = json.loads(result.extracted_content)
+            failed = isinstance(products, list) and any(
+                isinstance(block, dict) and block.get("error") for block in products
+            )
+            if not failed:
+                # Roughly 4 characters per token for the prompt and the completion
+                tokens = (len(page.markdown or "") + len(result.extracted_content)) // 4
+                extraction_cache.set(key, products, tokens=tokens)
+            logger.info(f"Extraction cache stats: {extraction_cache.stats.to_dict()}")
+            return products
         except Exception as e:
             return {"error": str(e)}
 
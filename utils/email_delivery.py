@@ -0,0 +1,391 @@
+import os
+import re
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, asdict
+from email.message import Message
+from email.utils import getaddresses
+from functools import lru_cache
+from typing import Any, Coroutine, Deque, Dict, Iterable, List, Optional, Tuple
+
+import aiosmtplib
+import diskcache
+
+from config import (
+    EMAIL_DEAD_LETTER_DIR,
+    EMAIL_DEFAULT_RPM,
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_POOL_SIZE,
+    EMAIL_RATE_LIMITS,
+)
+from utils.logging import logger
+
+
+# Providers cap messages per connection (Gmail at about 100), so a connection is replaced before that
+MESSAGES_PER_CONNECTION = 90
+# Idle connections older than this may have been dropped by the server and are reopened
+IDLE_TIMEOUT = 60.0
+SMTP_TIMEOUT = 30.0
+# Backoff between attempts of one message doubles from this, in seconds
+RETRY_BASE = 1.0
+# Failed messages kept for replay, the oldest are dropped past this
+DEAD_LETTER_MAX = 10000
+
+_PLACEHOLDER = re.compile(r"{{(\w+)}}")
+
+
+@lru_cache(maxsize=64)
+def compile_template(template: str) -> Tuple[str, ...]:
+    """The template split into literal text (even positions) and placeholder names (odd positions)."""
+    return tuple(_PLACEHOLDER.split(template))
+
+
+def render_template(template: str, variables: Dict[str, str]) -> str:
+    """Fill {{name}} placeholders, keeping the ones without a value as they are."""
+    parts = list(compile_template(template))
+    for i in range(1, len(parts), 2):
+        key = parts[i]
+        parts[i] = variables[key] if key in variables else f"{{{{{key}}}}}"
+    return "".join(parts)
+
+
+def is_transient(error: BaseException) -> bool:
+    """True for failures worth retrying: dropped connections, timeouts and 4xx replies."""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return all(400 <= refused.code < 500 for refused in error.recipients)
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    return isinstance(error, (
+        aiosmtplib.SMTPServerDisconnected,
+        aiosmtplib.SMTPConnectError,
+        aiosmtplib.SMTPTimeoutError,
+        ConnectionError,
+        asyncio.TimeoutError,
+    ))
+
+
+@dataclass
+class Envelope:
+    """A message ready for SMTP, which is also what the dead letter queue keeps."""
+    account_key: str
+    sender: str
+    recipients: List[str]
+    data: bytes
+    attempts: int = 0
+    error: Optional[str] = None
+    failed_at: Optional[float] = None
+
+    @classmethod
+    def from_message(cls, account_key: str, sender: str, message: Message) -> "Envelope":
+        recipients = [
+            address for _, address in getaddresses(
+                message.get_all("To", []) + message.get_all("Cc", []) + message.get_all("Bcc", [])
+            ) if address
+        ]
+        # Bcc recipients only go in the envelope
+        del message["Bcc"]
+        return cls(account_key=account_key, sender=sender, recipients=recipients, data=message.as_bytes())
+
+
+@dataclass
+class DeliveryStats:
+    sent: int = 0
+    retried: int = 0
+    dead_lettered: int = 0
+    replayed: int = 0
+    connections_opened: int = 0
+    in_flight: int = 0
+    rate_limited_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        stats = asdict(self)
+        stats["rate_limited_seconds"] = round(self.rate_limited_seconds, 1)
+        return stats
+
+
+class ProviderLimiter:
+    """Token bucket for one SMTP host, shared by every account that sends through it."""
+
+    def __init__(self, rpm: int):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        # Waiters go one at a time, in order
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        """Take one message's token, returning how long it waited for it."""
+        async with self._lock:
+            self._refill()
+            wait = 0.0
+            if self.tokens < 1:
+                wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+                self._refill()
+            self.tokens -= 1
+            return wait
+
+
+@dataclass
+class PooledConnection:
+    smtp: aiosmtplib.SMTP
+    used_at: float = field(default_factory=time.monotonic)
+    sent: int = 0
+
+
+class SMTPPool:
+    """Logged in connections to one account's SMTP server, reused across messages."""
+
+    def __init__(self, account, size: int, stats: DeliveryStats):
+        self.account = account
+        self.stats = stats
+        self._idle: Deque[PooledConnection] = deque()
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self) -> PooledConnection:
+        account = self.account
+        # Port 465 is TLS from the start, anything else upgrades with STARTTLS
+        implicit_tls = account.smtp_port == 465
+        smtp = aiosmtplib.SMTP(
+            hostname=account.smtp_server,
+            port=account.smtp_port,
+            use_tls=implicit_tls,
+            start_tls=account.starttls and not implicit_tls,
+            timeout=SMTP_TIMEOUT,
+        )
+        await smtp.connect()
+        if account.smtp_password:
+            try:
+                await smtp.login(account.login_email, account.smtp_password)
+            except BaseException:
+                smtp.close()
+                raise
+        self.stats.connections_opened += 1
+        return PooledConnection(smtp)
+
+    def _take(self) -> Optional[PooledConnection]:
+        now = time.monotonic()
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.smtp.is_connected and now - connection.used_at < IDLE_TIMEOUT:
+                return connection
+            connection.smtp.close()
+        return None
+
+    @staticmethod
+    async def _quit(connection: PooledConnection):
+        try:
+            await connection.smtp.quit()
+        except Exception:
+            connection.smtp.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        async with self._slots:
+            connection = self._take() or await self._connect()
+            try:
+                yield connection.smtp
+            except BaseException:
+                # The session may be mid-transaction, don't hand it to the next message
+                connection.smtp.close()
+                raise
+            connection.sent += 1
+            connection.used_at = time.monotonic()
+            if connection.sent >= MESSAGES_PER_CONNECTION:
+                await self._quit(connection)
+            else:
+                self._idle.append(connection)
+
+    async def close(self):
+        while self._idle:
+            await self._quit(self._idle.pop())
+
+
+class EmailDelivery:
+    """
+    Sends mail over pooled SMTP connections.
+
+    Connections stay open between messages, up to pool_size per account, so a
+    message costs one SMTP transaction instead of a connect, TLS handshake and
+    login. Messages through the same SMTP host share a token bucket sized to
+    the provider's rate (EMAIL_RATE_LIMITS), which paces a bulk send instead
+    of fixed sleeps between chunks.
+
+    A message failing with a transient error (dropped connection, timeout, 4xx
+    reply) is retried with backoff up to max_attempts; one failing for good, or
+    out of attempts, goes to the dead letter queue on disk, from where
+    replay_dead_letters() sends it again.
+
+    Everything runs on one event loop in a daemon thread, started on first use
+    in each process, so the pool outlives the request or Celery task that
+    opened it. Sync callers block on send(); async callers await asend().
+    """
+
+    def __init__(
+        self,
+        accounts: Dict[str, Any],
+        pool_size: int = EMAIL_POOL_SIZE,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS,
+        rate_limits: Dict[str, int] = EMAIL_RATE_LIMITS,
+        default_rpm: int = EMAIL_DEFAULT_RPM,
+        dead_letter_dir: str = str(EMAIL_DEAD_LETTER_DIR),
+    ):
+        self.accounts = accounts
+        self.pool_size = pool_size
+        self.max_attempts = max_attempts
+        self.rate_limits = rate_limits
+        self.default_rpm = default_rpm
+        self.dead_letters = diskcache.Deque(directory=dead_letter_dir, maxlen=DEAD_LETTER_MAX)
+        self.stats = DeliveryStats()
+        self._pools: Dict[str, SMTPPool] = {}
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._thread_lock:
+            # A forked Celery worker inherits the object but not the thread
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="email-delivery", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+                self._pools.clear()
+                self._limiters.clear()
+            return self._loop
+
+    def submit(self, coro: Coroutine):
+        """Run a coroutine on the delivery loop, returning a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def envelope(self, account_key: str, message: Message) -> Envelope:
+        return Envelope.from_message(account_key, self.accounts[account_key].from_email, message)
+
+    def _pool(self, account_key: str) -> SMTPPool:
+        pool = self._pools.get(account_key)
+        if pool is None:
+            pool = self._pools[account_key] = SMTPPool(self.accounts[account_key], self.pool_size, self.stats)
+        return pool
+
+    def rate_for(self, account_key: str) -> int:
+        """Messages per minute the account's SMTP provider accepts."""
+        return self.rate_limits.get(self.accounts[account_key].smtp_server, self.default_rpm)
+
+    def _limiter(self, host: str) -> ProviderLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = ProviderLimiter(self.rate_limits.get(host, self.default_rpm))
+        return limiter
+
+    def _dead_letter(self, envelope: Envelope, error: BaseException):
+        envelope.error = f"{type(error).__name__}: {error}"
+        envelope.failed_at = time.time()
+        self.dead_letters.append(envelope)
+        self.stats.dead_lettered += 1
+        logger.error(
+            f"Email to {', '.join(envelope.recipients)} dead lettered after {envelope.attempts} attempts: {envelope.error}"
+        )
+
+    async def deliver(self, envelope: Envelope) -> bool:
+        """Send one envelope, retrying transient failures; False once it is dead lettered."""
+        account = self.accounts[envelope.account_key]
+        pool = self._pool(envelope.account_key)
+        limiter = self._limiter(account.smtp_server)
+        while True:
+            envelope.attempts += 1
+            self.stats.rate_limited_seconds += await limiter.acquire()
+            self.stats.in_flight += 1
+            try:
+                async with pool.connection() as smtp:
+                    refused, _ = await smtp.sendmail(envelope.sender, envelope.recipients, envelope.data)
+                if refused:
+                    logger.warning(f"Email recipients refused: {', '.join(refused)}")
+                self.stats.sent += 1
+                return True
+            except Exception as e:
+                if not is_transient(e) or envelope.attempts >= self.max_attempts:
+                    self._dead_letter(envelope, e)
+                    return False
+                self.stats.retried += 1
+                logger.warning(f"Retrying email to {', '.join(envelope.recipients)}: {str(e)}")
+            finally:
+                self.stats.in_flight -= 1
+            await asyncio.sleep(RETRY_BASE * 2 ** (envelope.attempts - 1))
+
+    async def deliver_many(self, envelopes: Iterable[Envelope]) -> Dict[str, int]:
+        """
+        Send envelopes with as many in flight as the pool has connections.
+
+        The iterable is consumed lazily, so a bulk send never holds more than
+        pool_size rendered messages at once.
+        """
+        envelopes = iter(envelopes)
+        counts = {"sent": 0, "failed": 0}
+
+        async def worker():
+            # Single threaded loop, so workers can share the iterator
+            for envelope in envelopes:
+                counts["sent" if await self.deliver(envelope) else "failed"] += 1
+
+        await asyncio.gather(*(worker() for _ in range(self.pool_size)))
+        return counts
+
+    def send(self, account_key: str, message: Message, timeout: Optional[float] = None) -> bool:
+        """Blocking send for sync callers such as Celery tasks."""
+        return self.submit(self.deliver(self.envelope(account_key, message))).result(timeout)
+
+    async def asend(self, account_key: str, message: Message) -> bool:
+        return await asyncio.wrap_future(self.submit(self.deliver(self.envelope(account_key, message))))
+
+    def send_many(self, account_key: str, messages: Iterable[Message]) -> Dict[str, int]:
+        """Blocking bulk send of messages built lazily from the iterable."""
+        envelopes = (self.envelope(account_key, message) for message in messages)
+        return self.submit(self.deliver_many(envelopes)).result()
+
+    def replay_dead_letters(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """Send dead lettered messages again; the ones failing again go back in the queue."""
+        def drain():
+            for _ in range(min(len(self.dead_letters), limit or len(self.dead_letters))):
+                try:
+                    envelope = self.dead_letters.popleft()
+                except IndexError:
+                    return
+                envelope.attempts = 0
+                self.stats.replayed += 1
+                yield envelope
+
+        return self.submit(self.deliver_many(drain())).result()
+
+    def close(self, timeout: float = 10.0):
+        """Quit pooled connections and stop the delivery thread."""
+        with self._thread_lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+
+        async def _close():
+            for pool in self._pools.values():
+                await pool.close()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"Closing SMTP connections failed: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+        self._pools.clear()
+        self._limiters.clear()
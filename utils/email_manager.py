@@ -1,5 +1,4 @@
 import os
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formatdate, make_msgid
@@ -7,6 +6,9 @@ from email.mime.application import MIMEApplication
 
 from dotenv import load_dotenv
 
+from .email_delivery import EmailDelivery, render_template
+from .exceptions import EmailDeliveryError
+
 # from .celery_tasks import send_email
 
 load_dotenv()
@@ -16,13 +18,15 @@ class EmailAccount:
     """
     Represents an email account with its configuration.
     """
-    def __init__(self, name, from_email, smtp_password, login_email, smtp_server="smtp.gmail.com", smtp_port=465):
+    def __init__(self, name, from_email, smtp_password, login_email, smtp_server="smtp.gmail.com", smtp_port=465, starttls=True):
         self.name = name  # e.g., "Azeez"
         self.from_email = from_email  # e.g., "azeezogundeko@volera.app"
         self.smtp_password = smtp_password
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
         self.login_email = login_email
+        # Off only for local servers without TLS, such as the test SMTP sink
+        self.starttls = starttls
 
     def display_name(self):
         """
@@ -84,6 +88,9 @@ class EmailAccountManager:
             )
         }
         self.current_account = None
+        self.current_account_key = None
+        # Pooled SMTP connections, rate limits and dead letters for every account
+        self.delivery = EmailDelivery(self.accounts)
 
     def choose_account(self, account_key):
         """
@@ -91,32 +98,30 @@ class EmailAccountManager:
         """
         if account_key in self.accounts:
             self.current_account = self.accounts[account_key]
+            self.current_account_key = account_key
             print(f"Using account: {self.current_account.display_name()} <{self.current_account.from_email}>")
         else:
             raise ValueError(f"Account '{account_key}' not found.")
         return self.current_account
 
-    def send_email(self, to_email, subject, html_content, attachments=None, recipients=None):
+    def build_message(self, account_key, to_email, subject, html_content, attachments=None, recipients=None):
         """
-        Sends an email using the selected account.
+        Builds the MIME message for an email sent from the given account.
         """
-        if not self.current_account:
-            raise ValueError("No email account selected. Please choose an account using choose_account().")
-        
-        # Create the email message
+        account = self.accounts[account_key]
         message = MIMEMultipart("alternative")
         message["To"] = to_email
         message["Subject"] = subject
-        message["From"] = f"{self.current_account.display_name()} <{self.current_account.from_email}>"
+        message["From"] = f"{account.display_name()} <{account.from_email}>"
         if recipients:
             message["Bcc"] = ", ".join(recipients)
         message["Date"] = formatdate(localtime=True)
-        message["Message-ID"] = make_msgid(domain=self.current_account.from_email.split("@")[1])
+        message["Message-ID"] = make_msgid(domain=account.from_email.split("@")[1])
         message["MIME-Version"] = "1.0"
         message["X-Priority"] = "3"  # Normal priority
         message["X-Mailer"] = "Python Email Client"
-        message["Reply-To"] = self.current_account.from_email
-        message["Return-Path"] = self.current_account.from_email
+        message["Reply-To"] = account.from_email
+        message["Return-Path"] = account.from_email
 
         # Attach the HTML content
         message.attach(MIMEText(html_content, "html"))
@@ -133,26 +138,42 @@ class EmailAccountManager:
                 attachment_mime = MIMEApplication(attachment_data)
                 attachment_mime.add_header("Content-Disposition", f"attachment; filename={filename}")
                 message.attach(attachment_mime)
+        return message
 
-        # Connect to the SMTP server and send the message
-        try:
-            # Use SMTP_SSL for SSL connections (e.g., port 465) and SMTP with STARTTLS for others (e.g., port 587)
-            if self.current_account.smtp_port == 465:
-                smtp = smtplib.SMTP_SSL(self.current_account.smtp_server, self.current_account.smtp_port)
-            else:
-                smtp = smtplib.SMTP(self.current_account.smtp_server, self.current_account.smtp_port)
-                smtp.ehlo()
-                smtp.starttls()
-                smtp.ehlo()
-                
-            with smtp:
-                # print(self.current_account.login_email, self.current_account.smtp_password)
-                smtp.login(self.current_account.login_email, self.current_account.smtp_password)
-                smtp.send_message(message)
-                print(f"Email sent to {to_email} from {self.current_account.from_email}")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
-            raise
+    def send_email(self, to_email, subject, html_content, attachments=None, recipients=None):
+        """
+        Sends an email using the selected account, over a pooled SMTP connection.
+        """
+        if not self.current_account:
+            raise ValueError("No email account selected. Please choose an account using choose_account().")
+
+        account_key = self.current_account_key
+        message = self.build_message(account_key, to_email, subject, html_content, attachments, recipients)
+        if not self.delivery.send(account_key, message):
+            raise EmailDeliveryError(f"Failed to send email to {to_email}, kept in the dead letter queue")
+        print(f"Email sent to {to_email} from {self.current_account.from_email}")
+
+    async def send_email_async(self, account_key, to_email, subject, html_content, recipients=None):
+        """
+        Sends an email from an event loop without blocking it or touching the selected account.
+        """
+        message = self.build_message(account_key, to_email, subject, html_content, recipients=recipients)
+        if not await self.delivery.asend(account_key, message):
+            raise EmailDeliveryError(f"Failed to send email to {to_email}, kept in the dead letter queue")
+
+    def send_bulk(self, account_key, subject, html_template, recipients):
+        """
+        Sends one templated email per (email, variables) pair in recipients.
+
+        The template is parsed once and each message is rendered only when a
+        pooled connection is ready for it. Returns sent and failed counts;
+        failed messages are in the dead letter queue.
+        """
+        messages = (
+            self.build_message(account_key, to_email, subject, render_template(html_template, variables))
+            for to_email, variables in recipients
+        )
+        return self.delivery.send_many(account_key, messages)
 
 
 manager = EmailAccountManager()
@@ -20,4 +20,9 @@ class NoItemFound(Exception):
 
 class PaymentRequiredError(Exception):
     def __init__(self, message):
-        super().__init__(message)
\ No newline at end of file
+        super().__init__(message)
+
+
+class EmailDeliveryError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -1,122 +1,334 @@
 import httpx
 import json
+import time
+from dataclasses import dataclass, field, asdict
 from typing import Optional, Dict, List, Any
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 import asyncio
-from config import FLARE_BYPASSER_URL, PRODUCTION_MODE
+
+from diskcache import Cache
+
+from config import FLARE_BYPASSER_URL, FLARE_CLEARANCE_DIR, FLARE_CLEARANCE_TTL, FLARE_MAX_SOLVES
+from utils.logging import logger
+
+
+# A clearance this close to expiry is still used, but re-solved in the background
+REFRESH_MARGIN = 120
+CHALLENGE_STATUSES = (403, 503)
+# Longest a single browser solve may take, in seconds
+SOLVE_TIMEOUT = 180.0
+
+
+@dataclass
+class Clearance:
+    """Cookies and user agent that got past a domain's Cloudflare challenge."""
+    cookies: List[Dict[str, Any]]
+    user_agent: str
+    expires_at: float
+    solved_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_solution(cls, solution: Dict[str, Any], ttl: int = FLARE_CLEARANCE_TTL) -> "Clearance":
+        now = time.time()
+        expires_at = now + ttl
+        # cf_clearance carries its own expiry; session cookies report -1
+        for cookie in solution.get("cookies", []):
+            if cookie.get("name") == "cf_clearance" and (cookie.get("expires") or -1) > 0:
+                expires_at = min(expires_at, cookie["expires"])
+        return cls(
+            cookies=solution.get("cookies", []),
+            user_agent=solution.get("userAgent"),
+            expires_at=expires_at,
+            solved_at=now,
+        )
+
+    def valid(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) < self.expires_at
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        return (now or time.time()) >= self.expires_at - REFRESH_MARGIN
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        # Sent as a header rather than through the shared client's cookie jar
+        return {
+            "User-Agent": self.user_agent,
+            "Cookie": "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in self.cookies),
+        }
+
+
+class ClearanceStore:
+    """Clearances by domain on disk, so every client and worker reuses one solve."""
+
+    def __init__(self, cache_dir: str = str(FLARE_CLEARANCE_DIR)):
+        self.cache = Cache(directory=cache_dir)
+
+    def get(self, domain: str) -> Optional[Clearance]:
+        clearance = self.cache.get(domain)
+        if clearance is not None and clearance.valid():
+            return clearance
+        return None
+
+    def set(self, domain: str, clearance: Clearance):
+        self.cache.set(domain, clearance, expire=max(1.0, clearance.expires_at - time.time()))
+
+    def invalidate(self, domain: str):
+        self.cache.delete(domain)
+
+
+clearance_store = ClearanceStore()
+
+
+def domain_of(url: str) -> str:
+    return urlparse(url).hostname or url
+
+
+def is_challenge(response: httpx.Response) -> bool:
+    """True when Cloudflare answered with a challenge instead of the page."""
+    if response.status_code not in CHALLENGE_STATUSES:
+        return False
+    return (
+        response.headers.get("cf-mitigated") == "challenge"
+        or "cloudflare" in response.headers.get("server", "").lower()
+    )
+
+
+@dataclass
+class GatewayStats:
+    solves: int = 0
+    coalesced: int = 0
+    reused: int = 0
+    failures: int = 0
+    in_flight: int = 0
+    waiting: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class BypasserGateway:
+    """
+    The app's single connection to the bypasser container.
+
+    Owns one pooled HTTP client, opened and closed by the app lifespan, used for
+    bypasser commands and for requests made with a clearance. Every command is a
+    headless browser solve, so at most max_solves run at once and the rest wait.
+    Concurrent solves for the same domain share one command, and a solve that
+    finds a clearance another worker stored meanwhile returns that instead.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = FLARE_BYPASSER_URL,
+        max_solves: int = FLARE_MAX_SOLVES,
+        store: ClearanceStore = clearance_store,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.store = store
+        self.stats = GatewayStats()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(max_solves)
+        self._solving: Dict[str, asyncio.Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=SOLVE_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                transport=self._transport,
+            )
+        return self._client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Opened on first use for scripts and tests that run without the lifespan
+        return self._open()
+
+    async def start(self):
+        if self.enabled:
+            self._open()
+
+    async def close(self):
+        for task in list(self._solving.values()):
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def command(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Send one command to the bypasser, waiting for a free solve slot."""
+        self.stats.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats.waiting -= 1
+        self.stats.in_flight += 1
+        try:
+            response = await self.client.post(urljoin(self.base_url, "/v1"), json=payload)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            self.stats.in_flight -= 1
+            self._semaphore.release()
+
+    async def _solve(self, url: str, previous: Optional[Clearance]) -> Clearance:
+        domain = domain_of(url)
+        cached = self.store.get(domain)
+        if cached is not None and not cached.needs_refresh():
+            self.stats.reused += 1
+            return cached
+
+        payload = {"cmd": "request.get", "url": url, "maxTimeout": int(SOLVE_TIMEOUT * 1000)}
+        if previous is not None:
+            payload["cookies"] = previous.cookies
+        self.stats.solves += 1
+        result = await self.command(payload)
+        if result.get("status") != "ok":
+            self.stats.failures += 1
+            raise Exception("Failed to get Cloudflare solution")
+
+        clearance = Clearance.from_solution(result["solution"])
+        self.store.set(domain, clearance)
+        logger.info(f"Cloudflare clearance for {domain} valid for {clearance.expires_at - time.time():.0f}s")
+        return clearance
+
+    def _forget(self, domain: str, task: asyncio.Future):
+        if self._solving.get(domain) is task:
+            del self._solving[domain]
+        # Mark the error as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def solve(self, url: str, previous: Optional[Clearance] = None) -> Clearance:
+        """A clearance for url's domain, joining a solve already running for it."""
+        domain = domain_of(url)
+        task = self._solving.get(domain)
+        if task is None:
+            task = asyncio.ensure_future(self._solve(url, previous))
+            self._solving[domain] = task
+            task.add_done_callback(lambda t: self._forget(domain, t))
+        else:
+            self.stats.coalesced += 1
+        # One caller giving up must not cancel the solve for the others
+        return await asyncio.shield(task)
+
+    def refresh(self, url: str, previous: Clearance):
+        """Solve a fresh clearance in the background, unless one is already being solved."""
+        if domain_of(url) in self._solving:
+            return
+
+        async def _refresh():
+            try:
+                await self.solve(url, previous)
+            except Exception as e:
+                logger.warning(f"Background Cloudflare refresh for {domain_of(url)} failed: {str(e)}")
+
+        asyncio.create_task(_refresh())
+
+
+flare_gateway = BypasserGateway()
+
 
 class FlareBypasserClient:
-    """Async client for handling Cloudflare protection."""
-    def __init__(self, base_url: str = FLARE_BYPASSER_URL, proxy: Optional[str] = None):
-        if not PRODUCTION_MODE:
+    """
+    Async client for handling Cloudflare protection.
+
+    A challenge is solved once per domain and the resulting clearance is kept in
+    the shared clearance store until it expires; requests in between go straight
+    to the site with its cookies and user agent. A clearance nearing expiry is
+    re-solved in the background, and one the site rejects with a challenge is
+    dropped and solved again before the request is retried once.
+
+    Solves and requests go through the gateway's pooled client, except with a
+    proxy, which gets a client of its own for the site requests.
+    """
+    def __init__(self, proxy: Optional[str] = None, gateway: Optional[BypasserGateway] = None):
+        self.gateway = gateway or flare_gateway
+        if not self.gateway.enabled:
             self.client = None
             return
-            
-        self.base_url = base_url
+
         self.proxy = proxy
-        self.client = httpx.AsyncClient(
-            timeout=180.0,
+        self._own_client = httpx.AsyncClient(
+            timeout=SOLVE_TIMEOUT,
             follow_redirects=True,
-            proxies=proxy if proxy else None
-        )
-        self._cookies = []
-        self._user_agent = None
+            proxies=proxy
+        ) if proxy else None
+        self.client = self._own_client or self.gateway.client
         
     async def __aenter__(self):
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.client:
-            await self.client.aclose()
-    
-    async def _get_solution(self, url: str) -> Dict[str, Any]:
-        """Get Cloudflare solution for a URL."""
-        if not self.client:
-            return None
-            
-        endpoint = urljoin(self.base_url, "/v1")
-        payload = {
-            "cmd": "request.get",
-            "url": url,
-            "maxTimeout": 180000
-        }
-        
-        if self._cookies:
-            payload["cookies"] = self._cookies
-            
-        response = await self.client.post(endpoint, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        
-        if result["status"] == "ok":
-            self._cookies = result["solution"]["cookies"]
-            self._user_agent = result["solution"]["userAgent"]
-            return result["solution"]
-        return None
+        if self.client and self._own_client:
+            await self._own_client.aclose()
+
+    async def _clearance(self, url: str) -> Clearance:
+        clearance = self.gateway.store.get(domain_of(url))
+        if clearance is None:
+            return await self.gateway.solve(url)
+        if clearance.needs_refresh():
+            self.gateway.refresh(url, clearance)
+        return clearance
+
+    async def _request(self, method: str, url: str, headers: Optional[Dict] = None, **kwargs) -> httpx.Response:
+        clearance = await self._clearance(url)
+        response = await self.client.request(
+            method, url, headers={**(headers or {}), **clearance.headers}, **kwargs
+        )
+        if not is_challenge(response):
+            return response
+
+        # The site no longer accepts this clearance
+        logger.info(f"Cloudflare challenged {domain_of(url)} again, re-solving")
+        self.gateway.store.invalidate(domain_of(url))
+        clearance = await self.gateway.solve(url)
+        return await self.client.request(
+            method, url, headers={**(headers or {}), **clearance.headers}, **kwargs
+        )
     
     async def get(self, url: str, **kwargs) -> httpx.Response:
         """Make GET request with Cloudflare bypass."""
         if not self.client:
             return None
-            
-        solution = await self._get_solution(url)
-        if not solution:
-            raise Exception("Failed to get Cloudflare solution")
-            
-        headers = {
-            "User-Agent": self._user_agent
-        }
-        
-        cookies = {cookie["name"]: cookie["value"] for cookie in self._cookies}
-        return await self.client.get(url, cookies=cookies, headers=headers, **kwargs)
+        return await self._request("GET", url, **kwargs)
     
     async def post(self, url: str, data: Dict = None, **kwargs) -> httpx.Response:
         """Make POST request with Cloudflare bypass."""
         if not self.client:
             return None
-            
-        solution = await self._get_solution(url)
-        if not solution:
-            raise Exception("Failed to get Cloudflare solution")
-            
-        headers = {
-            "User-Agent": self._user_agent
-        }
-        
-        cookies = {cookie["name"]: cookie["value"] for cookie in self._cookies}
-        return await self.client.post(url, json=data, cookies=cookies, headers=headers, **kwargs)
+        return await self._request("POST", url, json=data, **kwargs)
 
 class FlareBypasser:
-    def __init__(self, base_url: str = FLARE_BYPASSER_URL):
-        if not PRODUCTION_MODE:
-            self.client = None
-            return
-            
-        self.base_url = base_url or "http://flare-bypasser:8080"
-        self.client = httpx.AsyncClient(timeout=180.0)
+    """Raw bypasser commands, sent through the gateway's pooled client and solve limit."""
+    def __init__(self, gateway: Optional[BypasserGateway] = None):
+        self.gateway = gateway or flare_gateway
+        self.client = self.gateway.client if self.gateway.enabled else None
         
     async def get_cookies(self, url: str, max_timeout: int = 180000) -> Dict:
         """Get cookies after solving Cloudflare challenge."""
         if not self.client:
             return None
             
-        endpoint = urljoin(self.base_url, "/v1")
         payload = {
             "cmd": "request.get_cookies",
             "url": url,
             "maxTimeout": max_timeout
         }
-        
-        response = await self.client.post(endpoint, json=payload)
-        response.raise_for_status()
-        return response.json()
+        return await self.gateway.command(payload)
     
     async def get_page(self, url: str, max_timeout: int = 180000, cookies: Optional[List[Dict]] = None) -> Dict:
         """Get page content after solving Cloudflare challenge."""
         if not self.client:
             return None
             
-        endpoint = urljoin(self.base_url, "/v1")
         payload = {
             "cmd": "request.get",
             "url": url,
@@ -124,17 +336,13 @@ class FlareBypasser:
         }
         if cookies:
             payload["cookies"] = cookies
-            
-        response = await self.client.post(endpoint, json=payload)
-        response.raise_for_status()
-        return response.json()
+        return await self.gateway.command(payload)
     
     async def make_post(self, url: str, post_data: Dict, max_timeout: int = 180000, cookies: Optional[List[Dict]] = None) -> Dict:
         """Make POST request after solving Cloudflare challenge."""
         if not self.client:
             return None
             
-        endpoint = urljoin(self.base_url, "/v1")
         payload = {
             "cmd": "request.post",
             "url": url,
@@ -143,15 +351,10 @@ class FlareBypasser:
         }
         if cookies:
             payload["cookies"] = cookies
-            
-        response = await self.client.post(endpoint, json=payload)
-        response.raise_for_status()
-        return response.json()
+        return await self.gateway.command(payload)
     
     async def close(self):
-        """Close the HTTP client."""
-        if self.client:
-            await self.client.aclose()
+        """The gateway owns the connection and is closed by the app lifespan."""
 
 # Global instance
 # flare_bypasser = FlareBypasser()
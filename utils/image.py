@@ -1,40 +1,135 @@
 import io
+import time
 import asyncio
 import base64
+import hashlib
 import json
 # import httpx
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
 import google.generativeai as genai
+from diskcache import Cache
 # from json import loads
-# from PIL import Image
+from PIL import Image, ImageOps
 
 # from groq import Groq
 
-from config import ApiKeyConfig
+from config import ApiKeyConfig, IMAGE_CACHE_DIR, IMAGE_MAX_DIMENSION, IMAGE_WORKERS
+from utils.logging import logger
 
 groq_api_key = ApiKeyConfig.GROQ_API_KEY
 
 model = genai.GenerativeModel(model_name = "gemini-1.5-pro")
 
-# def encode_image(image: Image) -> bytes:
-#     buffered = io.BytesIO()
-#     image.save(buffered, format="JPEG")  # Save the image to the BytesIO object
-#     return buffered.getvalue()  # Return the byte data
-
-async def image_analysis(images: List[bytes], prompt):
-    contents = []
-    for image in images:
-        contents.append({'mime_type':'image/jpeg', 'data': base64.b64encode(image).decode('utf-8')})
-
-    response = await asyncio.to_thread(model.generate_content, [*contents, prompt])
+JPEG_QUALITY = 85
+# Photos whose hashes differ in at most this many of 64 bits count as the same photo
+HASH_DISTANCE = 6
+RESULT_TTL = 24 * 60 * 60
+# Recent analyses per prompt checked for near-identical photos
+MAX_RECENT = 500
+
+# PIL work and the blocking Gemini SDK share this pool instead of the default executor
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+# Keeps requests waiting here rather than piling up in the pool's unbounded queue
+_slots = asyncio.Semaphore(IMAGE_WORKERS)
+_cache = Cache(directory=str(IMAGE_CACHE_DIR))
+
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    width: int
+    height: int
+    dhash: int
+    mime_type: str = "image/jpeg"
+
+
+def dhash(image: Image.Image, size: int = 8) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 grayscale thumbnail is brighter than its neighbour."""
+    pixels = list(image.convert("L").resize((size + 1, size), Image.LANCZOS).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def prepare_image(data: bytes, max_dimension: int = IMAGE_MAX_DIMENSION) -> PreparedImage:
+    """Upright, RGB, downsized to max_dimension on its longest side, and re-encoded as JPEG."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image = image.convert("RGB")
+    image_hash = dhash(image)
+
+    width, height = image.size
+    if max(width, height) > max_dimension:
+        scale = max_dimension / max(width, height)
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+        image = image.resize((width, height), Image.LANCZOS)
+
+    buffered = io.BytesIO()
+    # Saving without exif also drops location and camera metadata
+    image.save(buffered, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return PreparedImage(buffered.getvalue(), width, height, image_hash)
+
+
+def _prepare_all(images: List[bytes]) -> List[PreparedImage]:
+    prepared = []
+    for data in images:
+        try:
+            image = prepare_image(data)
+        except Exception as e:
+            logger.warning(f"Could not preprocess image, skipping it: {str(e)}")
+            continue
+        # The same photo attached twice is only sent once
+        if not any(hamming(image.dhash, other.dhash) == 0 for other in prepared):
+            prepared.append(image)
+    return prepared
+
+
+def _prompt_key(prompt) -> str:
+    return hashlib.sha256(" ".join(str(prompt).split()).encode("utf-8")).hexdigest()[:32]
+
+
+def _same_photos(a: Tuple[int, ...], b: Tuple[int, ...]) -> bool:
+    return len(a) == len(b) and all(hamming(x, y) <= HASH_DISTANCE for x, y in zip(a, b))
+
+
+def cached_analysis(prompt, hashes: Tuple[int, ...]) -> Optional[str]:
+    """A search query already produced for this prompt and the same (or near-identical) photos."""
+    prompt_key = _prompt_key(prompt)
+    result = _cache.get(f"{prompt_key}:{hashes}")
+    if result is not None:
+        return result
+    for other, result in _cache.get(f"recent:{prompt_key}", []):
+        if _same_photos(hashes, other):
+            return result
+    return None
+
+
+def store_analysis(prompt, hashes: Tuple[int, ...], result: str):
+    prompt_key = _prompt_key(prompt)
+    _cache.set(f"{prompt_key}:{hashes}", result, expire=RESULT_TTL)
+    recent = [entry for entry in _cache.get(f"recent:{prompt_key}", []) if entry[0] != hashes]
+    recent.append((hashes, result))
+    _cache.set(f"recent:{prompt_key}", recent[-MAX_RECENT:], expire=RESULT_TTL)
+
+
+def _parse_search_query(text: str) -> str:
     try:
         # Parse the JSON response
-        json_response = json.loads(response.text)
+        json_response = json.loads(text)
         # Return just the search query string
         return json_response.get("search_query", "")
     except json.JSONDecodeError:
         # If JSON parsing fails, try to extract query from the raw text
-        text = response.text.strip()
+        text = text.strip()
         if '"search_query":' in text:
             # Try to extract the query value if the response is malformed JSON
             query_start = text.find('"search_query":') + len('"search_query":')
@@ -43,6 +138,39 @@ async def image_analysis(images: List[bytes], prompt):
                 return text[query_start:query_end].strip(' "')
         return text  # Return raw text as fallback
 
+
+async def image_analysis(images: List[bytes], prompt):
+    loop = asyncio.get_running_loop()
+    async with _slots:
+        prepared = await loop.run_in_executor(_executor, _prepare_all, images)
+        hashes = None
+        if prepared:
+            # Order-independent, so the same photos attached in another order still match
+            hashes = tuple(sorted(image.dhash for image in prepared))
+            cached = cached_analysis(prompt, hashes)
+            if cached is not None:
+                logger.info(f"Reusing image analysis for {len(prepared)} image(s)")
+                return cached
+        else:
+            # Nothing PIL could read; send the uploads as they are and let the model decide
+            prepared = [PreparedImage(data, 0, 0, 0) for data in images]
+
+        contents = [
+            {'mime_type': image.mime_type, 'data': base64.b64encode(image.data).decode('utf-8')}
+            for image in prepared
+        ]
+        started = time.perf_counter()
+        response = await loop.run_in_executor(_executor, model.generate_content, [*contents, prompt])
+        logger.info(
+            f"Image analysis of {len(prepared)} image(s), "
+            f"{sum(len(image.data) for image in prepared) // 1024}KB, took {time.perf_counter() - started:.1f}s"
+        )
+
+    result = _parse_search_query(response.text)
+    if hashes is not None and result:
+        store_analysis(prompt, hashes, result)
+    return result
+
 # async def analyze_image(image: bytes, prompt, is_url=False):
 #     client = Groq(api_key=groq_api_key)
 
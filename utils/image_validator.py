@@ -0,0 +1,122 @@
+import asyncio
+from typing import Dict, Iterable, Optional, Tuple
+
+import aiohttp
+from cachetools import TTLCache
+
+from config import USER_AGENT
+from utils.logging import logger
+
+
+class ImageValidator:
+    """
+    Checks image URLs in batches over one pooled aiohttp session.
+
+    Each URL is probed with HEAD and, when the server refuses HEAD or omits
+    the content type, with a one byte ranged GET. Definitive answers are kept
+    in a TTL cache as (status, content_type) so the same image is never probed
+    twice within the window, and duplicate URLs in a batch share a single probe.
+    Timeouts, connection errors, 429s and 5xxs only go in a short-lived cache,
+    so a blip does not hide a good image for the whole window.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 20,
+        timeout: int = 10,
+        ttl: int = 30 * 60,
+        failure_ttl: int = 60,
+        max_cached: int = 10000,
+    ):
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache: TTLCache = TTLCache(maxsize=max_cached, ttl=ttl)
+        self.failures: TTLCache = TTLCache(maxsize=max_cached, ttl=failure_ttl)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"User-Agent": USER_AGENT},
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @staticmethod
+    def is_image(status: int, content_type: str) -> bool:
+        return status in (200, 206) and content_type.startswith("image/")
+
+    @staticmethod
+    def is_transient(status: int) -> bool:
+        """No response at all, or one that may well be different on the next try."""
+        return status == 0 or status == 429 or status >= 500
+
+    async def _probe(self, url: str) -> Tuple[int, str]:
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.head(url, allow_redirects=True) as response:
+                    status = response.status
+                    content_type = response.headers.get("content-type", "")
+                if self.is_image(status, content_type):
+                    return status, content_type
+
+                # Plenty of CDNs reject HEAD or drop the content type on it
+                async with session.get(
+                    url, allow_redirects=True, headers={"Range": "bytes=0-0"}
+                ) as response:
+                    return response.status, response.headers.get("content-type", "")
+            except Exception as e:
+                logger.debug(f"Image probe failed for {url}: {str(e)}")
+                return 0, ""
+
+    async def check(self, url: str) -> Tuple[int, str]:
+        """Return (status, content_type) for a URL, from cache when possible."""
+        if url in self.cache:
+            return self.cache[url]
+        if url in self.failures:
+            return self.failures[url]
+
+        if url in self._inflight:
+            return await self._inflight[url]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            result = await self._probe(url)
+            if self.is_transient(result[0]):
+                self.failures[url] = result
+            else:
+                self.cache[url] = result
+            future.set_result(result)
+            return result
+        except BaseException:
+            if not future.done():
+                future.cancel()
+            raise
+        finally:
+            del self._inflight[url]
+
+    async def validate(self, url: str) -> bool:
+        if not url:
+            return False
+        status, content_type = await self.check(url)
+        return self.is_image(status, content_type)
+
+    async def validate_many(self, urls: Iterable[str]) -> Dict[str, bool]:
+        unique = list(dict.fromkeys(url for url in urls if url))
+        results = await asyncio.gather(*(self.validate(url) for url in unique))
+        return dict(zip(unique, results))
+
+
+image_validator = ImageValidator()
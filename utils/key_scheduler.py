@@ -0,0 +1,228 @@
+import time
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from config import ApiKeyConfig, GEMINI_KEY_RPM, GEMINI_KEY_TPM
+from utils.logging import logger
+
+
+# Quarantine after a 429 doubles with each strike up to the cap; strikes halve every STRIKE_HALF_LIFE seconds
+QUARANTINE_BASE = 10.0
+QUARANTINE_MAX = 300.0
+STRIKE_HALF_LIFE = 300.0
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for provider errors that mean the key is out of quota."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return "RESOURCE_EXHAUSTED" in str(error)
+
+
+@dataclass
+class KeyState:
+    key: str
+    rpm: int
+    tpm: int
+    requests_left: float = 0.0
+    tokens_left: float = 0.0
+    refilled_at: float = field(default_factory=time.monotonic)
+    strikes: float = 0.0
+    struck_at: float = 0.0
+    quarantined_until: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    tokens: int = 0
+    rate_limited: int = 0
+
+    def __post_init__(self):
+        self.requests_left = float(self.rpm)
+        self.tokens_left = float(self.tpm)
+
+    def refill(self, now: float):
+        elapsed = now - self.refilled_at
+        self.refilled_at = now
+        self.requests_left = min(float(self.rpm), self.requests_left + elapsed * self.rpm / 60)
+        self.tokens_left = min(float(self.tpm), self.tokens_left + elapsed * self.tpm / 60)
+
+    def decayed_strikes(self, now: float) -> float:
+        return self.strikes * 0.5 ** ((now - self.struck_at) / STRIKE_HALF_LIFE)
+
+    def headroom(self) -> float:
+        """Share of the tighter of the two quotas still available."""
+        return min(self.requests_left / self.rpm, self.tokens_left / self.tpm)
+
+    def ready_in(self, now: float, tokens: int) -> float:
+        """Seconds until this key could take a call of this size."""
+        wait = max(0.0, self.quarantined_until - now)
+        if self.requests_left < 1:
+            wait = max(wait, (1 - self.requests_left) * 60 / self.rpm)
+        if self.tokens_left < tokens:
+            wait = max(wait, (tokens - self.tokens_left) * 60 / self.tpm)
+        return wait
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            "key": f"...{self.key[-4:]}",
+            "rpm_used": round(1 - max(0.0, self.requests_left) / self.rpm, 3),
+            "tpm_used": round(1 - max(0.0, self.tokens_left) / self.tpm, 3),
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "rate_limited": self.rate_limited,
+            "strikes": round(self.decayed_strikes(now), 2),
+            "quarantined_for": round(max(0.0, self.quarantined_until - now), 1),
+        }
+
+
+class KeyLease:
+    """One call's hold on a key. Finish it with complete(), rate_limited() or release()."""
+
+    def __init__(self, scheduler: "KeyScheduler", state: KeyState, tokens: int):
+        self._scheduler = scheduler
+        self._state = state
+        self._tokens = tokens
+        self._done = False
+
+    @property
+    def key(self) -> str:
+        return self._state.key
+
+    def _finish(self):
+        if self._done:
+            return False
+        self._done = True
+        self._state.in_flight -= 1
+        return True
+
+    def complete(self, tokens_used: Optional[int] = None):
+        """The call succeeded; settle the token estimate against what it actually used."""
+        if not self._finish():
+            return
+        used = self._tokens if tokens_used is None else tokens_used
+        self._state.tokens_left += self._tokens - used
+        self._state.tokens += used
+
+    def release(self):
+        """The call failed for a reason unrelated to quota; give the token estimate back."""
+        if self._finish():
+            self._state.tokens_left += self._tokens
+
+    def rate_limited(self, retry_after: Optional[float] = None):
+        """The provider answered 429 for this key."""
+        if self._finish():
+            self._scheduler.quarantine(self._state, retry_after)
+
+
+class KeyScheduler:
+    """
+    Spreads calls over a pool of API keys within each key's quota.
+
+    Every key has a requests-per-minute and a tokens-per-minute bucket refilled
+    continuously. A call goes to the key with the most headroom left in its
+    tighter bucket; when every key is drained, acquire() waits for the first one
+    to refill instead of sending a call that is bound to get a 429.
+
+    A key that gets a 429 anyway is quarantined, for longer on each repeat
+    offence, and its strike count decays over time so a key that recovers is
+    trusted again.
+    """
+
+    def __init__(self, name: str, keys: Iterable[str], rpm: int = GEMINI_KEY_RPM, tpm: int = GEMINI_KEY_TPM):
+        self.name = name
+        # Unset keys come through config as "None"
+        unique = dict.fromkeys(k for k in keys if k and k != "None")
+        self.states: List[KeyState] = [KeyState(key=k, rpm=rpm, tpm=tpm) for k in unique]
+        if not self.states:
+            logger.warning(f"No API keys configured for {name}")
+
+    @property
+    def keys(self) -> List[str]:
+        return [state.key for state in self.states]
+
+    def _refill(self, now: float):
+        for state in self.states:
+            state.refill(now)
+
+    def _best(self, now: float, tokens: int, strict: bool) -> Optional[KeyState]:
+        candidates = [
+            state for state in self.states
+            if not strict or state.ready_in(now, tokens) == 0
+        ]
+        if not candidates:
+            return None
+        return max(
+            candidates,
+            key=lambda s: (s.quarantined_until <= now, s.headroom(), -s.in_flight),
+        )
+
+    def _take(self, state: KeyState, tokens: int) -> KeyLease:
+        state.requests_left -= 1
+        state.tokens_left -= tokens
+        state.requests += 1
+        state.in_flight += 1
+        return KeyLease(self, state, tokens)
+
+    def has_headroom(self, tokens: int = 0) -> bool:
+        now = time.monotonic()
+        self._refill(now)
+        return self._best(now, tokens, strict=True) is not None
+
+    async def acquire(self, tokens: int = 0, max_wait: float = 30.0) -> KeyLease:
+        """
+        Lease the key with the most headroom for a call of about this many tokens.
+
+        Waits up to max_wait seconds for a key to free up, then hands out the best
+        key regardless and lets the provider decide.
+        """
+        if not self.states:
+            raise ValueError(f"No API keys configured for {self.name}")
+
+        # A call bigger than a whole minute of quota can still go once a key is full
+        tokens = min(tokens, min(s.tpm for s in self.states))
+        deadline = time.monotonic() + max_wait
+        while True:
+            now = time.monotonic()
+            self._refill(now)
+            state = self._best(now, tokens, strict=True)
+            if state is not None:
+                return self._take(state, tokens)
+
+            wait = min(s.ready_in(now, tokens) for s in self.states)
+            if now + wait > deadline:
+                logger.warning(f"All {self.name} keys are at quota, sending anyway")
+                return self._take(self._best(now, tokens, strict=False), tokens)
+            await asyncio.sleep(max(wait, 0.05))
+
+    def pick(self) -> str:
+        """Key for a caller that manages its own requests, without waiting."""
+        now = time.monotonic()
+        self._refill(now)
+        state = self._best(now, 0, strict=False)
+        if state is None:
+            return "None"
+        lease = self._take(state, 0)
+        lease.complete(0)
+        return lease.key
+
+    def quarantine(self, state: KeyState, retry_after: Optional[float] = None):
+        now = time.monotonic()
+        state.strikes = state.decayed_strikes(now) + 1
+        state.struck_at = now
+        duration = min(QUARANTINE_BASE * 2 ** (state.strikes - 1), QUARANTINE_MAX)
+        if retry_after:
+            duration = max(duration, retry_after)
+        state.quarantined_until = now + duration
+        state.requests_left = min(state.requests_left, 0.0)
+        state.rate_limited += 1
+        logger.warning(f"{self.name} key ...{state.key[-4:]} rate limited, quarantined for {duration:.0f}s")
+
+    def utilization(self) -> List[Dict]:
+        now = time.monotonic()
+        self._refill(now)
+        return [state.to_dict(now) for state in self.states]
+
+
+gemini_keys = KeyScheduler("gemini", [ApiKeyConfig.GEMINI_API_KEY, ApiKeyConfig.GEMINI_API_KEY_2])
+serp_keys = KeyScheduler("serp", [ApiKeyConfig.GEMINI_API_KEY_3, ApiKeyConfig.GEMINI_API_KEY_4])
@@ -1,45 +1,122 @@
 # utils/limiter.py
+import math
+import time
 from functools import wraps
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException, Request, status
 from asyncio import Semaphore
 import redis.asyncio as redis
-from collections import defaultdict
+from collections import OrderedDict, deque
+
+# Algorithms with O(1) state per key; "sliding_window" keeps every timestamp in the window
+ALGORITHMS = ("gcra", "token_bucket", "sliding_window")
+
+# Cap on in-memory keys; the least recently seen are dropped past it
+MAX_MEMORY_KEYS = 100_000
+
+# Both scripts read the clock with TIME so every app server agrees on "now".
+# KEYS[1] = state key, ARGV = rate (requests per second), burst, cost
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = 1 / tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - burst * interval
+
+if allow_at > now then
+    return {0, 0, tostring(allow_at - now), tostring(tat - now)}
+end
+
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+local remaining = math.floor((now + burst * interval - new_tat) / interval)
+return {1, remaining, '0', tostring(new_tat - now)}
+"""
+
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return {allowed, math.floor(tokens), tostring(retry_after), tostring((burst - tokens) / rate)}
+"""
+
 
 class Limiter:
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(self, redis_url: Optional[str] = None, max_keys: int = MAX_MEMORY_KEYS):
         """
         Initialize the rate limiter.
-        
+
         Args:
             redis_url: Optional Redis URL. If None, an in-memory store is used.
+            max_keys: Most clients tracked in memory at once.
         """
         self.use_redis = redis_url is not None
         if self.use_redis:
             self.redis = redis.from_url(redis_url)
+            self._scripts = {
+                "gcra": self.redis.register_script(GCRA_SCRIPT),
+                "token_bucket": self.redis.register_script(TOKEN_BUCKET_SCRIPT),
+            }
         else:
-            self.memory_store = defaultdict(list)  # In-memory store for rate limits
-        
+            # key -> (state, idle_after); ordered by last use so idle keys sit at the front
+            self.memory_store: "OrderedDict[str, Tuple[object, float]]" = OrderedDict()
+
+        self.max_keys = max_keys
         self._rate_limiters: Dict[str, "RateLimit"] = {}
         self.queue_semaphore = Semaphore(100)  # Max concurrent queue processors
 
-    def limit(self, times: int = 100, minutes: int = 1, queue: bool = True, key_func=None):
+    def limit(
+        self,
+        times: int = 100,
+        minutes: int = 1,
+        queue: bool = True,
+        key_func=None,
+        algorithm: str = "gcra",
+        burst: Optional[int] = None,
+    ):
         """
         Decorator to apply rate limiting to an endpoint.
-        
+
         Args:
             times: Number of allowed requests per time window.
             minutes: Duration of the time window in minutes.
             queue: Whether to use the queue system for rate-limited requests.
-            key_func: Optional function to generate the client identifier. 
+            key_func: Optional function to generate the client identifier.
                      If None, uses IP address.
+            algorithm: "gcra", "token_bucket" or "sliding_window".
+            burst: Requests allowed back to back. Defaults to times.
         """
         def decorator(func):
             self._rate_limiters[func.__name__] = RateLimit(
                 times=times,
                 seconds=minutes * 60,
-                queue=queue
+                queue=queue,
+                algorithm=algorithm,
+                burst=burst,
             )
             @wraps(func)
             async def wrapper(request: Request, *args, **kwargs):
@@ -50,31 +127,37 @@ class Limiter:
                 else:
                     # Default to IP-based limiting
                     client_id = await self._get_client_id(request)
-                
+
                 if queue:
                     return await self._handle_with_queue(request, client_id, limit, func, args, kwargs)
                 else:
                     return await self._handle_direct(request, client_id, limit, func, args, kwargs)
-                
+
             return wrapper
-        
+
         return decorator
 
     async def _get_client_id(self, request: Request) -> str:
         """Get unique client identifier based on IP address."""
         return f"ip:{request.client.host}"  # Prefix to avoid collisions with other ID types
 
-    async def _handle_with_queue(self, request: Request, client_id: str, 
+    @staticmethod
+    def _reject(current: dict):
+        retry_after = max(1, math.ceil(current["retry_after"]))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Rate limit exceeded. Try again in {retry_after} seconds",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def _handle_with_queue(self, request: Request, client_id: str,
                                limit: "RateLimit", func, args, kwargs):
         """Handle requests with queueing."""
         current = await self._check_limit(client_id, limit)
-        
-        if current["remaining"] <= 0:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Try again in {current['reset_in']} seconds"
-            )
-        
+
+        if not current["allowed"]:
+            self._reject(current)
+
         async with self.queue_semaphore:
             return await func(request, *args, **kwargs)
 
@@ -82,30 +165,42 @@ class Limiter:
                            limit: "RateLimit", func, args, kwargs):
         """Handle requests without queueing."""
         current = await self._check_limit(client_id, limit)
-        
-        if current["remaining"] <= 0:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Try again in {current['reset_in']} seconds"
-            )
-        
+
+        if not current["allowed"]:
+            self._reject(current)
+
         return await func(request, *args, **kwargs)
 
     async def _check_limit(self, client_id: str, limit: "RateLimit") -> dict:
         """
-        Check if the client has exceeded the rate limit.
-        
+        Check if the client has exceeded the rate limit, and count the request if not.
+
         Args:
             client_id: Unique identifier for the client.
             limit: RateLimit object containing the limit configuration.
-        
+
         Returns:
-            Dictionary with remaining requests and reset time.
+            Dictionary with allowed, remaining requests, retry_after (seconds until
+            the next request would pass) and reset_in (seconds until the limit is full again).
         """
         if self.use_redis:
-            return await self._check_limit_redis(client_id, limit)
-        else:
-            return await self._check_limit_memory(client_id, limit)
+            if limit.algorithm == "sliding_window":
+                return await self._check_limit_redis(client_id, limit)
+            return await self._check_limit_redis_script(client_id, limit)
+        return self._check_limit_memory(client_id, limit)
+
+    async def _check_limit_redis_script(self, client_id: str, limit: "RateLimit") -> dict:
+        """Atomic check-and-update in a single round trip."""
+        key = f"rate_limit:{limit.algorithm}:{limit.name}:{client_id}"
+        allowed, remaining, retry_after, reset_in = await self._scripts[limit.algorithm](
+            keys=[key], args=[limit.rate, limit.burst, 1]
+        )
+        return {
+            "allowed": bool(allowed),
+            "remaining": int(remaining),
+            "retry_after": float(retry_after),
+            "reset_in": float(reset_in),
+        }
 
     async def _check_limit_redis(self, client_id: str, limit: "RateLimit") -> dict:
         """Redis-based rate limiting using sorted sets."""
@@ -116,14 +211,19 @@ class Limiter:
         async with self.redis.pipeline() as pipe:
             pipe.zremrangebyscore(key, 0, window_start)  # Remove old requests
             pipe.zcard(key)                              # Count current requests
+            pipe.zrange(key, 0, 0, withscores=True)      # Oldest request in the window
             pipe.expire(key, limit.seconds)              # Set expiration
             results = await pipe.execute()
 
         current_count = results[1]
+        oldest = results[2][0][1] if results[2] else now
+        reset_in = max(0.0, oldest + limit.seconds - now)
         if current_count >= limit.times:
             return {
+                "allowed": False,
                 "remaining": 0,
-                "reset_in": limit.seconds - (now - window_start)
+                "retry_after": reset_in,
+                "reset_in": reset_in,
             }
 
         async with self.redis.pipeline() as pipe:
@@ -132,42 +232,113 @@ class Limiter:
             await pipe.execute()
 
         return {
+            "allowed": True,
             "remaining": limit.times - current_count - 1,
-            "reset_in": limit.seconds - (now - window_start)
+            "retry_after": 0.0,
+            "reset_in": reset_in or limit.seconds,
         }
 
-    async def _check_limit_memory(self, client_id: str, limit: "RateLimit") -> dict:
-        """In-memory rate limiting using a sliding window."""
-        now = datetime.now().timestamp()
-        window_start = now - limit.seconds
+    def _check_limit_memory(self, client_id: str, limit: "RateLimit", now: Optional[float] = None) -> dict:
+        """In-memory rate limiting with O(1) work per request for gcra and token_bucket."""
+        now = time.monotonic() if now is None else now
+        key = f"{limit.name}:{client_id}"
+        self._evict_idle(now)
 
-        # Get the client's request timestamps
-        timestamps = self.memory_store[client_id]
-        
-        # Remove old requests outside the time window
-        timestamps = [ts for ts in timestamps if ts >= window_start]
-        self.memory_store[client_id] = timestamps
+        state, _ = self.memory_store.pop(key, (None, 0.0))
+        if limit.algorithm == "gcra":
+            state, result = self._gcra(state, limit, now)
+        elif limit.algorithm == "token_bucket":
+            state, result = self._token_bucket(state, limit, now)
+        else:
+            state, result = self._sliding_window(state, limit, now)
 
-        # Check if the limit is exceeded
-        if len(timestamps) >= limit.times:
-            return {
+        # A key whose limit has fully recovered holds no information, so it can go
+        self.memory_store[key] = (state, now + result["reset_in"])
+        return result
+
+    def _evict_idle(self, now: float):
+        """Drop keys whose limit has recovered, oldest first, and the excess over max_keys."""
+        store = self.memory_store
+        while store:
+            key, (_, idle_after) = next(iter(store.items()))
+            if idle_after > now and len(store) < self.max_keys:
+                break
+            store.popitem(last=False)
+
+    @staticmethod
+    def _gcra(tat: Optional[float], limit: "RateLimit", now: float) -> Tuple[float, dict]:
+        """Generic cell rate algorithm; the only state is the theoretical arrival time."""
+        interval = 1 / limit.rate
+        tat = max(tat or now, now)
+        new_tat = tat + interval
+        allow_at = new_tat - limit.burst * interval
+
+        if allow_at > now:
+            return tat, {
+                "allowed": False,
                 "remaining": 0,
-                "reset_in": limit.seconds - (now - window_start)
+                "retry_after": allow_at - now,
+                "reset_in": tat - now,
             }
+        return new_tat, {
+            "allowed": True,
+            "remaining": int((now + limit.burst * interval - new_tat) / interval),
+            "retry_after": 0.0,
+            "reset_in": new_tat - now,
+        }
 
-        # Add the current request timestamp
-        timestamps.append(now)
-        self.memory_store[client_id] = timestamps
+    @staticmethod
+    def _token_bucket(state: Optional[Tuple[float, float]], limit: "RateLimit", now: float) -> Tuple[Tuple[float, float], dict]:
+        """Bucket of burst tokens refilled at rate per second; state is (tokens, last refill)."""
+        tokens, ts = state or (float(limit.burst), now)
+        tokens = min(float(limit.burst), tokens + (now - ts) * limit.rate)
 
-        return {
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        return (tokens, now), {
+            "allowed": allowed,
+            "remaining": int(tokens),
+            "retry_after": 0.0 if allowed else (1 - tokens) / limit.rate,
+            "reset_in": (limit.burst - tokens) / limit.rate,
+        }
+
+    @staticmethod
+    def _sliding_window(timestamps: Optional[deque], limit: "RateLimit", now: float) -> Tuple[deque, dict]:
+        """Exact sliding window log; memory grows with the limit."""
+        timestamps = timestamps if timestamps is not None else deque()
+        window_start = now - limit.seconds
+
+        # Remove old requests outside the time window
+        while timestamps and timestamps[0] < window_start:
+            timestamps.popleft()
+
+        allowed = len(timestamps) < limit.times
+        if allowed:
+            timestamps.append(now)
+        return timestamps, {
+            "allowed": allowed,
             "remaining": limit.times - len(timestamps),
-            "reset_in": limit.seconds - (now - window_start)
+            "retry_after": 0.0 if allowed else timestamps[0] + limit.seconds - now,
+            "reset_in": timestamps[-1] + limit.seconds - now if timestamps else 0.0,
         }
 
 class RateLimit:
     """Configuration for a rate limit."""
-    def __init__(self, times: int, seconds: int, queue: bool = True):
+    def __init__(
+        self,
+        times: int,
+        seconds: int,
+        queue: bool = True,
+        algorithm: str = "gcra",
+        burst: Optional[int] = None,
+    ):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm {algorithm}, expected one of {ALGORITHMS}")
         self.times = times        # Allowed requests
         self.seconds = seconds    # Time window in seconds
         self.queue = queue        # Whether to use queue system
-        self.name = f"limit_{times}_{seconds}"
\ No newline at end of file
+        self.algorithm = algorithm
+        self.burst = burst or times   # Requests allowed back to back
+        self.rate = times / seconds   # Sustained requests per second
+        self.name = f"limit_{times}_{seconds}"
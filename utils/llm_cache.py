@@ -0,0 +1,232 @@
+import re
+import json
+import asyncio
+import hashlib
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+import numpy as np
+from diskcache import Cache
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+from pydantic_ai.usage import Usage
+
+from config import LLM_CACHE_DIR
+from utils.logging import logger
+
+
+# "exact"    reuse a response for the same model, system prompt, schema and normalized prompt
+# "semantic" also reuse one whose prompt embeds within SEMANTIC_THRESHOLD of this one
+# "off"      always call the model, for creative or conversational calls
+CacheMode = Literal["exact", "semantic", "off"]
+
+DEFAULT_TTL = 60 * 60
+SEMANTIC_THRESHOLD = 0.97
+# Prompt embeddings kept per (model, system prompt, schema) for semantic lookups
+MAX_VECTORS = 500
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    mode: CacheMode = "off"
+    ttl: int = DEFAULT_TTL
+
+
+OFF = CachePolicy(mode="off")
+
+# Keyed by agent name. Caching is opt-in: the key ignores deps and tool results, so an
+# agent whose answers depend on live prices or user state must not be listed
+AGENT_POLICIES: Dict[str, CachePolicy] = {
+    # Extraction over the same page chunk or product list
+    "research_agent": CachePolicy("exact", 30 * 60),
+    "reviewer_agent": CachePolicy("exact", 30 * 60),
+    "image_validation_agent": CachePolicy("exact", 24 * 60 * 60),
+    # Prompts carry the user's memories, a hit would replay them to another user
+    "planner_agent": OFF,
+    "web_query_agent": OFF,
+    # Written answers and conversation turns
+    "summary_agent": OFF,
+    "writer_agent": OFF,
+    "meta_agent": OFF,
+    "followup_agent": OFF,
+    "copilot_followup_agent": OFF,
+    "copilot_planner_agent": OFF,
+}
+
+
+def normalize_prompt(prompt: Any) -> str:
+    return re.sub(r"\s+", " ", str(prompt)).strip()
+
+
+def schema_fingerprint(result_type: Any) -> str:
+    if result_type is None:
+        return "str"
+    if hasattr(result_type, "model_json_schema"):
+        return json.dumps(result_type.model_json_schema(), sort_keys=True)
+    return repr(result_type)
+
+
+@dataclass
+class LLMCacheStats:
+    hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    tokens_avoided: int = 0
+
+    def to_dict(self) -> dict:
+        total = self.hits + self.semantic_hits + self.misses
+        return {
+            **asdict(self),
+            "hit_rate": (self.hits + self.semantic_hits) / total if total else 0.0,
+        }
+
+
+class CachedRunResult:
+    """Stands in for a pydantic-ai run result replayed from the cache."""
+
+    def __init__(self, data: Any, messages: bytes, message_history: Optional[list] = None):
+        self.data = data
+        self._messages = messages
+        self._history = list(message_history or [])
+
+    def new_messages(self) -> list:
+        return ModelMessagesTypeAdapter.validate_json(self._messages)
+
+    def all_messages(self) -> list:
+        return self._history + self.new_messages()
+
+    def usage(self) -> Usage:
+        return Usage()
+
+
+class LLMCache:
+    """
+    Agent responses keyed by model, system prompt, result schema and the
+    whitespace-normalized prompt (plus message history, when there is one).
+
+    A hit returns the stored result data and messages without calling the model.
+    In semantic mode a miss falls back to the nearest earlier prompt for the same
+    model, system prompt and schema, if it is similar enough; only calls without
+    message history are matched this way.
+    """
+
+    def __init__(self, cache_dir: str = str(LLM_CACHE_DIR), threshold: float = SEMANTIC_THRESHOLD):
+        self.cache = Cache(directory=cache_dir)
+        self.threshold = threshold
+        self.stats = LLMCacheStats()
+        self._embedder = None
+
+    @staticmethod
+    def policy_for(agent_name: str) -> CachePolicy:
+        return AGENT_POLICIES.get(agent_name, OFF)
+
+    @staticmethod
+    def make_key(
+        model: Any,
+        system_prompt: Any,
+        result_type: Any,
+        prompt: Any,
+        message_history: Optional[list] = None,
+    ) -> Tuple[str, str]:
+        """Returns (namespace, key); the namespace groups prompts that may share a response."""
+        model_name = getattr(model, "model_name", None) or str(model)
+        namespace = hashlib.sha256(
+            "\0".join((model_name, str(system_prompt), schema_fingerprint(result_type))).encode("utf-8")
+        ).hexdigest()[:32]
+
+        digest = hashlib.sha256(namespace.encode("utf-8"))
+        digest.update(normalize_prompt(prompt).encode("utf-8"))
+        if message_history:
+            digest.update(ModelMessagesTypeAdapter.dump_json(message_history))
+        return namespace, digest.hexdigest()
+
+    async def _embed(self, text: str) -> np.ndarray:
+        if self._embedder is None:
+            from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
+            self._embedder = FastEmbedEmbeddings()
+        vector = np.asarray(await asyncio.to_thread(self._embedder.embed_query, text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _load(self, key: str) -> Optional[dict]:
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.error(f"Failed to read LLM cache: {str(e)}")
+            return None
+
+    async def _nearest(self, namespace: str, prompt: str) -> Optional[dict]:
+        entries: List[Tuple[np.ndarray, str]] = self.cache.get(f"vectors:{namespace}", [])
+        if not entries:
+            return None
+
+        vector = await self._embed(prompt)
+        matrix = np.stack([v for v, _ in entries])
+        scores = matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return self._load(entries[best][1])
+
+    async def get(
+        self,
+        namespace: str,
+        key: str,
+        prompt: Any,
+        policy: CachePolicy,
+        message_history: Optional[list] = None,
+    ) -> Optional[CachedRunResult]:
+        entry = self._load(key)
+        semantic = False
+        if entry is None and policy.mode == "semantic" and not message_history:
+            try:
+                entry = await self._nearest(namespace, normalize_prompt(prompt))
+                semantic = entry is not None
+            except Exception as e:
+                logger.error(f"Semantic LLM cache lookup failed: {str(e)}")
+
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        if semantic:
+            self.stats.semantic_hits += 1
+        else:
+            self.stats.hits += 1
+        self.stats.tokens_avoided += entry["tokens"]
+        return CachedRunResult(entry["data"], entry["messages"], message_history)
+
+    async def set(
+        self,
+        namespace: str,
+        key: str,
+        prompt: Any,
+        result: Any,
+        policy: CachePolicy,
+        message_history: Optional[list] = None,
+    ):
+        try:
+            entry = {
+                "data": result.data,
+                "messages": ModelMessagesTypeAdapter.dump_json(result.new_messages()),
+                "tokens": result.usage().total_tokens or 0,
+            }
+            self.cache.set(key, entry, expire=policy.ttl)
+            self.stats.stores += 1
+        except Exception as e:
+            logger.error(f"Failed to write LLM cache: {str(e)}")
+            return
+
+        if policy.mode != "semantic" or message_history:
+            return
+        try:
+            vector = await self._embed(normalize_prompt(prompt))
+            vectors_key = f"vectors:{namespace}"
+            # Drop entries whose response has expired, then keep the newest MAX_VECTORS
+            entries = [(v, k) for v, k in self.cache.get(vectors_key, []) if k in self.cache and k != key]
+            entries.append((vector, key))
+            self.cache.set(vectors_key, entries[-MAX_VECTORS:], expire=policy.ttl)
+        except Exception as e:
+            logger.error(f"Failed to index LLM cache prompt: {str(e)}")
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,170 @@
+import re
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+from rank_bm25 import BM25Okapi
+
+from utils.logging import logger
+
+
+PRODUCT_TERMS = "price name features product details brand specification rating reviews discount"
+
+_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass
+class ChunkingStats:
+    pages: int = 0
+    chunks_total: int = 0
+    chunks_sent: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+class MarkdownChunker:
+    """
+    Splits page markdown on its structure (headings, then paragraphs, then lines)
+    into token-bounded chunks and keeps only the chunks most relevant to a query,
+    so the LLM sees the product listing rather than the whole page.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        top_k: int = 3,
+        encoding_name: str = "cl100k_base",
+        min_score: float = 0.0,
+    ):
+        self.max_tokens = max_tokens
+        self.top_k = top_k
+        self.encoding_name = encoding_name
+        self.min_score = min_score
+        self.stats = ChunkingStats()
+        self._encoding = None
+        self._encoding_failed = False
+
+    def _get_encoding(self):
+        if self._encoding is None and not self._encoding_failed:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception as e:
+                logger.warning(f"Falling back to word based token count: {str(e)}")
+                self._encoding_failed = True
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        encoding = self._get_encoding()
+        if encoding is None:
+            # Roughly 4 tokens for every 3 words of English text
+            return (len(text.split()) * 4) // 3
+        return len(encoding.encode(text, disallowed_special=()))
+
+    def _split_sections(self, markdown: str) -> List[str]:
+        starts = [m.start() for m in _HEADING_RE.finditer(markdown)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        starts.append(len(markdown))
+        return [
+            markdown[start:end].strip()
+            for start, end in zip(starts, starts[1:])
+            if markdown[start:end].strip()
+        ]
+
+    def _split_oversized(self, text: str) -> List[str]:
+        """Break a block larger than max_tokens on paragraphs, then on lines."""
+        for separator in ("\n\n", "\n"):
+            parts = [part for part in text.split(separator) if part.strip()]
+            if len(parts) > 1:
+                return self._pack(parts, separator)
+
+        # A single huge line, fall back to splitting on words
+        words = text.split()
+        step = max(1, (self.max_tokens * 3) // 4)
+        return [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+
+    def _pack(self, blocks: List[str], separator: str) -> List[str]:
+        """Greedily merge consecutive blocks into chunks of at most max_tokens."""
+        chunks: List[str] = []
+        current: List[str] = []
+        current_tokens = 0
+
+        for block in blocks:
+            block_tokens = self.count_tokens(block)
+            if block_tokens > self.max_tokens:
+                if current:
+                    chunks.append(separator.join(current))
+                    current, current_tokens = [], 0
+                chunks.extend(self._split_oversized(block))
+                continue
+
+            if current and current_tokens + block_tokens > self.max_tokens:
+                chunks.append(separator.join(current))
+                current, current_tokens = [], 0
+
+            current.append(block)
+            current_tokens += block_tokens
+
+        if current:
+            chunks.append(separator.join(current))
+        return chunks
+
+    def split(self, markdown: str) -> List[str]:
+        if not markdown or not markdown.strip():
+            return []
+        return self._pack(self._split_sections(markdown), "\n\n")
+
+    @staticmethod
+    def _tokenize(text: str) -> List[str]:
+        return _TOKEN_RE.findall(text.lower())
+
+    def rank(self, chunks: List[str], query: str) -> List[float]:
+        corpus = [self._tokenize(chunk) or [""] for chunk in chunks]
+        bm25 = BM25Okapi(corpus)
+        return list(bm25.get_scores(self._tokenize(query)))
+
+    def select(self, markdown: str, query: Optional[str] = None) -> List[str]:
+        """
+        Return the top_k most relevant chunks of the page in document order.
+
+        The query is extended with generic product terms so listing and detail
+        blocks outrank navigation, footers and cookie banners.
+        """
+        chunks = self.split(markdown)
+        if not chunks:
+            return []
+
+        query = f"{query or ''} {PRODUCT_TERMS}".strip()
+        tokens_in = sum(self.count_tokens(chunk) for chunk in chunks)
+
+        if len(chunks) <= self.top_k:
+            selected = chunks
+        else:
+            scores = self.rank(chunks, query)
+            ranked = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)
+            keep = [i for i in ranked[:self.top_k] if scores[i] > self.min_score]
+            # Nothing matched at all, keep the head of the page rather than nothing
+            keep = keep or ranked[:1]
+            selected = [chunks[i] for i in sorted(keep)]
+
+        tokens_out = sum(self.count_tokens(chunk) for chunk in selected)
+
+        self.stats.pages += 1
+        self.stats.chunks_total += len(chunks)
+        self.stats.chunks_sent += len(selected)
+        self.stats.tokens_in += tokens_in
+        self.stats.tokens_out += tokens_out
+
+        logger.info(
+            f"Chunked page into {len(chunks)} chunks, sending {len(selected)} "
+            f"({tokens_out}/{tokens_in} tokens)"
+        )
+        return selected
@@ -1,3 +1,6 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
 import diskcache
 import numpy as np
 from datetime import datetime, timezone
@@ -6,18 +9,46 @@ from config import MEMORY_CACHE_DIR
 
 from langchain_community.embeddings.fastembed import FastEmbedEmbeddings
 
+from .logging import logger
+from .vector_index import VectorIndex
+
+
+# Index writes between saves of a namespace's index; a stale saved index is rebuilt on load anyway
+PERSIST_EVERY = 256
+# Bookkeeping keys in the vector cache are tuples so they never collide with composite keys
+_NAMESPACES_KEY = ("namespaces",)
+# Set once every namespace's embedding keys are listed under _keys_key
+_KEYED_KEY = ("keyed",)
+
+
+def _version_key(ns: str) -> tuple:
+    return ("version", ns)
+
+
+def _keys_key(ns: str) -> tuple:
+    return ("keys", ns)
+
 
 class DiskCacheStore(BaseStore):
     """
     A disk-backed store using diskcache for persistence.
     This store saves key-value data to disk and, if configured with an index,
     supports vector search.
+
+    Each namespace gets its own VectorIndex, persisted beside the caches under
+    {cache_dir}_index. Every write bumps the namespace's version in the vector
+    cache, so an index saved before later writes (or written to by another
+    process) is detected and rebuilt from the stored embeddings. The vector
+    cache also keeps the set of embedding keys of each namespace, so a rebuild
+    reads only that namespace instead of scanning every stored embedding.
     """
     def __init__(self, cache_dir: str = '/tmp/diskcache', index: dict = None) -> None:
         # Main cache for items
         self.cache = diskcache.Cache(cache_dir)
         # Separate cache for vector embeddings; stored under a related directory.
         self.vector_cache = diskcache.Cache(f"{cache_dir}_vectors")
+        # Serialized per-namespace ANN indexes
+        self.index_cache = diskcache.Cache(f"{cache_dir}_index")
         self.index_config = index
         if index:
             # Embedding provider must expose `embed_documents` and `embed_query`
@@ -27,6 +58,12 @@ class DiskCacheStore(BaseStore):
         else:
             self.embeddings = None
             self.fields = []
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._unsaved: Dict[str, int] = {}
+        # put() runs in worker threads while search() runs on the event loop
+        self._lock = threading.RLock()
+        if self.embeddings and _KEYED_KEY not in self.vector_cache:
+            self._register_existing()
 
     async def abatch(self): ...
     def batch(self): ...
@@ -35,38 +72,169 @@ class DiskCacheStore(BaseStore):
         """Flatten the namespace and key into a single composite key."""
         return f"{'::'.join(namespace)}::{key}"
 
+    def _register_existing(self):
+        """Version and list namespaces, and their keys, for embeddings stored before they were tracked."""
+        keys: Dict[str, set] = {}
+        for composite_key in self.vector_cache.iterkeys():
+            if isinstance(composite_key, str):
+                keys.setdefault(composite_key.rsplit("::", 1)[0], set()).add(composite_key)
+        with self.vector_cache.transact():
+            for ns, composite_keys in keys.items():
+                self.vector_cache.add(_version_key(ns), 1)
+                self.vector_cache[_keys_key(ns)] = composite_keys
+            self.vector_cache[_NAMESPACES_KEY] = self.vector_cache.get(_NAMESPACES_KEY, set()) | set(keys)
+            self.vector_cache[_KEYED_KEY] = True
+
+    def _update_keys(self, ns: str, added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """Record embeddings stored in or deleted from a namespace."""
+        added, removed = set(added), set(removed)
+        if not (added or removed):
+            return
+        # Other processes update the same set
+        with self.vector_cache.transact():
+            keys = self.vector_cache.get(_keys_key(ns), set())
+            self.vector_cache[_keys_key(ns)] = (keys | added) - removed
+
+    def _embed_values(self, values: List[dict]) -> List[Dict[str, list]]:
+        """Embeddings for the configured fields of every value, in one embedding call."""
+        texts, slots = [], []
+        for n, value in enumerate(values):
+            for field in self.fields:
+                text = value.get(field)
+                if text:
+                    texts.append(text)
+                    slots.append((n, field))
+
+        embedded: List[Dict[str, list]] = [{} for _ in values]
+        if texts:
+            for (n, field), embedding in zip(slots, self.embeddings.embed_documents(texts)):
+                embedded[n][field] = embedding
+        return embedded
+
+    def _rebuild_index(self, ns: str) -> Optional[VectorIndex]:
+        """Index every stored embedding of a namespace."""
+        vector_index = None
+        for composite_key in sorted(self.vector_cache.get(_keys_key(ns), set())):
+            embedding_dict = self.vector_cache.get(composite_key)
+            if not embedding_dict:
+                continue
+            vectors = np.asarray(list(embedding_dict.values()), dtype=np.float32)
+            if vector_index is None:
+                vector_index = VectorIndex(vectors.shape[1])
+            vector_index.add(composite_key, vectors)
+        return vector_index
+
+    def _load_index(self, ns: str) -> Optional[VectorIndex]:
+        """The namespace's index, reloaded or rebuilt if it is behind the stored embeddings."""
+        version = self.vector_cache.get(_version_key(ns), 0)
+        if version == 0:
+            # Nothing was ever embedded in this namespace
+            return None
+        vector_index = self._indexes.get(ns)
+        if vector_index is not None and vector_index.version == version:
+            return vector_index
+
+        state = self.index_cache.get(ns)
+        if state is not None and state["version"] == version:
+            vector_index = VectorIndex.from_state(state)
+        else:
+            vector_index = self._rebuild_index(ns)
+            if vector_index is None:
+                # Everything was deleted, start over as a new namespace
+                self._indexes.pop(ns, None)
+                self.vector_cache.delete(_version_key(ns))
+                return None
+            vector_index.version = version
+            self._unsaved[ns] = PERSIST_EVERY
+            logger.info(f"Rebuilt memory index for {ns} with {len(vector_index)} items")
+        self._indexes[ns] = vector_index
+        if ns in self._unsaved:
+            self._save_index(ns)
+        return vector_index
+
+    def _save_index(self, ns: str):
+        vector_index = self._indexes.get(ns)
+        if vector_index is not None:
+            self.index_cache[ns] = vector_index.to_state()
+        self._unsaved.pop(ns, None)
+
+    def _bump_version(self, ns: str, vector_index: Optional[VectorIndex]) -> None:
+        version = self.vector_cache.incr(_version_key(ns))
+        if vector_index is None:
+            return
+        if vector_index.version != version - 1:
+            # Another process wrote to this namespace; reload before trusting the index again
+            self._indexes.pop(ns, None)
+            return
+        vector_index.version = version
+        self._unsaved[ns] = self._unsaved.get(ns, 0) + 1
+        if self._unsaved[ns] >= PERSIST_EVERY:
+            self._save_index(ns)
+
+    def _register_namespace(self, ns: str):
+        namespaces = self.vector_cache.get(_NAMESPACES_KEY, set())
+        if ns not in namespaces:
+            namespaces.add(ns)
+            self.vector_cache[_NAMESPACES_KEY] = namespaces
+
     def put(self, namespace: tuple[str, ...], key: str, value: dict) -> None:
         """
         Save an item with metadata into the main cache.
         If vector search is enabled, compute and store embeddings for the configured fields.
         """
-        composite_key = self._make_key(namespace, key)
+        self.put_many(namespace, [(key, value)])
+
+    def put_many(self, namespace: tuple[str, ...], items: Iterable[Tuple[str, dict]]) -> None:
+        """Save several items of one namespace, embedding all of them in a single call."""
+        items = list(items)
+        if not items:
+            return
         now = datetime.now(timezone.utc)
-        item = {
-            "value": value,
-            "namespace": namespace,
-            "key": key,
-            "created_at": now,
-            "updated_at": now,
-        }
-        self.cache[composite_key] = item
-        # print(self.cache.get(composite_key), "Result of saving to dicsk")
-
-        # If an embedding function is provided, compute and store embeddings.
+        ns = "::".join(namespace)
+
+        embedded = None
         if self.index_config and self.embeddings:
-            embedding_dict = {}
-            # For each field, extract text and compute its embedding.
-            for field in self.fields:
-                text = value.get(field)
-                if text:
-                    # Compute embedding for the text.
-                    # Here we assume embed_documents returns a list of embeddings.
-                    embedding = self.embeddings.embed_documents([text])[0]
-                    embedding_dict[field] = embedding
-            if embedding_dict:
-                self.vector_cache[composite_key] = embedding_dict
-                # print(self.cache.get(composite_key), "Result of saving to embedding")
-# 
+            # Embed before taking the lock, this is the slow part
+            embedded = self._embed_values([value for _, value in items])
+
+        with self._lock:
+            for key, value in items:
+                self.cache[self._make_key(namespace, key)] = {
+                    "value": value,
+                    "namespace": namespace,
+                    "key": key,
+                    "created_at": now,
+                    "updated_at": now,
+                }
+            if embedded is None:
+                return
+
+            # Listed before they are written, so a rebuild part way through sees them
+            self._update_keys(
+                ns, added=[self._make_key(namespace, key) for (key, _), e in zip(items, embedded) if e]
+            )
+            removed = []
+            for (key, _), embedding_dict in zip(items, embedded):
+                composite_key = self._make_key(namespace, key)
+                vector_index = self._load_index(ns)
+                if embedding_dict:
+                    self.vector_cache[composite_key] = embedding_dict
+                    vectors = np.asarray(list(embedding_dict.values()), dtype=np.float32)
+                    if vector_index is None:
+                        self._register_namespace(ns)
+                        vector_index = self._indexes[ns] = VectorIndex(vectors.shape[1])
+                        vector_index.version = self.vector_cache.get(_version_key(ns), 0)
+                    vector_index.add(composite_key, vectors)
+                elif self.vector_cache.delete(composite_key):
+                    # The new value has nothing to embed, forget the old embedding
+                    if vector_index is not None:
+                        vector_index.remove(composite_key)
+                    removed.append(composite_key)
+                else:
+                    continue
+                self._bump_version(ns, vector_index)
+            self._update_keys(ns, removed=removed)
+
     def get(self, namespace: tuple[str, ...], key: str) -> dict | None:
         """Retrieve an item by its namespace and key."""
         composite_key = self._make_key(namespace, key)
@@ -75,10 +243,23 @@ class DiskCacheStore(BaseStore):
     def delete(self, namespace: tuple[str, ...], key: str) -> None:
         """Remove an item (and its embedding if exists) from the caches."""
         composite_key = self._make_key(namespace, key)
-        if composite_key in self.cache:
-            del self.cache[composite_key]
-        if composite_key in self.vector_cache:
-            del self.vector_cache[composite_key]
+        ns = "::".join(namespace)
+        with self._lock:
+            if composite_key in self.cache:
+                del self.cache[composite_key]
+            if composite_key in self.vector_cache:
+                del self.vector_cache[composite_key]
+                self._update_keys(ns, removed=[composite_key])
+                vector_index = self._load_index(ns)
+                if vector_index is not None:
+                    vector_index.remove(composite_key)
+                self._bump_version(ns, vector_index)
+
+    def flush(self) -> None:
+        """Save every index with writes not yet persisted."""
+        with self._lock:
+            for ns in list(self._unsaved):
+                self._save_index(ns)
 
     def search(
         self,
@@ -89,12 +270,12 @@ class DiskCacheStore(BaseStore):
     ) -> list[SearchItem]:
         """
         Perform vector similarity search within the given namespace.
-        
+
         If the index is not configured, a basic text search (substring match) is performed.
         """
         results = []
-        ns_prefix = f"{'::'.join(namespace)}::"
-        print(f"Calling from memory: ", ns_prefix)
+        ns = "::".join(namespace)
+        ns_prefix = f"{ns}::"
 
         if not (self.index_config and self.embeddings):
             # Fallback: simple text search in the stored item values.
@@ -106,27 +287,27 @@ class DiskCacheStore(BaseStore):
             return results[offset:offset + limit]
 
         # Compute the embedding for the query.
-        query_embedding = self.embeddings.embed_query(query)
+        query_embedding = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+
+        # The namespace itself and any nested under it
+        namespaces = [
+            name for name in self.vector_cache.get(_NAMESPACES_KEY, set())
+            if name == ns or name.startswith(ns_prefix)
+        ]
         scored_items = []
-        # Iterate over all keys in the namespace.
-        for composite_key in self.cache.iterkeys():
-            if composite_key.startswith(ns_prefix):
-                item = self.cache[composite_key]
-                embedding_dict = self.vector_cache.get(composite_key)
-                if embedding_dict:
-                    # For simplicity, take the maximum similarity score across all embedded fields.
-                    best_score = None
-                    for emb in embedding_dict.values():
-                        score = _cosine_similarity(query_embedding, emb)
-                        if best_score is None or score > best_score:
-                            best_score = score
-                    if best_score is not None:
-                        scored_items.append((best_score, item))
+        with self._lock:
+            for name in namespaces:
+                vector_index = self._load_index(name)
+                if vector_index is not None:
+                    scored_items.extend(vector_index.search(query_embedding, offset + limit))
         # Sort results in descending order of similarity.
         scored_items.sort(key=lambda x: x[0], reverse=True)
         # Apply offset and limit.
         final_items = []
-        for score, item in scored_items[offset:offset + limit]:
+        for score, composite_key in scored_items[offset:offset + limit]:
+            item = self.cache.get(composite_key)
+            if item is None:
+                continue
             final_items.append(
                 SearchItem(
                     namespace=item["namespace"],
@@ -139,22 +320,10 @@ class DiskCacheStore(BaseStore):
             )
         return final_items
 
-def _cosine_similarity(query: list[float], stored: list[float]) -> float:
-    """
-    Compute cosine similarity between two vectors using numpy.
-    """
-    query_arr = np.array(query)
-    stored_arr = np.array(stored)
-    dot = np.dot(query_arr, stored_arr)
-    norm_query = np.linalg.norm(query_arr)
-    norm_stored = np.linalg.norm(stored_arr)
-    if norm_query == 0 or norm_stored == 0:
-        return 0.0
-    return dot / (norm_query * norm_stored)
 
 store = DiskCacheStore(
     cache_dir=MEMORY_CACHE_DIR,
     index={
         "embed": FastEmbedEmbeddings()
     }
-)
\ No newline at end of file
+)
@@ -1,8 +1,46 @@
+from typing import Dict
+
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
 from fastapi import Request
-from api.auth.services import get_current_user  # Ensure this function correctly verifies tokens
+from fastapi.routing import APIRoute
+from api.auth.services import get_current_user, get_token_user  # Ensure this function correctly verifies tokens
+
+
+def _dependency_calls(dependant):
+    yield dependant.call
+    for sub_dependant in dependant.dependencies:
+        yield from _dependency_calls(sub_dependant)
+
 
 class AuthenticationMiddleware(BaseHTTPMiddleware):
+    """
+    Loads the authenticated user into request.state.user.
+
+    Routes that take their identity from get_token_user (and not from
+    get_current_user) only need the token's claims, which the dependency
+    checks itself, so for them the user is not loaded and
+    request.state.user stays None.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        # id(route) -> whether it only needs the token's claims; routes aren't hashable
+        self._token_only: Dict[int, bool] = {}
+
+    def token_only(self, request: Request) -> bool:
+        for route in request.app.router.routes:
+            match, _ = route.matches(request.scope)
+            if match != Match.FULL:
+                continue
+            if not isinstance(route, APIRoute):
+                return False
+            if id(route) not in self._token_only:
+                calls = set(_dependency_calls(route.dependant))
+                self._token_only[id(route)] = get_token_user in calls and get_current_user not in calls
+            return self._token_only[id(route)]
+        return False
+
     async def dispatch(self, request: Request, call_next):
         try:
             # ✅ Extract token from Authorization header
@@ -15,8 +53,12 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
             if not token:
                 raise Exception("No token provided")
 
-            # ✅ Fetch authenticated user using the extracted token
-            user = await get_current_user(token)
+            if self.token_only(request):
+                # ✅ The route checks the token signature itself, no user lookup
+                user = None
+            else:
+                # ✅ Fetch authenticated user using the extracted token, served from the user cache after the first request
+                user = await get_current_user(token)
 
             # ✅ Attach the user to request.state
             request.state.user = user
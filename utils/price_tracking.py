@@ -67,7 +67,6 @@ def scrape_single_product(self, url, product_id, source, user_id, track_id, prod
     Updates last_checked timestamp after successful scraping.
     """
     from api.track.model import PriceHistory, TrackedItem
-    from api.product.model import Product
 
     start_time = time.time()
     try:
@@ -93,18 +92,12 @@ def scrape_single_product(self, url, product_id, source, user_id, track_id, prod
                 })
             )
             
-            # Store price history
-            loop.run_until_complete(
-                PriceHistory.create(
-                    document_id=Product.get_unique_id(),
-                    data={
-                        "price": price,
-                        "timestamp": current_time.isoformat(),
-                        "tracked_id": track_id,
-                        "user_id": user_id,
-                    },
-                )
+            # Store price history, keyed per item per day so task retries don't duplicate it
+            history = loop.run_until_complete(
+                PriceHistory.record(user_id, track_id, price, current_time.isoformat())
             )
+            if not history.ok:
+                raise RuntimeError(f"Failed to store price history: {history.failed[0][1]}")
             
             # Notify user if price is within range
             loop.run_until_complete(
@@ -156,8 +149,7 @@ async def notify_user_price_change(user_id: str, product_name: str, current_pric
                 
                 Check it out here: {url}
                 """
-                email_manager.choose_account("no-reply")
-                email_manager.send_email(user_id, subject, content)
+                await email_manager.send_email_async("no-reply", user_id, subject, content)
                 logger.info(f"Price alert sent to user {user_id} for product {product_name}")
     except Exception as e:
         logger.error(f"Error sending price notification: {e}")
@@ -252,20 +244,24 @@ async def scrape_multiple_products(tracked_items):
                 continue
                 
             successful_items = []
+
+            # Update last_checked timestamps before scheduling tasks, in one bounded fan-out
+            stamped = await TrackedItem.bulk_update(
+                {item.id: {"last_checked": current_time.isoformat()} for item in items}
+            )
+            unstamped = set(stamped.failed_ids)
+            failed_items.extend(unstamped)
             
             # Process each item
             for item in items:
+                if item.id in unstamped:
+                    continue
                 try:
                     product = await Product.read(item.product_id)
                     if not product or not product.url:
                         logger.warning(f"Product {item.product_id} not found or has no URL. Skipping.")
                         continue
 
-                    # Update last_checked timestamp before scheduling task
-                    await TrackedItem.update(item.id, {
-                        "last_checked": current_time.isoformat()
-                    })
-
                     # Schedule Celery task
                     task = scrape_single_product.apply_async(
                         args=(
@@ -1,20 +1,28 @@
-from asyncio import Queue, Semaphore
+import time
+import math
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+
 from api.auth.schema import UserIn
 from .limiter import Limiter
 
+from fastapi import HTTPException, status
+
 # Architecture Configuration
 RATE_LIMIT = "100/minute"  # Base rate limit
 MAX_CONCURRENT = 100       # Simultaneous processing slots
 QUEUE_SIZE = 200           # Max waiting requests
 QUEUE_TIMEOUT = 30         # Seconds to wait in queue
 PRIORITY_LEVELS = 3        # High, Medium, Low
+PRIORITY_WEIGHTS = (4, 2, 1)  # Share of slots per priority level when all are backlogged
 
 
 limiter = Limiter()
-
-# Global State
-request_queues = [Queue(maxsize=QUEUE_SIZE) for _ in range(PRIORITY_LEVELS)]
-processing_semaphore = Semaphore(MAX_CONCURRENT)
 # limiter = Limiter()
 # rate_limit = RateLimiter(times=100, minutes=1)
 
@@ -27,4 +35,208 @@ def determine_priority(user: UserIn, batch=False) -> int:
     if batch is True:
         return 2  # Lowest priority
 
-    return 1  # Default priority
\ No newline at end of file
+    return 1  # Default priority
+
+
+@dataclass(order=True)
+class _Ticket:
+    finish: float
+    seq: int
+    start: float = field(compare=False)
+    user_id: str = field(compare=False)
+    priority: int = field(compare=False)
+    deadline: float = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    done: bool = field(default=False, compare=False)
+
+
+@dataclass
+class QueueStats:
+    admitted: int = 0
+    immediate: int = 0
+    queued: int = 0
+    shed: int = 0
+    expired: int = 0
+    cancelled: int = 0
+    in_flight: int = 0
+    depth: int = 0
+    waits: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+    admitted_by_priority: List[int] = field(default_factory=lambda: [0] * PRIORITY_LEVELS)
+
+    def wait_percentile(self, pct: float) -> float:
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+    def to_dict(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "immediate": self.immediate,
+            "queued": self.queued,
+            "shed": self.shed,
+            "expired": self.expired,
+            "cancelled": self.cancelled,
+            "in_flight": self.in_flight,
+            "depth": self.depth,
+            "admitted_by_priority": list(self.admitted_by_priority),
+            "wait_avg": round(sum(self.waits) / len(self.waits), 3) if self.waits else 0.0,
+            "wait_p50": round(self.wait_percentile(0.5), 3),
+            "wait_p95": round(self.wait_percentile(0.95), 3),
+            "wait_max": round(max(self.waits), 3) if self.waits else 0.0,
+        }
+
+
+class AdmissionScheduler:
+    """
+    Admission control for expensive endpoints.
+
+    Up to max_concurrent requests run at once. Requests that can't start right
+    away wait in a weighted fair queue: every user is a flow weighted by their
+    priority level, so a subscribed user gets PRIORITY_WEIGHTS[0] slots for every
+    one a batch caller gets, and one user flooding the queue only delays
+    themselves. Slots are handed over directly when a running request finishes,
+    there are no worker tasks.
+
+    Queued requests carry a deadline and are dropped if it passes before they
+    start. New requests are shed with 429 and a Retry-After when the queue is full
+    or the estimated wait is already past their deadline.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        queue_size: int = QUEUE_SIZE,
+        timeout: float = QUEUE_TIMEOUT,
+        weights=PRIORITY_WEIGHTS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.weights = weights
+        self.stats = QueueStats()
+        self._heap: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._flow_finish: Dict[str, float] = {}
+        # Moving average of how long an admitted request holds its slot, None until measured
+        self._service_time: Optional[float] = None
+
+    @property
+    def depth(self) -> int:
+        return self.stats.depth
+
+    def estimated_wait(self, ahead: Optional[int] = None) -> float:
+        """Seconds until a request joining the queue now would start."""
+        if self._service_time is None:
+            return 0.0
+        ahead = self.depth if ahead is None else ahead
+        return (ahead + 1) * self._service_time / self.max_concurrent
+
+    def _shed(self, detail: str, retry_after: float):
+        self.stats.shed += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    def _grant(self, priority: int, waited: float):
+        self.stats.in_flight += 1
+        self.stats.admitted += 1
+        self.stats.admitted_by_priority[priority] += 1
+        self.stats.waits.append(waited)
+
+    def _leave_queue(self, ticket: _Ticket):
+        ticket.done = True
+        self.stats.depth -= 1
+        if self.stats.depth == 0:
+            # Nothing is backlogged, so no flow is owed anything
+            self._flow_finish.clear()
+            self._heap.clear()
+
+    def _release(self, held: float):
+        self.stats.in_flight -= 1
+        if held:
+            self._service_time = held if self._service_time is None else 0.9 * self._service_time + 0.1 * held
+
+        now = time.monotonic()
+        while self._heap and self.stats.in_flight < self.max_concurrent:
+            ticket = heapq.heappop(self._heap)
+            if ticket.done:
+                continue
+            self._leave_queue(ticket)
+            if ticket.deadline <= now:
+                self.stats.expired += 1
+                if not ticket.future.done():
+                    ticket.future.set_exception(
+                        HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Request expired in queue")
+                    )
+                continue
+            self._vtime = ticket.start
+            self._grant(ticket.priority, now - ticket.enqueued_at)
+            ticket.future.set_result(None)
+
+    async def _wait(self, user_id: str, priority: int, deadline: float):
+        now = time.monotonic()
+        if self.depth >= self.queue_size:
+            self._shed("Queue overflow", self.estimated_wait())
+        if now + self.estimated_wait() > deadline:
+            self._shed("Server busy", self.estimated_wait())
+
+        start = max(self._vtime, self._flow_finish.get(user_id, 0.0))
+        finish = start + 1.0 / self.weights[priority]
+        self._flow_finish[user_id] = finish
+        ticket = _Ticket(
+            finish=finish,
+            seq=next(self._seq),
+            start=start,
+            user_id=user_id,
+            priority=priority,
+            deadline=deadline,
+            enqueued_at=now,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._heap, ticket)
+        self.stats.depth += 1
+        self.stats.queued += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=max(0.0, deadline - now))
+        except asyncio.TimeoutError:
+            if ticket.future.done() and ticket.future.exception() is None:
+                # Granted right as the deadline hit; give the slot back
+                self._release(0.0)
+            elif not ticket.done:
+                self._leave_queue(ticket)
+                self.stats.expired += 1
+            raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, "Request expired in queue")
+        except asyncio.CancelledError:
+            # Client went away while queued
+            self.stats.cancelled += 1
+            if ticket.future.done() and not ticket.future.cancelled() and ticket.future.exception() is None:
+                self._release(0.0)
+            elif not ticket.done:
+                self._leave_queue(ticket)
+            raise
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: int = 1, timeout: Optional[float] = None):
+        """Hold one processing slot for the duration of the block."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        if self.depth == 0 and self.stats.in_flight < self.max_concurrent:
+            self.stats.immediate += 1
+            self._grant(priority, 0.0)
+        else:
+            await self._wait(user_id, priority, deadline)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+
+scheduler = AdmissionScheduler()
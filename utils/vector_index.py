@@ -0,0 +1,153 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import faiss
+import numpy as np
+
+
+# Namespaces up to this many vectors are searched exactly; past it they move to HNSW
+HNSW_THRESHOLD = 4096
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+# HNSW cannot remove vectors, deleted ones are skipped until they are this share of the index
+MAX_TOMBSTONE_RATIO = 0.25
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length float32 rows, so inner product is cosine similarity."""
+    vectors = np.ascontiguousarray(np.atleast_2d(vectors), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class VectorIndex:
+    """
+    Cosine-similarity index over labelled vectors, one per namespace.
+
+    Small indexes are exact (flat inner product) and remove vectors in place.
+    Once an index outgrows HNSW_THRESHOLD it is rebuilt as HNSW; from then on a
+    removed vector is only tombstoned and filtered out of results, and the index
+    is compacted when tombstones pass MAX_TOMBSTONE_RATIO.
+
+    A label (the store's composite key) may own several vectors, one per
+    embedded field; search() scores a label by its best vector.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.hnsw = False
+        self.index = self._new_index(hnsw=False)
+        self.labels: Dict[int, str] = {}
+        self.ids: Dict[str, List[int]] = {}
+        self.tombstones: Set[int] = set()
+        self.next_id = 0
+        # Count of writes this index reflects, compared against the store's on load
+        self.version = 0
+
+    def _new_index(self, hnsw: bool) -> faiss.Index:
+        if hnsw:
+            base = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            base.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            base = faiss.IndexFlatIP(self.dim)
+        return faiss.IndexIDMap2(base)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.ids
+
+    def add(self, label: str, vectors: np.ndarray):
+        """Add (or replace) the vectors for a label."""
+        self.remove(label)
+        vectors = normalize(vectors)
+        ids = np.arange(self.next_id, self.next_id + len(vectors), dtype=np.int64)
+        self.next_id += len(vectors)
+        self.index.add_with_ids(vectors, ids)
+        for i in ids.tolist():
+            self.labels[i] = label
+        self.ids[label] = ids.tolist()
+
+        if not self.hnsw and self.index.ntotal > HNSW_THRESHOLD:
+            self.rebuild(hnsw=True)
+
+    def add_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        for label, vectors in items:
+            self.add(label, vectors)
+
+    def remove(self, label: str) -> bool:
+        ids = self.ids.pop(label, None)
+        if not ids:
+            return False
+        for i in ids:
+            del self.labels[i]
+        if self.hnsw:
+            self.tombstones.update(ids)
+            if len(self.tombstones) > self.index.ntotal * MAX_TOMBSTONE_RATIO:
+                self.rebuild(hnsw=True)
+        else:
+            self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        return True
+
+    def rebuild(self, hnsw: Optional[bool] = None):
+        """Re-create the index from its live vectors, dropping tombstones."""
+        hnsw = self.hnsw if hnsw is None else hnsw
+        live = np.fromiter(self.labels.keys(), dtype=np.int64, count=len(self.labels))
+        vectors = (
+            np.vstack([self.index.reconstruct(int(i)) for i in live])
+            if len(live) else np.empty((0, self.dim), dtype=np.float32)
+        )
+        self.index = self._new_index(hnsw)
+        self.hnsw = hnsw
+        self.tombstones.clear()
+        if len(live):
+            self.index.add_with_ids(vectors, live)
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[float, str]]:
+        """Best k labels as (score, label), highest cosine similarity first."""
+        if k <= 0 or not self.ids:
+            return []
+        query = normalize(query)
+        fetch = k
+        while True:
+            # A label with several fields or tombstoned vectors takes several hits
+            n = min(self.index.ntotal, fetch + len(self.tombstones))
+            scores, ids = self.index.search(query, n)
+            best: Dict[str, float] = {}
+            for score, i in zip(scores[0].tolist(), ids[0].tolist()):
+                label = self.labels.get(i)
+                if label is not None and label not in best:
+                    best[label] = score
+            if len(best) >= k or n >= self.index.ntotal:
+                break
+            fetch *= 2
+        return sorted(((score, label) for label, score in best.items()), reverse=True)[:k]
+
+    def to_state(self) -> dict:
+        return {
+            "dim": self.dim,
+            "hnsw": self.hnsw,
+            "index": faiss.serialize_index(self.index),
+            "labels": self.labels,
+            "tombstones": self.tombstones,
+            "next_id": self.next_id,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "VectorIndex":
+        vector_index = cls(state["dim"])
+        vector_index.hnsw = state["hnsw"]
+        vector_index.index = faiss.deserialize_index(state["index"])
+        if vector_index.hnsw:
+            faiss.downcast_index(vector_index.index.index).hnsw.efSearch = HNSW_EF_SEARCH
+        vector_index.labels = state["labels"]
+        for i, label in vector_index.labels.items():
+            vector_index.ids.setdefault(label, []).append(i)
+        vector_index.tombstones = state["tombstones"]
+        vector_index.next_id = state["next_id"]
+        vector_index.version = state["version"]
+        return vector_index
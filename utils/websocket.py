@@ -32,6 +32,70 @@ class SourceMetadata(TypedDict):
     title: str
 
 
+class MessageStream:
+    """
+    Coalesces streamed text into "message" frames.
+
+    Deltas are buffered and sent as one frame once max_bytes have built up or
+    max_delay seconds after the first unsent delta, whichever comes first, so a
+    model emitting a token at a time costs a frame every few dozen milliseconds
+    rather than one per token.
+    """
+
+    def __init__(self, websocket: WebSocket, max_delay: float = 0.05, max_bytes: int = 512):
+        self.websocket = websocket
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self.frames = 0
+        self.text = ""
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "MessageStream":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def write(self, delta: str) -> None:
+        if not delta:
+            return
+        self._buffer.append(delta)
+        self._buffered += len(delta.encode("utf-8"))
+        self.text += delta
+
+        if self._buffered >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Failed to send streamed message: {str(e)}")
+
+    async def flush(self) -> None:
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            chunk = "".join(self._buffer)
+            self._buffer.clear()
+            self._buffered = 0
+            await self.websocket.send_json({"type": "message", "content": chunk})
+            self.frames += 1
+
+    async def close(self) -> None:
+        await self.flush()
+
+
 class WebSocketManager:
     _instance = None
     
@@ -232,21 +296,25 @@ class WebSocketManager:
             logger.error(f"Error streaming final response: {e}", exc_info=True)
             await self.send_error_response(ws_id, "Error streaming response", "STREAMING_ERROR")
 
-    async def stream_ai_response(self, ws_id: int, final_response: str, delay: float = 0.05) -> None:
-        """Stream AI response word by word to a specific WebSocket connection"""
+    def message_stream(self, ws_id: int, max_delay: float = 0.05, max_bytes: int = 512) -> Optional[MessageStream]:
+        """Coalescing stream for text generated on the fly, use as an async context manager"""
+        websocket = self.get_websocket(ws_id)
+        if not websocket:
+            logger.error(f"WebSocket {ws_id} not found")
+            return None
+        return MessageStream(websocket, max_delay=max_delay, max_bytes=max_bytes)
+
+    async def stream_ai_response(self, ws_id: int, final_response: str, max_bytes: int = 512) -> None:
+        """Send an already complete AI response in a few large frames, then messageEnd"""
         websocket = self.get_websocket(ws_id)
         if not websocket:
             logger.error(f"WebSocket {ws_id} not found")
             return
 
         try:
-            words = final_response.strip().split()
-            for word in words:
-                await websocket.send_json({
-                    "type": "message",
-                    "content": word + " "
-                })
-                await asyncio.sleep(delay)
+            async with MessageStream(websocket, max_bytes=max_bytes) as stream:
+                for start in range(0, len(final_response), max_bytes):
+                    await stream.write(final_response[start:start + max_bytes])
 
             await websocket.send_json({
                 "type": "messageEnd",